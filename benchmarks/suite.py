@@ -0,0 +1,833 @@
+# Benchmark suite: timed scenarios over synthetic crates, with results
+# written as JSON and compared against a stored baseline
+#
+# Usage: uv run python benchmarks/suite.py [options]
+#
+#   uv run python benchmarks/suite.py --output baseline.json
+#   ... change something ...
+#   uv run python benchmarks/suite.py --baseline baseline.json
+#   uv run python benchmarks/suite.py --groups entity_table,remote
+#
+# With --baseline, any scenario which is slower than the baseline by more
+# than --threshold is reported as a regression and the exit status is 1.
+
+from argparse import ArgumentParser, BooleanOptionalAction
+from contextlib import redirect_stdout
+from dataclasses import asdict, replace
+from functools import partial
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from tempfile import TemporaryDirectory
+import csv
+import json
+import os
+import platform
+import sqlite3
+import statistics
+import sys
+import threading
+import time
+import tracemalloc
+
+import requests
+
+from rocrate_tabular.remote import Remote
+from rocrate_tabular.tabulator import ROCrateTabulator
+from synthetic import CrateSpec, make_bench_crate
+from tinycrate.tinycrate import minimal_crate
+
+THRESHOLD = 0.25
+
+# Scenarios faster than this are too noisy to count as regressions
+MIN_SECONDS = 0.01
+
+# Crates tabulated together by the batch scenario
+BATCH_CRATES = 8
+
+# Crate sizes for the scaling group. With the property table indexed, the
+# entity_table time per entity should stay roughly constant as they grow.
+SIZES = [1000, 2000, 4000, 8000, 16000]
+
+# Words which occur in the synthetic text files
+SEARCH_WORDS = ["word17", "word4242", "word999"]
+
+JSON_QUERY = (
+    "SELECT COUNT(*) FROM [{table}] WHERE EXISTS "
+    "(SELECT 1 FROM json_each(author_id) WHERE value = ?)"
+)
+
+# A scan for the same words as fts_search, without the full-text index
+LIKE_QUERY = "SELECT entity_id FROM [{table}] WHERE [ldac:mainText] LIKE ?"
+
+# The same range over the text columns of a table without inferred types
+TEXT_RANGE_QUERY = (
+    "SELECT COUNT(*) FROM [{table}] "
+    "WHERE CAST(numberOfPages AS INTEGER) BETWEEN 100 AND 120"
+)
+
+RANGE_QUERY = "SELECT COUNT(*) FROM [{table}] WHERE numberOfPages BETWEEN 100 AND 120"
+
+# The author which json_query and numbered_query look for
+AUTHOR = "#level0-7"
+
+# Each group of scenarios, in the order they're run, and the groups whose
+# tables it needs
+GROUPS = {
+    "load": [],
+    "entity_table": ["load"],
+    "export": ["load", "entity_table"],
+    "scaling": [],
+    "build_tables": [],
+    "in_memory": [],
+    "iter_table": [],
+    "batch": [],
+    "remote": [],
+}
+
+
+def table_config(**kwargs):
+    return {"all_props": [], "ignore_props": [], "expand_props": [], **kwargs}
+
+
+class Handler(SimpleHTTPRequestHandler):
+    # keep-alive needs HTTP/1.1, and without TCP_NODELAY each response on a
+    # kept-alive connection waits for a delayed ACK
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def log_message(self, *args):
+        pass
+
+
+class Suite:
+    """Runs the scenarios of each group in order. The load, entity_table and
+    export groups share one database, since later scenarios need the tables
+    built by earlier ones; the other groups make their own."""
+
+    def __init__(
+        self, spec, work_dir, repeat, workers, groups=None, sizes=SIZES, db_dir=None
+    ):
+        self.spec = spec
+        self.work_dir = Path(work_dir)
+        # where the in_memory group writes its databases
+        self.db_dir = self.work_dir if db_dir is None else Path(db_dir)
+        self.repeat = repeat
+        self.workers = workers
+        self.groups = list(GROUPS) if groups is None else groups
+        self.sizes = sizes
+        self.results = {}
+        self.crates = {}
+        self.crate_dir = self.crate("crate")
+        self.db_file = self.work_dir / "bench.db"
+        self.tb = None
+        self.other = None
+        self.entities = None
+        self.work_type = max(spec.types, key=spec.types.get)
+
+    def crate(self, name, **changes):
+        """The directory of a crate made from the suite's spec with some
+        changes, which is written the first time it's asked for"""
+        if name not in self.crates:
+            spec = replace(self.spec, **changes)
+            self.crates[name] = make_bench_crate(self.work_dir / name, spec)
+        return self.crates[name]
+
+    def timed(self, name, fn, setup=None, memory=False):
+        """Run fn repeat times and record the times. fn returns a count of
+        rows produced, which is recorded with them. If memory is True, the
+        peak memory allocated by fn is recorded from one more run, since
+        tracing allocations slows it down."""
+        runs = []
+        rows = None
+        for _ in range(self.repeat):
+            if setup is not None:
+                setup()
+            start = time.perf_counter()
+            rows = fn()
+            runs.append(time.perf_counter() - start)
+        self.results[name] = {
+            "seconds": min(runs),
+            "median": statistics.median(runs),
+            "runs": runs,
+            "rows": rows,
+        }
+        print(f"{name:>28} {min(runs):>10.3f}s", file=sys.stderr)
+        if memory:
+            if setup is not None:
+                setup()
+            tracemalloc.start()
+            fn()
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            self.results[name]["peak_bytes"] = peak
+            print(f"{'':>28} {peak / 1e6:>9.1f}MB peak", file=sys.stderr)
+
+    def per_entity(self, name):
+        """Record the time per row of a scenario, in microseconds"""
+        result = self.results[name]
+        result["us_per_entity"] = result["seconds"] / max(result["rows"], 1) * 1e6
+        print(f"{'':>28} {result['us_per_entity']:>9.1f}us/entity", file=sys.stderr)
+
+    def note(self, name, **values):
+        """Record other measurements of a scenario"""
+        self.results[name].update(values)
+        for key, value in values.items():
+            print(f"{'':>28} {value:>10} {key}", file=sys.stderr)
+
+    def speedup(self, name, alternative):
+        """Record how many times faster scenario name was than another way
+        of doing the same thing"""
+        seconds = self.results[name]["seconds"]
+        ratio = self.results[alternative]["seconds"] / max(seconds, 1e-9)
+        self.results[name][f"speedup_over_{alternative}"] = ratio
+        print(f"{'':>28} {ratio:>9.1f}x faster than {alternative}", file=sys.stderr)
+
+    def run(self):
+        wanted = set(self.groups)
+        for group in self.groups:
+            wanted.update(GROUPS[group])
+        try:
+            for group in GROUPS:
+                if group in wanted:
+                    getattr(self, f"run_{group}")()
+        finally:
+            self.close()
+            self.close_other()
+        return self.results
+
+    def close(self):
+        if self.tb is not None:
+            self.tb.close()
+            self.tb = None
+
+    def close_other(self):
+        if self.other is not None:
+            self.other.close()
+            self.other = None
+
+    def fresh(self, name, crate_dir=None, db_dir=None, **kwargs):
+        """Set self.other to a tabulator with a crate (by default the
+        suite's) loaded into its own database, with the inferred config"""
+        self.close_other()
+        self.other = ROCrateTabulator()
+        crate_dir = crate_dir or self.crate_dir
+        db_file = Path(db_dir or self.work_dir) / f"{name}.db"
+        self.other.crate_to_db(str(crate_dir), db_file, **kwargs)
+        self.other.infer_config()
+
+    def use_table(self, table):
+        """Move a table from self.other's potential tables to its tables"""
+        config = self.other.config
+        config["tables"][table] = config["potential_tables"].pop(table)
+        return config["tables"][table]
+
+    def table_bytes(self, table):
+        """The size of a table of the shared database on its own, copied
+        into a new database"""
+        self.tb.db.conn.commit()
+        copy = self.work_dir / f"{table}_size.db"
+        copy.unlink(missing_ok=True)
+        conn = sqlite3.connect(copy)
+        conn.execute("ATTACH DATABASE ? AS source", [str(self.db_file)])
+        conn.execute(f"CREATE TABLE [{table}] AS SELECT * FROM source.[{table}]")
+        conn.commit()
+        conn.close()
+        return copy.stat().st_size
+
+    # load
+
+    def run_load(self):
+        self.timed("crate_to_db", self.crate_to_db, setup=self.close)
+        self.timed("infer_config", self.infer_config)
+        self.timed("relation_counts", self.relation_counts)
+        self.timed("relation_fanout", self.relation_fanout)
+        self.speedup("relation_fanout", "relation_counts")
+
+    def crate_to_db(self):
+        self.tb = ROCrateTabulator()
+        self.tb.crate_to_db(str(self.crate_dir), self.db_file)
+        return self.tb.db["property"].count
+
+    def infer_config(self):
+        self.tb.infer_config()
+        return len(self.tb.config["potential_tables"])
+
+    def relation_counts(self):
+        """Plan every potential table with a relation count query each, as
+        entity_table_plan used to"""
+        return sum(
+            len(list(self.tb.fetch_relation_counts(table)))
+            for table in self.tb.config["potential_tables"]
+        )
+
+    def relation_fanout(self):
+        self.tb.fanout = None
+        return sum(len(props) for props in self.tb.relation_fanout().values())
+
+    # entity_table
+
+    def run_entity_table(self):
+        spec = self.spec
+        table = self.work_type
+        self.timed(
+            "entity_record",
+            lambda: self.entity_record(table),
+            setup=lambda: self.fetch_entities(table),
+            memory=True,
+        )
+        self.per_entity("entity_record")
+        self.entities = None
+        self.timed("entity_table_plain", lambda: self.entity_table(table))
+        self.note(
+            "entity_table_plain",
+            columns=len(self.tb.db[table].columns),
+            table_bytes=self.table_bytes(table),
+        )
+        numbered = spec.depth and spec.fan_out > 1
+        if numbered:
+            self.timed("numbered_query", lambda: self.numbered_query(table))
+            self.timed("read_numbered", lambda: self.read_table(table))
+        if spec.measures:
+            self.tb.db[table].create_index(["numberOfPages"])
+            self.timed(
+                "range_query_text",
+                lambda: self.query(TEXT_RANGE_QUERY.format(table=table)),
+            )
+        if spec.depth:
+            self.timed(
+                "entity_table_expanded",
+                lambda: self.entity_table(table, expand_props=[spec.expand_path()]),
+            )
+        if spec.collection_size:
+            self.timed(
+                "entity_table_junctions",
+                lambda: self.entity_table("RepositoryCollection"),
+            )
+        if numbered:
+            self.timed(
+                "entity_table_json",
+                lambda: self.entity_table(table, multi_valued_props={"author": "json"}),
+            )
+            self.note("entity_table_json", columns=len(self.tb.db[table].columns))
+            self.timed(
+                "json_query",
+                lambda: self.query(JSON_QUERY.format(table=table), [AUTHOR]),
+            )
+            self.speedup("json_query", "numbered_query")
+            self.timed("read_json", lambda: self.read_table(table))
+            self.speedup("read_json", "read_numbered")
+        if spec.measures:
+            self.timed(
+                "entity_table_typed",
+                lambda: self.entity_table(table, infer_types=True),
+            )
+            self.note("entity_table_typed", table_bytes=self.table_bytes(table))
+            self.tb.db[table].create_index(["numberOfPages"])
+            self.timed(
+                "range_query", lambda: self.query(RANGE_QUERY.format(table=table))
+            )
+            self.speedup("range_query", "range_query_text")
+        self.timed(
+            "entity_table_ragged",
+            lambda: self.ragged_table(table),
+            setup=lambda: self.fresh(
+                "ragged", self.crate("ragged", ragged=True, n_props=100)
+            ),
+        )
+        self.note(
+            "entity_table_ragged",
+            columns=len(self.other.db[table].columns),
+            alter_table=self.alters,
+        )
+        self.close_other()
+        if spec.text_bytes:
+            self.timed(
+                "entity_table_text",
+                lambda: self.entity_table(table, text_prop="ldac:mainText"),
+            )
+            self.timed(
+                "entity_table_fts",
+                lambda: self.entity_table(
+                    table, text_prop="ldac:mainText", fts=["name", "ldac:mainText"]
+                ),
+            )
+            self.timed("fts_search", lambda: self.fts_search(table))
+            self.timed("like_scan", lambda: self.like_scan(table))
+            self.speedup("fts_search", "like_scan")
+
+    def entity_table(self, table, text_prop=None, **kwargs):
+        self.tb.config["tables"][table] = table_config(**kwargs)
+        self.tb.text_prop = None
+        self.tb.entity_table(table, text_prop)
+        return self.tb.db[table].count
+
+    def fetch_entities(self, table):
+        """Plan the table for entity_record, with a long ignore list and
+        expanded authors, and read its entities"""
+        ignore = [f"prop{j:02d}" for j in range(0, self.spec.n_props, 2)]
+        ignore += [f"unused{j}" for j in range(200)]
+        expand = ["author"] if self.spec.depth else []
+        self.tb.config["tables"][table] = table_config(
+            ignore_props=ignore, expand_props=expand
+        )
+        self.tb.entity_table_plan(table)
+        self.tb.create_entity_table(table, rebuild=True)
+        self.entities = list(self.tb.fetch_table_entities(table))
+
+    def entity_record(self, table):
+        """Build the rows of a table without writing them"""
+        built = []
+        self.tb.flush_entities = lambda table, rows, junction_rows: built.append(
+            len(rows)
+        )
+        try:
+            self.tb.build_entities(table, iter(self.entities))
+        finally:
+            del self.tb.flush_entities
+        return sum(built)
+
+    def ragged_table(self, table):
+        """Build a table whose columns keep growing from the first entity
+        to the last, counting the ALTER TABLE statements which add them"""
+        self.use_table(table)["max_numbered_cols"] = self.spec.n_keywords + 1
+        statements = []
+        self.other.db.conn.set_trace_callback(statements.append)
+        try:
+            self.other.entity_table(table)
+        finally:
+            self.other.db.conn.set_trace_callback(None)
+        self.alters = sum(1 for s in statements if s.startswith("ALTER TABLE"))
+        return self.other.db[table].count
+
+    def query(self, sql, params=()):
+        (count,) = self.tb.db.execute(sql, params).fetchone()
+        return count
+
+    def numbered_query(self, table):
+        """Look for an author in each of the numbered author columns"""
+        columns = ["author_id"]
+        columns += [f"author_id_{i}" for i in range(1, self.spec.fan_out)]
+        where = " OR ".join(f"[{column}] = ?" for column in columns)
+        sql = f"SELECT COUNT(*) FROM [{table}] WHERE {where}"
+        return self.query(sql, [AUTHOR] * len(columns))
+
+    def read_table(self, table):
+        return len(self.tb.db.execute(f"SELECT * FROM [{table}]").fetchall())
+
+    def fts_search(self, table):
+        return sum(
+            len(self.tb.search(table, word, limit=self.spec.n_entities))
+            for word in SEARCH_WORDS
+        )
+
+    def like_scan(self, table):
+        sql = LIKE_QUERY.format(table=table)
+        return sum(
+            len(self.tb.db.execute(sql, [f"%{word} %"]).fetchall())
+            for word in SEARCH_WORDS
+        )
+
+    # export
+
+    def run_export(self):
+        self.timed("export_csv", lambda: self.export_csv(1))
+        if self.workers > 1:
+            self.timed("export_csv_parallel", lambda: self.export_csv(self.workers))
+            self.speedup("export_csv_parallel", "export_csv")
+        query = f"SELECT * FROM [{self.work_type}]"
+        csv_file = self.work_dir / "table.csv"
+        self.timed(
+            "write_csv_materialised",
+            lambda: write_materialised(self.tb.db.conn, query, csv_file),
+            memory=True,
+        )
+        self.timed(
+            "write_csv",
+            lambda: self.tb.write_csv(self.tb.db.conn, query, csv_file)[1],
+            memory=True,
+        )
+        self.speedup("write_csv", "write_csv_materialised")
+
+    def export_csv(self, workers):
+        """Export every table, and with more than one worker, the work table
+        split into one query per worker"""
+        queries = {
+            f"{table}.csv": f"SELECT * FROM [{table}]"
+            for table in self.tb.config["tables"]
+        }
+        if workers > 1:
+            table = queries.pop(f"{self.work_type}.csv")
+            for i in range(workers):
+                queries[f"{self.work_type}{i}.csv"] = (
+                    f"{table} WHERE rowid % {workers} = {i}"
+                )
+        self.tb.config["export_queries"] = queries
+        self.tb.export_workers = workers
+        self.tb.schemaCrate = minimal_crate()
+        # the CSVW schema isn't being measured, so don't fetch the context
+        self.tb.crate.resolve_term = lambda term: None
+        self.tb.export_csv(self.work_dir / f"csv{workers}")
+        return sum(stats["rows"] for stats in self.tb.export_stats.values())
+
+    # scaling
+
+    def run_scaling(self):
+        for n in self.sizes:
+            self.fresh(f"size{n}", self.crate(f"size{n}", n_entities=n, text_bytes=0))
+            self.use_table(self.work_type)
+            name = f"entity_table_{n}"
+            self.timed(name, self.scaled_table)
+            self.per_entity(name)
+        self.close_other()
+
+    def scaled_table(self):
+        self.other.entity_table(self.work_type)
+        return self.other.db[self.work_type].count
+
+    # build_tables
+
+    def run_build_tables(self):
+        self.timed(
+            "build_tables_serial",
+            lambda: self.build_tables(1),
+            setup=lambda: self.fresh("serial"),
+        )
+        if self.workers > 1:
+            self.timed(
+                "build_tables_parallel",
+                lambda: self.build_tables(self.workers),
+                setup=lambda: self.fresh("parallel"),
+            )
+            self.speedup("build_tables_parallel", "build_tables_serial")
+        self.timed("use_tables", self.use_tables, setup=lambda: self.fresh("use"))
+        self.close_other()
+
+    def build_tables(self, workers):
+        tables = list(self.other.config["potential_tables"])
+        for table in tables:
+            self.use_table(table)
+        self.other.table_workers = workers
+        self.other.build_tables(tables)
+        return sum(self.other.db[table].count for table in tables)
+
+    def use_tables(self):
+        """Add the tables one at a time, returning how many table builds
+        that took"""
+        for table in list(self.other.config["potential_tables"]):
+            self.other.use_tables([table])
+        return sum(
+            record["calls"]
+            for record in self.other.profiler.report()
+            if record["stage"] == "entity_table"
+        )
+
+    # in_memory
+
+    def run_in_memory(self):
+        self.timed("build_on_disk", lambda: self.build("disk", in_memory=False))
+        self.timed("build_in_memory", lambda: self.build("memory", in_memory=True))
+        self.speedup("build_in_memory", "build_on_disk")
+
+    def build(self, name, in_memory):
+        """Load the crate and build the work table, snapshotting it to disk
+        if it was built in memory"""
+        self.fresh(name, db_dir=self.db_dir, in_memory=in_memory)
+        self.use_table(self.work_type)
+        self.other.entity_table(self.work_type)
+        if in_memory:
+            self.other.snapshot()
+        rows = self.other.db[self.work_type].count
+        self.close_other()
+        return rows
+
+    # iter_table
+
+    def run_iter_table(self):
+        self.timed("iter_table_sqlite", self.sqlite_table)
+        self.timed("iter_table", lambda: self.iter_table(False))
+        self.speedup("iter_table", "iter_table_sqlite")
+        self.timed("iter_table_streamed", lambda: self.iter_table(True))
+        self.speedup("iter_table_streamed", "iter_table_sqlite")
+
+    def iter_config(self):
+        expand = ["author"] if self.spec.depth else []
+        return {self.work_type: table_config(expand_props=expand)}
+
+    def sqlite_table(self):
+        """Get the same rows as iter_table by building the property table
+        and the entity table, and reading it back"""
+        tb = ROCrateTabulator()
+        tb.config["tables"].update(self.iter_config())
+        tb.crate_to_db(str(self.crate_dir), self.work_dir / "iter.db")
+        tb.entity_table(self.work_type)
+        rows = sum(1 for _ in tb.db.query(f"SELECT * FROM [{self.work_type}]"))
+        tb.close()
+        return rows
+
+    def iter_table(self, stream):
+        tb = ROCrateTabulator()
+        tb.config["tables"].update(self.iter_config())
+        rows = tb.iter_table(self.work_type, str(self.crate_dir), stream=stream)
+        return sum(1 for _ in rows)
+
+    # batch
+
+    def run_batch(self):
+        crates = [
+            self.crate(
+                f"batch{i}",
+                n_entities=max(1, self.spec.n_entities // BATCH_CRATES),
+                text_bytes=0,
+                seed=self.spec.seed + i,
+            )
+            for i in range(BATCH_CRATES)
+        ]
+        self.timed("crates_to_db_serial", lambda: self.crates_to_db(crates, 1))
+        if self.workers > 1:
+            self.timed("crates_to_db", lambda: self.crates_to_db(crates, self.workers))
+            self.speedup("crates_to_db", "crates_to_db_serial")
+
+    def crates_to_db(self, crates, workers):
+        tb = ROCrateTabulator()
+        tables = [self.work_type]
+        if self.spec.depth:
+            tables.append(self.spec.levels()[0][1])
+        for table in tables:
+            tb.config["tables"][table] = table_config()
+        tb.crates_to_db(crates, self.work_dir / "batch.db", workers=workers)
+        rows = sum(tb.db[table].count for table in tables)
+        tb.close()
+        return rows
+
+    # remote
+
+    def run_remote(self):
+        if not self.spec.text_bytes:
+            return
+        handler = partial(Handler, directory=str(self.crate_dir))
+        server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        url = f"http://127.0.0.1:{server.server_port}/ro-crate-metadata.json"
+        remote = Remote(self.work_dir / "http")
+        files = sorted(
+            str(path.relative_to(self.crate_dir))
+            for path in Path(self.crate_dir).rglob("*.txt")
+        )
+        try:
+            self.timed("remote_unpooled", lambda: fetch_unpooled(url, files))
+            self.timed("remote_pooled", lambda: fetch_pooled(remote, url, files))
+            self.speedup("remote_pooled", "remote_unpooled")
+            self.timed("remote_text", lambda: self.remote_text(remote, url))
+        finally:
+            remote.close()
+            server.shutdown()
+
+    def remote_text(self, remote, url):
+        """Load the crate and its text files over HTTP, with the metadata
+        document cached after the first run"""
+        tb = ROCrateTabulator()
+        tb.remote = remote
+        tb.crate_to_db(url, self.work_dir / "remote.db")
+        tb.config["tables"][self.work_type] = table_config()
+        tb.entity_table(self.work_type, "ldac:mainText")
+        rows = tb.db[self.work_type].count
+        tb.close()
+        return rows
+
+
+def write_materialised(conn, query, csv_file):
+    """The CSV export loop before it was streamed, which read the whole
+    result of the query first"""
+    cursor = conn.execute(query)
+    columns = [d[0] for d in cursor.description]
+    result = [dict(zip(columns, row)) for row in cursor]
+    with open(csv_file, "w", newline="", encoding="utf-8") as fh:
+        writer = csv.DictWriter(fh, fieldnames=result[0].keys())
+        writer.writeheader()
+        for row in result:
+            for key, value in row.items():
+                if isinstance(value, str):
+                    row[key] = value.replace("\n", "\\n").replace("\r", "\\r")
+            writer.writerow(row)
+    return len(result)
+
+
+def fetch_unpooled(url, files):
+    """Fetch the metadata and text files the way the tabulator used to:
+    a new connection for every request, and no cache"""
+    requests.get(url).json()
+    for fid in files:
+        requests.get(url.replace("ro-crate-metadata.json", fid)).text
+    return len(files)
+
+
+def fetch_pooled(remote, url, files):
+    remote.content(url)
+    for fid in files:
+        remote.fetch_text(url.replace("ro-crate-metadata.json", fid))
+    return len(files)
+
+
+def environment():
+    return {
+        "python": platform.python_version(),
+        "sqlite": sqlite3.sqlite_version,
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+    }
+
+
+def compare(results, baseline, threshold):
+    """Returns a list of (scenario, baseline seconds, seconds, ratio,
+    regressed) for the scenarios in both sets of results"""
+    rows = []
+    for name, result in results["scenarios"].items():
+        if name not in baseline["scenarios"]:
+            continue
+        before = baseline["scenarios"][name]["seconds"]
+        after = result["seconds"]
+        ratio = after / before if before else float("inf")
+        regressed = ratio > 1 + threshold and after > MIN_SECONDS
+        rows.append((name, before, after, ratio, regressed))
+    return rows
+
+
+def parse_types(value):
+    """Parse a type mix like CreativeWork=3,Dataset=1"""
+    types = {}
+    for item in value.split(","):
+        name, _, weight = item.partition("=")
+        types[name] = int(weight or 1)
+    return types
+
+
+def parse_groups(value):
+    groups = value.split(",")
+    for group in groups:
+        if group not in GROUPS:
+            raise ValueError(f"unknown group {group}")
+    return groups
+
+
+def parse_sizes(value):
+    return [int(size) for size in value.split(",")]
+
+
+def parse_args(arg_list=None):
+    defaults = CrateSpec()
+    ap = ArgumentParser("RO-Crate Tabulator benchmark suite")
+    ap.add_argument("--entities", type=int, default=defaults.n_entities)
+    ap.add_argument(
+        "--types",
+        type=parse_types,
+        default=defaults.types,
+        help="Type mix of the works, like CreativeWork=3,Dataset=1",
+    )
+    ap.add_argument("--props", type=int, default=defaults.n_props)
+    ap.add_argument("--fan-out", type=int, default=defaults.fan_out)
+    ap.add_argument("--depth", type=int, default=defaults.depth)
+    ap.add_argument("--linked", type=int, default=defaults.n_linked)
+    ap.add_argument("--collection-size", type=int, default=defaults.collection_size)
+    ap.add_argument("--text-bytes", type=int, default=2000)
+    ap.add_argument("--keywords", type=int, default=5)
+    ap.add_argument(
+        "--measures",
+        action=BooleanOptionalAction,
+        default=True,
+        help="Give the works integer, real and date properties",
+    )
+    ap.add_argument("--seed", type=int, default=defaults.seed)
+    ap.add_argument("--repeat", type=int, default=3)
+    ap.add_argument(
+        "--workers",
+        type=int,
+        default=os.cpu_count(),
+        help="Worker processes for the parallel scenarios",
+    )
+    ap.add_argument(
+        "--groups",
+        type=parse_groups,
+        help=f"Only run these groups of scenarios: {','.join(GROUPS)}",
+    )
+    ap.add_argument(
+        "--sizes",
+        type=parse_sizes,
+        default=SIZES,
+        help="Numbers of works in the scaling group's crates, like 1000,2000",
+    )
+    ap.add_argument(
+        "--db-dir",
+        type=Path,
+        help="Write the in_memory group's databases here, to compare the "
+        "modes on slow storage",
+    )
+    ap.add_argument("--output", type=Path, help="Write the results to this file")
+    ap.add_argument("--baseline", type=Path, help="Compare with these results")
+    ap.add_argument(
+        "--threshold",
+        type=float,
+        default=THRESHOLD,
+        help="Slowdown which counts as a regression, as a fraction",
+    )
+    return ap.parse_args(arg_list)
+
+
+def main(args):
+    spec = CrateSpec(
+        n_entities=args.entities,
+        types=args.types,
+        n_props=args.props,
+        fan_out=args.fan_out,
+        depth=args.depth,
+        n_linked=args.linked,
+        collection_size=args.collection_size,
+        text_bytes=args.text_bytes,
+        n_keywords=args.keywords,
+        measures=args.measures,
+        seed=args.seed,
+    )
+    # the tabulator's progress messages would get mixed up with the JSON
+    with TemporaryDirectory() as work_dir, redirect_stdout(sys.stderr):
+        suite = Suite(
+            spec,
+            work_dir,
+            args.repeat,
+            args.workers,
+            args.groups,
+            args.sizes,
+            args.db_dir,
+        )
+        scenarios = suite.run()
+    results = {
+        "spec": asdict(spec),
+        "environment": environment(),
+        "scenarios": scenarios,
+    }
+    if args.output:
+        with open(args.output, "w") as fh:
+            json.dump(results, fh, indent=2)
+    else:
+        json.dump(results, sys.stdout, indent=2)
+        print()
+    if args.baseline:
+        with open(args.baseline) as fh:
+            baseline = json.load(fh)
+        if baseline["spec"] != results["spec"]:
+            print("Warning: the baseline used a different crate spec", file=sys.stderr)
+        rows = compare(results, baseline, args.threshold)
+        print(
+            f"{'scenario':>28} {'baseline':>10} {'now':>10} {'ratio':>7}",
+            file=sys.stderr,
+        )
+        for name, before, after, ratio, regressed in rows:
+            flag = "  REGRESSION" if regressed else ""
+            print(
+                f"{name:>28} {before:>10.3f} {after:>10.3f} {ratio:>7.2f}{flag}",
+                file=sys.stderr,
+            )
+        if any(row[4] for row in rows):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main(parse_args())
@@ -0,0 +1,124 @@
+# synthetic crate generator for benchmarks
+
+from dataclasses import dataclass, field
+from pathlib import Path
+import random
+from tinycrate.tinycrate import minimal_crate
+
+# The relations followed from a work to reach each level of linked entities
+LINK_LEVELS = [
+    ("author", "Person"),
+    ("affiliation", "Organization"),
+    ("location", "Place"),
+    ("containedInPlace", "Place"),
+]
+
+
+@dataclass
+class CrateSpec:
+    """Parameters for make_bench_crate"""
+
+    # number of works, and the weights of their types
+    n_entities: int = 10000
+    types: dict = field(default_factory=lambda: {"CreativeWork": 3, "Dataset": 1})
+    # literal properties on each work
+    n_props: int = 10
+    # authors per work - more than 10 makes author a junction table
+    fan_out: int = 3
+    # levels of linked entities: author, author.affiliation, ...
+    depth: int = 2
+    # number of distinct entities at each level
+    n_linked: int = 200
+    # works per RepositoryCollection, which are linked by hasPart
+    collection_size: int = 25
+    # size of each work's ldac:mainText file, or 0 for no text files
+    text_bytes: int = 0
+    # keywords on each work, a multi-valued literal property
+    n_keywords: int = 0
+    # give each work integer, real and date properties as well as text
+    measures: bool = False
+    # if True, each work has more of the n_props properties and n_keywords
+    # keywords than the one before, so new columns keep appearing
+    ragged: bool = False
+    seed: int = 1
+
+    def expand_path(self):
+        """The expand_props path which follows every level of links"""
+        return ".".join(prop for prop, _ in self.levels())
+
+    def levels(self):
+        return [LINK_LEVELS[min(k, len(LINK_LEVELS) - 1)] for k in range(self.depth)]
+
+    def count(self, n, i):
+        """How many of n properties or keywords work i has"""
+        if not self.ragged:
+            return n
+        return 1 + i * n // self.n_entities if n else 0
+
+
+def measures(rng, i):
+    """Integer, real and date properties for work i"""
+    return {
+        "numberOfPages": str(rng.randrange(1, 2000)),
+        "wordCount": str(rng.randrange(1000, 1000000)),
+        "duration": f"{rng.uniform(0, 3600):.3f}",
+        "dateCreated": f"{rng.randrange(1900, 2025)}-{rng.randrange(1, 13):02d}-01",
+        "identifier": f"{i:08d}",
+    }
+
+
+def make_bench_crate(crate_dir, spec):
+    """Write a crate with the shape given by a CrateSpec"""
+    rng = random.Random(spec.seed)
+    crate = minimal_crate(
+        name="Synthetic", description="Synthetic crate", date_published="2025-01-01"
+    )
+    crate_dir = Path(crate_dir)
+    crate_dir.mkdir(parents=True, exist_ok=True)
+    levels = spec.levels()
+    for k, (_, etype) in enumerate(levels):
+        for i in range(spec.n_linked):
+            props = {"name": f"{etype} {k}.{i}"}
+            if k + 1 < len(levels):
+                prop = levels[k + 1][0]
+                props[prop] = {"@id": f"#level{k + 1}-{rng.randrange(spec.n_linked)}"}
+            crate.add(etype, f"#level{k}-{i}", props)
+    types = list(spec.types)
+    weights = list(spec.types.values())
+    words = [f"word{i}" for i in range(5000)]
+    if spec.text_bytes:
+        (crate_dir / "text").mkdir(exist_ok=True)
+    for i in range(spec.n_entities):
+        props = {"name": f"Work {i}"}
+        for j in range(spec.count(spec.n_props, i)):
+            props[f"prop{j:02d}"] = f"value {i} {j}"
+        n_keywords = spec.count(spec.n_keywords, i)
+        if n_keywords:
+            props["keywords"] = [f"keyword {k}" for k in range(n_keywords)]
+        if spec.measures:
+            props.update(measures(rng, i))
+        if levels:
+            props[levels[0][0]] = [
+                {"@id": f"#level0-{rng.randrange(spec.n_linked)}"}
+                for _ in range(spec.fan_out)
+            ]
+        if spec.text_bytes:
+            fid = f"text/work{i:07d}.txt"
+            text = " ".join(rng.choices(words, k=spec.text_bytes // 9 + 1))
+            (crate_dir / fid).write_text(text[: spec.text_bytes])
+            crate.add("File", fid, {"name": fid})
+            props["ldac:mainText"] = {"@id": fid}
+        crate.add(rng.choices(types, weights)[0], f"#work{i:07d}", props)
+    if spec.collection_size:
+        for c in range(0, spec.n_entities, spec.collection_size):
+            end = min(c + spec.collection_size, spec.n_entities)
+            crate.add(
+                "RepositoryCollection",
+                f"#collection{c:07d}",
+                {
+                    "name": f"Collection {c}",
+                    "hasPart": [{"@id": f"#work{i:07d}"} for i in range(c, end)],
+                },
+            )
+    crate.write_json(crate_dir)
+    return crate_dir
@@ -0,0 +1,145 @@
+"""Per-stage instrumentation for the tabulator
+
+Each stage of a build, like parsing the crate or building one entity table,
+has a record of the time spent in it, the rows it read and wrote and the
+bytes of text it loaded. If trace_sql is set, the SQL statements run by
+each stage are counted, and if trace_memory is set, the peak memory
+allocated by Python during each stage is recorded using tracemalloc.
+
+Records are keyed by the stage name and an optional label, such as the
+table name, and stages which run more than once add to the same record.
+Callbacks registered with add_callback are called with the record every
+time a stage finishes.
+"""
+
+from contextlib import contextmanager
+import json
+import threading
+import time
+import tracemalloc
+
+
+def new_record(stage, label):
+    return {
+        "stage": stage,
+        "label": label,
+        "calls": 0,
+        "seconds": 0.0,
+        "rows_in": 0,
+        "rows_out": 0,
+        "sql_statements": 0,
+        "text_bytes": 0,
+        "peak_memory": None,
+    }
+
+
+class Profiler:
+    def __init__(self, trace_sql=False, trace_memory=False):
+        self.trace_sql = trace_sql
+        self.trace_memory = trace_memory
+        self.records = {}
+        self.callbacks = []
+        self.lock = threading.Lock()
+        # the stages being run by each thread, innermost last
+        self.local = threading.local()
+
+    def add_callback(self, callback):
+        """Call callback(record) whenever a stage finishes"""
+        self.callbacks.append(callback)
+
+    def record(self, stage, label=None):
+        """Returns the record for a stage, creating it if it's new"""
+        key = (stage, label)
+        with self.lock:
+            if key not in self.records:
+                self.records[key] = new_record(stage, label)
+            return self.records[key]
+
+    def _stack(self):
+        if not hasattr(self.local, "stack"):
+            self.local.stack = []
+        return self.local.stack
+
+    @contextmanager
+    def stage(self, stage, label=None):
+        """Context manager which times a stage and makes it the one which
+        SQL statements are counted against. Yields the stage's record, so
+        that row counts can be added to it."""
+        record = self.record(stage, label)
+        stack = self._stack()
+        if self.trace_memory:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+            # the enclosing stage's peak so far, before it's reset
+            if stack:
+                self._update_peak(stack[-1], tracemalloc.get_traced_memory()[1])
+            tracemalloc.reset_peak()
+        stack.append(record)
+        start = time.perf_counter()
+        try:
+            yield record
+        finally:
+            record["seconds"] += time.perf_counter() - start
+            record["calls"] += 1
+            stack.pop()
+            if self.trace_memory and tracemalloc.is_tracing():
+                self._update_peak(record, tracemalloc.get_traced_memory()[1])
+                if stack:
+                    self._update_peak(stack[-1], record["peak_memory"])
+            for callback in self.callbacks:
+                callback(record)
+
+    def _update_peak(self, record, peak):
+        if record["peak_memory"] is None or peak > record["peak_memory"]:
+            record["peak_memory"] = peak
+
+    def iterate(self, iterable, stage, label=None):
+        """Yield from iterable, adding the time spent waiting for each item
+        to a stage's record, and counting the items as its rows_out"""
+        record = self.record(stage, label)
+        iterator = iter(iterable)
+        while True:
+            start = time.perf_counter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                record["seconds"] += time.perf_counter() - start
+                record["calls"] += 1
+                for callback in self.callbacks:
+                    callback(record)
+                return
+            record["seconds"] += time.perf_counter() - start
+            record["rows_out"] += 1
+            yield item
+
+    def count(self, iterable, record, key="rows_in"):
+        """Yield from iterable, counting the items in one of a record's
+        fields"""
+        for item in iterable:
+            record[key] += 1
+            yield item
+
+    def watch(self, conn):
+        """Count the SQL statements run on an sqlite3 connection against
+        the stage which is running when they're run, if trace_sql is set"""
+        if self.trace_sql:
+            conn.set_trace_callback(self._trace)
+
+    def _trace(self, statement):
+        stack = self._stack()
+        if stack:
+            stack[-1]["sql_statements"] += 1
+
+    def reset(self):
+        with self.lock:
+            self.records = {}
+
+    def report(self):
+        """Returns a list of the stage records, in the order in which the
+        stages were first run"""
+        with self.lock:
+            return [dict(record) for record in self.records.values()]
+
+    def write_json(self, path):
+        with open(path, "w") as fh:
+            json.dump(self.report(), fh, indent=2)
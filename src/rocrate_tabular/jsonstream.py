@@ -0,0 +1,157 @@
+"""Incremental reader for the @graph of large ro-crate-metadata.json files
+
+The metadata document is read in chunks and the entities in its @graph are
+decoded one at a time, so only one entity (plus one chunk of input) is held
+in memory at once. Any other top-level values, such as @context, are decoded
+whole and are available in `header` once the graph has been read.
+"""
+
+from json import JSONDecodeError, JSONDecoder
+from pathlib import Path
+
+from rocrate_tabular.remote import Remote, RemoteException, is_url
+
+CHUNK_SIZE = 1 << 16
+WHITESPACE = " \t\n\r"
+
+
+class JSONStreamException(Exception):
+    pass
+
+
+class GraphReader:
+    """Iterate over the entities in the @graph of a JSON-LD document given as
+    an iterable of text chunks"""
+
+    def __init__(self, chunks):
+        self.chunks = iter(chunks)
+        self.decoder = JSONDecoder()
+        self.buf = ""
+        self.pos = 0
+        self.exhausted = False
+        self.header = {}
+
+    def __iter__(self):
+        self._expect("{")
+        if self._peek() == "}":
+            return
+        while True:
+            key = self._value()
+            if type(key) is not str:
+                raise JSONStreamException(f"Expected an object key, got {key!r}")
+            self._expect(":")
+            if key == "@graph":
+                yield from self._array()
+            else:
+                self.header[key] = self._value()
+            if self._peek() == ",":
+                self.pos += 1
+            else:
+                self._expect("}")
+                return
+
+    def _array(self):
+        """Yield the items of an array one at a time"""
+        self._expect("[")
+        if self._peek() == "]":
+            self.pos += 1
+            return
+        while True:
+            yield self._value()
+            if self._peek() == ",":
+                self.pos += 1
+            else:
+                self._expect("]")
+                return
+
+    def _fill(self):
+        """Read at least as much input again as is buffered, discarding what
+        has already been consumed. Returns False at end of input."""
+        self.buf = self.buf[self.pos :]
+        self.pos = 0
+        wanted = max(len(self.buf), 1)
+        read = 0
+        parts = [self.buf]
+        while read < wanted:
+            try:
+                chunk = next(self.chunks)
+            except StopIteration:
+                self.exhausted = True
+                break
+            parts.append(chunk)
+            read += len(chunk)
+        self.buf = "".join(parts)
+        return read > 0
+
+    def _peek(self):
+        """Skip whitespace and return the next character, or "" at the end"""
+        while True:
+            while self.pos < len(self.buf) and self.buf[self.pos] in WHITESPACE:
+                self.pos += 1
+            if self.pos < len(self.buf) or not self._fill():
+                break
+        return self.buf[self.pos : self.pos + 1]
+
+    def _expect(self, c):
+        found = self._peek()
+        if found != c:
+            raise JSONStreamException(f"Expected '{c}', got '{found}'")
+        self.pos += 1
+
+    def _value(self):
+        """Decode the next complete value, reading more input until it's
+        all buffered"""
+        self._peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buf, self.pos)
+                # a number at the end of the buffer may be continued in
+                # the next chunk
+                if end < len(self.buf) or self.exhausted:
+                    self.pos = end
+                    return value
+            except JSONDecodeError as e:
+                if self.exhausted:
+                    raise JSONStreamException(f"Malformed JSON: {e}")
+            self._fill()
+
+
+def file_chunks(path, chunk_size=CHUNK_SIZE):
+    """Yield text chunks from a file"""
+    with open(path, "r", encoding="utf-8") as fh:
+        while True:
+            chunk = fh.read(chunk_size)
+            if not chunk:
+                return
+            yield chunk
+
+
+def http_chunks(url, chunk_size=CHUNK_SIZE, remote=None):
+    """Yield text chunks from a streamed HTTP response, through a Remote if
+    one is given"""
+    if remote is None:
+        remote = Remote()
+    try:
+        yield from remote.text_chunks(url, chunk_size)
+    except RemoteException as e:
+        raise JSONStreamException(str(e))
+
+
+def metadata_location(crate_uri):
+    """Returns the location of the metadata document for a crate URL,
+    directory or metadata file, and the crate directory (None for URLs)"""
+    if is_url(crate_uri):
+        return crate_uri, None
+    path = Path(crate_uri)
+    if path.is_dir():
+        return path / "ro-crate-metadata.json", path
+    return path, path.parent
+
+
+def graph_reader(crate_uri, chunk_size=CHUNK_SIZE, remote=None):
+    """Returns a GraphReader for a crate URL, directory or metadata file.
+    URLs are fetched through remote if it's given."""
+    location, directory = metadata_location(crate_uri)
+    if directory is None:
+        return GraphReader(http_chunks(location, chunk_size, remote))
+    return GraphReader(file_chunks(location, chunk_size))
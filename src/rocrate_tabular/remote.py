@@ -0,0 +1,169 @@
+"""Pooled, cached HTTP access for remote crates
+
+All of a tabulator's HTTP requests go through one requests Session, which
+keeps connections to each host alive in a pool shared by the threads that
+load text files. Responses may be gzip or deflate compressed, and are
+decompressed as they're read.
+
+Metadata documents are streamed in chunks. If the Remote has a cache
+directory, each document is saved to it as it's read, along with its ETag
+and Last-Modified headers, and later requests for it are conditional: if the
+server says it hasn't changed, it's read from the cache instead of being
+downloaded again. A download which doesn't finish is never cached.
+"""
+
+from pathlib import Path
+import codecs
+import hashlib
+import os
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from rocrate_tabular.textcache import (
+    DEFAULT_CACHE_DIR,
+    http_conditional_headers,
+    http_validator,
+)
+
+DEFAULT_HTTP_CACHE_DIR = DEFAULT_CACHE_DIR / "http"
+
+# Connections kept open to each host
+POOL_SIZE = 10
+
+# Seconds to wait to connect, or for the next data
+TIMEOUT = 60
+
+CHUNK_SIZE = 1 << 16
+
+
+class RemoteException(Exception):
+    pass
+
+
+def is_url(uri):
+    return isinstance(uri, str) and uri.startswith(("http://", "https://"))
+
+
+class Remote:
+    """A keep-alive HTTP session, with an optional disk cache for streamed
+    documents. It can be shared by the threads which load text files."""
+
+    def __init__(self, cache_dir=None, pool_size=POOL_SIZE, timeout=TIMEOUT):
+        self.cache_dir = None if cache_dir is None else Path(cache_dir)
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.session.headers["Accept-Encoding"] = "gzip, deflate"
+        self.requests = 0
+        self.not_modified = 0
+        self.lock = threading.Lock()
+
+    def get(self, url, headers=None, stream=False):
+        """Returns the response to a GET request"""
+        with self.lock:
+            self.requests += 1
+        try:
+            return self.session.get(
+                url, headers=headers, stream=stream, timeout=self.timeout
+            )
+        except requests.RequestException as e:
+            raise RemoteException(f"http request to {url} failed: {e}")
+
+    def fetch_text(self, url):
+        """Returns the text of a document"""
+        response = self.get(url)
+        if not response.ok:
+            raise RemoteException(
+                f"http request to {url} failed with status {response.status_code}"
+            )
+        return response.text
+
+    def cache_paths(self, url):
+        """The cached copy of a document and the file with its validator"""
+        key = hashlib.sha1(url.encode("utf-8")).hexdigest()
+        return self.cache_dir / f"{key}.body", self.cache_dir / f"{key}.validator"
+
+    def cached_validator(self, url):
+        if self.cache_dir is None:
+            return None
+        body, validator = self.cache_paths(url)
+        if not (body.is_file() and validator.is_file()):
+            return None
+        return validator.read_text(encoding="utf-8")
+
+    def chunks(self, url, chunk_size=CHUNK_SIZE):
+        """Yield the bytes of a document in chunks, from the cache if the
+        server says it hasn't changed since it was cached"""
+        validator = self.cached_validator(url)
+        headers = http_conditional_headers(validator)
+        with self.get(url, headers=headers, stream=True) as response:
+            if response.status_code == 304 and validator is not None:
+                with self.lock:
+                    self.not_modified += 1
+                yield from self.cached_chunks(url, chunk_size)
+                return
+            if not response.ok:
+                raise RemoteException(
+                    f"http request to {url} failed with status {response.status_code}"
+                )
+            data = response.iter_content(chunk_size)
+            validator = http_validator(response)
+            if self.cache_dir is None or validator is None:
+                yield from data
+            else:
+                yield from self.caching_chunks(url, validator, data)
+
+    def cached_chunks(self, url, chunk_size):
+        body, _ = self.cache_paths(url)
+        with open(body, "rb") as fh:
+            while True:
+                chunk = fh.read(chunk_size)
+                if not chunk:
+                    return
+                yield chunk
+
+    def caching_chunks(self, url, validator, data):
+        """Yield from data while writing it to the cache. The cached copy
+        is only replaced once all of it has been read."""
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        body, validator_file = self.cache_paths(url)
+        partial = body.with_name(f"{body.name}.{os.getpid()}.{threading.get_ident()}")
+        complete = False
+        try:
+            with open(partial, "wb") as fh:
+                for chunk in data:
+                    fh.write(chunk)
+                    yield chunk
+            complete = True
+        finally:
+            if complete:
+                os.replace(partial, body)
+                validator_file.write_text(validator, encoding="utf-8")
+            else:
+                partial.unlink(missing_ok=True)
+
+    def text_chunks(self, url, chunk_size=CHUNK_SIZE):
+        """Yield the text of a UTF-8 document in chunks"""
+        decoder = codecs.getincrementaldecoder("utf-8")()
+        for data in self.chunks(url, chunk_size):
+            chunk = decoder.decode(data)
+            if chunk:
+                yield chunk
+        chunk = decoder.decode(b"", final=True)
+        if chunk:
+            yield chunk
+
+    def content(self, url):
+        """Returns the bytes of a document, through the cache"""
+        return b"".join(self.chunks(url))
+
+    def stats(self):
+        return {"requests": self.requests, "not_modified": self.not_modified}
+
+    def close(self):
+        self.session.close()
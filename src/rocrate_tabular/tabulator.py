@@ -1,19 +1,56 @@
 from os import PathLike
 
-from tinycrate.tinycrate import TinyCrate, TinyCrateException, minimal_crate
+from tinycrate.tinycrate import (
+    TinyCrate,
+    TinyCrateException,
+    TinyEntity,
+    minimal_crate,
+)
 from argparse import ArgumentParser
 from pathlib import Path
 from sqlite_utils import Database
 from tqdm import tqdm
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 import difflib
+import glob
+import hashlib
+import itertools
 import collections
+import copy
 import csv
 import json
+import math
+import os
 import re
-import requests
+import sqlite3
 import sys
+import tempfile
+import time
+from urllib.parse import urljoin
 from dataclasses import dataclass, field
 
+from rocrate_tabular.instrument import Profiler
+from rocrate_tabular.jsonstream import (
+    JSONStreamException,
+    graph_reader,
+    metadata_location,
+)
+from rocrate_tabular.remote import (
+    DEFAULT_HTTP_CACHE_DIR,
+    POOL_SIZE,
+    Remote,
+    RemoteException,
+    is_url,
+)
+from rocrate_tabular.textcache import (
+    DEFAULT_CACHE_DIR,
+    DEFAULT_MAX_BYTES,
+    TextCache,
+    file_validator,
+    http_conditional_headers,
+    http_validator,
+)
+
 # FIXME: add real logging
 
 # TERMINOLOGY
@@ -64,9 +101,489 @@ PROPERTIES = {
     "value": str,
 }
 
+# Indexes on the property table, built after the bulk insert. The source_id
+# index is deliberately not a covering index: its entries are stored in
+# (source_id, rowid) order, so fetch_properties gets an entity's rows back in
+# crate order without a sort
+
+PROPERTY_INDEXES = {
+    "idx_property_source_id": ["source_id"],
+    "idx_property_label_value": ["property_label", "value", "source_id"],
+    "idx_property_target_id": ["target_id"],
+}
+
+# SQL for the helper methods, kept here so that index_report can EXPLAIN them
+
+FETCH_TYPES_SQL = """
+    SELECT DISTINCT(p.value)
+    FROM property p
+    WHERE p.property_label = '@type'
+"""
+
+FETCH_IDS_SQL = """
+    SELECT p.source_id
+    FROM property p
+    WHERE p.property_label = '@type' AND p.value = ?
+    ORDER BY p.rowid
+"""
+
+FETCH_PROPERTIES_SQL = """
+    SELECT property_label, value, target_id
+    FROM property
+    WHERE source_id = ?
+    ORDER BY rowid
+"""
+
+# All the property rows for every entity of a type, grouped by entity. The
+# entities come in crate order (the order of their @type rows) so that
+# tables are built in the same order as they would be entity by entity
+
+FETCH_TABLE_PROPERTIES_SQL = """
+    SELECT p.source_id, p.property_label, p.value, p.target_id
+    FROM (
+        SELECT source_id, MIN(rowid) AS type_rowid
+        FROM property
+        WHERE property_label = '@type' AND value = ?
+        GROUP BY source_id
+    ) AS t
+    JOIN property p ON p.source_id = t.source_id
+    ORDER BY t.type_rowid, p.rowid
+"""
+
+FETCH_RELATION_COUNTS_SQL = """
+    SELECT p.source_id, p.property_label, count(p.target_id) as n_links
+    FROM property as p
+    WHERE p.source_id IN (
+        SELECT p.source_id
+        FROM property p
+        WHERE p.property_label = '@type' AND p.value = ?
+        )
+    GROUP BY p.source_id, p.property_label
+    ORDER BY n_links desc
+"""
+
+# The most targets any one entity of each type has for each property, for
+# all the types at once. Entities with several types count for each of them.
+# Only the relation rows are read, by a range search of the target_id index:
+# otherwise SQLite scans the whole table in source_id order for the GROUP BY
+
+RELATION_FANOUT_SQL = """
+    SELECT t.value AS entity_type, c.property_label, MAX(c.n_links) AS n_links
+    FROM (
+        SELECT source_id, property_label, count(*) AS n_links
+        FROM property INDEXED BY idx_property_target_id
+        WHERE target_id IS NOT NULL
+        GROUP BY source_id, property_label
+    ) AS c
+    JOIN property t ON t.source_id = c.source_id AND t.property_label = '@type'
+    GROUP BY t.value, c.property_label
+    ORDER BY t.value, n_links DESC, c.property_label
+"""
+
+FIND_CSV_SQL = """
+    SELECT source_id
+    FROM property
+    WHERE property_label = '@type' AND value = 'File'
+    AND LOWER(source_id) LIKE '%.csv'
+"""
+
+FETCH_REFRESH_PROPERTIES_SQL = """
+    SELECT p.source_id, p.property_label, p.value, p.target_id
+    FROM (
+        SELECT source_id, MIN(rowid) AS type_rowid
+        FROM property
+        WHERE property_label = '@type' AND value = ?
+        AND source_id IN (SELECT entity_id FROM entity_refresh)
+        GROUP BY source_id
+    ) AS t
+    JOIN property p ON p.source_id = t.source_id
+    ORDER BY t.type_rowid, p.rowid
+"""
+
+# SQL for the schema pass, which works out an entity table's columns before
+# any rows are built. For each property of a type's entities, the largest
+# number of values (and of values with a target, and without one) that any
+# one entity has, and the position of its first row. Positions are zero-padded
+# rowids, so that those of expanded properties can be extended with the
+# rowids of the rows they were expanded from and still sort as text.
+#
+# {value_types} is VALUE_TYPES_SQL if column types are being inferred, which
+# adds up the distinct VALUE_TYPE_FLAGS of each entity's values, or NULL.
+
+VALUE_TYPES_SQL = "SUM(DISTINCT value_type({}))"
+
+TABLE_SCHEMA_SQL = """
+    SELECT property_label,
+        MAX(n_values) AS n_values,
+        MAX(n_targets) AS n_targets,
+        MAX(n_values - n_targets) AS n_plain,
+        MIN(position) AS position,
+        GROUP_CONCAT(DISTINCT value_types) AS value_types
+    FROM (
+        SELECT p.source_id, p.property_label,
+            count(*) AS n_values,
+            count(p.target_id) AS n_targets,
+            printf('%012d', MIN(p.rowid)) AS position,
+            {value_types} AS value_types
+        FROM property p
+        WHERE p.source_id IN (
+            SELECT source_id
+            FROM property
+            WHERE property_label = '@type' AND value = ?
+        )
+        GROUP BY p.source_id, p.property_label
+    )
+    GROUP BY property_label
+"""
+
+# Expanded properties are walked a level at a time through schema_walk, which
+# has a row for each entity and each target it reaches with an expansion
+# prefix, like author_affiliation. chain is the ids on the way there, which
+# aren't expanded again.
+
+SCHEMA_TABLES_SQL = """
+    CREATE TEMP TABLE IF NOT EXISTS schema_walk (
+        entity_id TEXT, prefix TEXT, target_id TEXT, chain TEXT, position TEXT
+    );
+    CREATE TEMP TABLE IF NOT EXISTS schema_next (
+        entity_id TEXT, prefix TEXT, target_id TEXT, chain TEXT, position TEXT
+    );
+    CREATE TEMP TABLE IF NOT EXISTS schema_expand (
+        prefix TEXT, label TEXT, action TEXT, next_prefix TEXT,
+        PRIMARY KEY (prefix, label)
+    );
+    DELETE FROM schema_walk;
+    DELETE FROM schema_next;
+    DELETE FROM schema_expand;
+"""
+
+SCHEMA_WALK_SQL = """
+    INSERT INTO schema_walk
+    SELECT p.source_id, p.property_label, p.target_id,
+        char(31) || p.source_id || char(31) || p.target_id || char(31),
+        printf('%012d', p.rowid)
+    FROM property p
+    WHERE p.source_id IN (
+        SELECT source_id
+        FROM property
+        WHERE property_label = '@type' AND value = ?
+    )
+    AND p.property_label = ? AND p.target_id IS NOT NULL
+"""
+
+SCHEMA_LABELS_SQL = """
+    SELECT DISTINCT w.prefix, t.property_label
+    FROM schema_walk w
+    JOIN property t ON t.source_id = w.target_id
+"""
+
+# The labels at this level which become columns: those which aren't
+# expanded, and those which would be but have no target or lead back along
+# the chain
+
+SCHEMA_EXPANDED_SQL = """
+    SELECT prefix, label,
+        MAX(n_values) AS n_values,
+        MAX(n_targets) AS n_targets,
+        MIN(position) AS position,
+        GROUP_CONCAT(DISTINCT value_types) AS value_types
+    FROM (
+        SELECT w.entity_id, w.prefix, t.property_label AS label,
+            count(*) AS n_values,
+            count(t.target_id) AS n_targets,
+            MIN(w.position || printf('%012d', t.rowid)) AS position,
+            {value_types} AS value_types
+        FROM schema_walk w
+        JOIN property t ON t.source_id = w.target_id
+        JOIN schema_expand x ON x.prefix = w.prefix AND x.label = t.property_label
+        WHERE x.action = 'column' OR (
+            x.action = 'expand' AND (
+                t.target_id IS NULL
+                OR instr(w.chain, char(31) || t.target_id || char(31)) > 0
+            )
+        )
+        GROUP BY w.entity_id, w.prefix, t.property_label
+    )
+    GROUP BY prefix, label
+"""
+
+SCHEMA_NEXT_SQL = """
+    INSERT INTO schema_next
+    SELECT w.entity_id, x.next_prefix, t.target_id,
+        w.chain || t.target_id || char(31),
+        w.position || printf('%012d', t.rowid)
+    FROM schema_walk w
+    JOIN property t ON t.source_id = w.target_id
+    JOIN schema_expand x ON x.prefix = w.prefix AND x.label = t.property_label
+    WHERE x.action = 'expand' AND t.target_id IS NOT NULL
+    AND instr(w.chain, char(31) || t.target_id || char(31)) = 0
+"""
+
+HELPER_QUERIES = {
+    "fetch_types": (FETCH_TYPES_SQL, []),
+    "fetch_ids": (FETCH_IDS_SQL, ["Dataset"]),
+    "fetch_properties": (FETCH_PROPERTIES_SQL, ["./"]),
+    "fetch_table_properties": (FETCH_TABLE_PROPERTIES_SQL, ["Dataset"]),
+    "table_schema": (TABLE_SCHEMA_SQL.format(value_types="NULL"), ["Dataset"]),
+    "fetch_relation_counts": (FETCH_RELATION_COUNTS_SQL, ["Dataset"]),
+    "relation_fanout": (RELATION_FANOUT_SQL, []),
+    "find_csv": (FIND_CSV_SQL, []),
+}
+
+# Fills in the value of relation rows with the name of the target entity,
+# for ingest modes which don't look up names as the rows are generated.
+# Relations to entities which are in the crate but have no name get NULL,
+# and relations to entities which aren't in the crate keep their ""
+
+RESOLVE_RELATION_NAMES_SQL = """
+    UPDATE property
+    SET value = targets.name
+    FROM (
+        SELECT t.source_id, (
+            SELECT n.value
+            FROM property n
+            WHERE n.source_id = t.source_id AND n.property_label = 'name'
+            ORDER BY n.rowid
+            LIMIT 1
+        ) AS name
+        FROM (SELECT DISTINCT source_id FROM property) AS t
+    ) AS targets
+    WHERE property.target_id = targets.source_id
+"""
+
+# Tables used to find the entities which have changed between builds
+
+HASH_COLUMNS = {
+    "entity_id": str,
+    "hash": str,
+}
+
+CHANGED_ENTITIES_SQL = """
+    SELECT n.entity_id, 'added' AS change
+    FROM new_entity_hash n
+    LEFT JOIN entity_hash o ON o.entity_id = n.entity_id
+    WHERE o.entity_id IS NULL
+    UNION ALL
+    SELECT n.entity_id, 'changed' AS change
+    FROM new_entity_hash n
+    JOIN entity_hash o ON o.entity_id = n.entity_id
+    WHERE o.hash != n.hash
+    UNION ALL
+    SELECT o.entity_id, 'removed' AS change
+    FROM entity_hash o
+    LEFT JOIN new_entity_hash n ON n.entity_id = o.entity_id
+    WHERE n.entity_id IS NULL
+"""
+
+# Relation rows from or to changed entities get their target's name, or ""
+# if the target is no longer in the crate
+
+RESOLVE_CHANGED_NAMES_SQL = """
+    UPDATE property
+    SET value = CASE
+        WHEN EXISTS (
+            SELECT 1 FROM property t WHERE t.source_id = property.target_id
+        ) THEN (
+            SELECT n.value
+            FROM property n
+            WHERE n.source_id = property.target_id AND n.property_label = 'name'
+            ORDER BY n.rowid
+            LIMIT 1
+        )
+        ELSE ''
+    END
+    WHERE target_id IS NOT NULL AND (
+        target_id IN (SELECT entity_id FROM entity_change)
+        OR source_id IN (SELECT entity_id FROM entity_change)
+    )
+"""
+
+# Entities whose rows in entity tables need rebuilding: the changed entities
+# and anything which refers to them
+
+REFRESH_ENTITIES_SQL = """
+    SELECT entity_id FROM entity_change
+    UNION
+    SELECT source_id FROM property
+    WHERE target_id IN (SELECT entity_id FROM entity_change)
+"""
+
+# The fingerprint of the config each entity table was built with, and the
+# version of the property table it was built from. The property table's own
+# row has its current version.
+
+BUILD_STATE_COLUMNS = {
+    "name": str,
+    "fingerprint": str,
+    "property_version": str,
+}
+
+# Table config keys whose lists are compared as sets in fingerprints
+FINGERPRINT_SET_KEYS = {"ignore_props", "expand_props", "junctions"}
+
+JUNCTION_COLUMNS = {
+    "seq": int,
+    "entity_id": str,
+    "target_id": str,
+}
+
+# Default number of extra numbered columns, like author_1 ... author_10, for
+# the values of a multi-valued property. Tables can set max_numbered_cols.
 MAX_NUMBERED_COLS = 10
 # MAX_NUMBERED_COLS = 999  # sqllite limit
 
+# Types which can be inferred for entity table columns, with the flag
+# value_type returns for a value of each type, the SQLite column type and
+# the CSVW datatype. Dates are stored as ISO 8601 text, which sorts in order.
+VALUE_TYPE_FLAGS = {"integer": 1, "real": 2, "date": 4, "datetime": 8, "text": 16}
+COLUMN_TYPES = {
+    "integer": "INTEGER",
+    "real": "FLOAT",
+    "date": "TEXT",
+    "datetime": "TEXT",
+    "text": "TEXT",
+}
+CSVW_DATATYPES = {
+    "integer": "integer",
+    "real": "double",
+    "date": "date",
+    "datetime": "dateTime",
+}
+
+INTEGER_RE = re.compile(r"0|-?[1-9][0-9]*")
+REAL_RE = re.compile(r"-?(0|[1-9][0-9]*)(\.[0-9]+)?([eE][+-]?[0-9]+)?")
+DATE_RE = re.compile(r"[0-9]{4}-[0-9]{2}-[0-9]{2}")
+DATETIME_RE = re.compile(
+    r"[0-9]{4}-[0-9]{2}-[0-9]{2}T[0-9]{2}:[0-9]{2}(:[0-9]{2}(\.[0-9]+)?)?"
+    r"(Z|[+-][0-9]{2}:?[0-9]{2})?"
+)
+
+# Ways of storing the values of multi-valued properties, which tables can
+# set with multi_valued (for all properties) and multi_valued_props
+MULTI_VALUED_MODES = {"numbered", "json", "junction"}
+
+# Number of property rows written to SQLite at a time in streaming mode
+BATCH_SIZE = 1000
+
+# Number of entities built before they are written to an entity table
+CHUNK_SIZE = 1000
+
+# Number of entities whose properties are kept for expanding properties
+EXPAND_CACHE_SIZE = 10000
+
+# Number of threads used to load text files for text_prop
+TEXT_WORKERS = 8
+
+# Tables in a crate's database which aren't copied by merge_db
+MERGE_SKIP_TABLES = {"entity_hash", "build_state"}
+
+# Number of entity tables built at once by build_tables
+TABLE_WORKERS = 1
+
+# Number of rows fetched from an export query at a time
+EXPORT_CHUNK_SIZE = 10000
+
+# Number of export queries run at once
+EXPORT_WORKERS = 1
+
+
+def entity_hash(ejsonld):
+    """Returns a hash of an entity's JSON-LD"""
+    data = json.dumps(ejsonld, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha1(data.encode("utf-8")).hexdigest()
+
+
+def group_entities(rows):
+    """Groups property rows ordered by entity into (entity_id, properties)"""
+    for entity_id, properties in itertools.groupby(
+        rows, key=lambda row: row["source_id"]
+    ):
+        yield entity_id, list(properties)
+
+
+def expand_paths(paths, prop):
+    """Given expand_props paths like ["author", "author.affiliation"], return
+    the paths to follow from prop's target, like ["affiliation"], or None if
+    prop isn't to be expanded. Property names can contain dots."""
+    subpaths = None
+    for path in paths:
+        if path == prop:
+            subpaths = subpaths or []
+        elif path.startswith(prop + "."):
+            subpaths = subpaths or []
+            subpaths.append(path[len(prop) + 1 :])
+    return subpaths
+
+
+def numbered_columns(prop, n_values, n_ids, limit):
+    """The numbered columns for a property with up to n_values values, n_ids
+    of which have targets, in the order prop, prop_id, prop_1, prop_id_1 and
+    so on, with at most limit extra columns of each"""
+    columns = []
+    for i in range(min(max(n_values, n_ids), limit + 1)):
+        suffix = f"_{i}" if i else ""
+        if i < n_values:
+            columns.append(f"{prop}{suffix}")
+        if i < n_ids:
+            columns.append(f"{prop}_id{suffix}")
+    return columns
+
+
+def value_type(value):
+    """Returns the VALUE_TYPE_FLAGS flag for a property value, or None if
+    it's NULL. Integers with leading zeros, like identifiers, are text."""
+    if value is None:
+        return None
+    if type(value) is not str:
+        value = str(value)
+    if INTEGER_RE.fullmatch(value):
+        if -(1 << 63) <= int(value) < 1 << 63:
+            return VALUE_TYPE_FLAGS["integer"]
+    elif REAL_RE.fullmatch(value):
+        if math.isfinite(float(value)):
+            return VALUE_TYPE_FLAGS["real"]
+    elif DATE_RE.fullmatch(value):
+        return VALUE_TYPE_FLAGS["date"]
+    elif DATETIME_RE.fullmatch(value):
+        return VALUE_TYPE_FLAGS["datetime"]
+    return VALUE_TYPE_FLAGS["text"]
+
+
+def column_type(value_types):
+    """Returns the type of a column from the value_types of the schema
+    queries, a comma-separated list of sums of VALUE_TYPE_FLAGS"""
+    flags = 0
+    for types in (value_types or "").split(","):
+        if types:
+            flags |= int(types)
+    integer = VALUE_TYPE_FLAGS["integer"]
+    if flags == integer:
+        return "integer"
+    if flags and not flags & ~(integer | VALUE_TYPE_FLAGS["real"]):
+        return "real"
+    for name in ("date", "datetime"):
+        if flags == VALUE_TYPE_FLAGS[name]:
+            return name
+    return "text"
+
+
+def multi_valued_modes(table, config):
+    """Returns a table config's multi_valued mode and its multi_valued_props,
+    after checking that they're valid"""
+    default = config.get("multi_valued", "numbered")
+    if default not in ("numbered", "json"):
+        raise ROCrateTabulatorException(
+            f"{table}: multi_valued must be numbered or json, not {default}"
+        )
+    modes = config.get("multi_valued_props", {})
+    for prop, mode in modes.items():
+        if mode not in MULTI_VALUED_MODES:
+            raise ROCrateTabulatorException(
+                f"{table}.{prop}: multi_valued_props mode must be one of "
+                f"{', '.join(sorted(MULTI_VALUED_MODES))}, not {mode}"
+            )
+    return default, modes
+
 
 def get_as_list(v):
     """Ensures that a value is a list"""
@@ -86,85 +603,240 @@ def get_as_id(v):
     return None
 
 
+def entity_values(props):
+    """Yields (property_label, value, target_id) for each of an entity's
+    values, in the order of its property rows. The value of a relation is
+    None, since it's the name of the target."""
+    for key, value in props.items():
+        if key != "@id":
+            for v in get_as_list(value):
+                target_id = get_as_id(v)
+                if target_id is not None:
+                    yield key, None, target_id
+                else:
+                    yield key, v, None
+
+
 class ROCrateTabulatorException(Exception):
     pass
 
 
-@dataclass
+# What TablePlan says to do with a property value
+COLUMN, JUNCTION, IGNORE, TEXT, EXPAND, JSON = range(6)
+
+
+class TablePlan:
+    """An entity table's config compiled for building its rows, once per
+    build. The ignored and junction properties are frozensets, and the
+    action for each property label is worked out the first time the label
+    is seen. The labels of all the properties found are collected in
+    props.
+
+    If the table's multi_valued mode is json, multi_valued is the set of
+    properties which have more than one value for some entity: only these
+    are stored as JSON arrays, unless they have their own mode. If it's
+    None, every property is."""
+
+    __slots__ = (
+        "table",
+        "config",
+        "text_prop",
+        "ignore",
+        "junctions",
+        "json",
+        "json_default",
+        "multi_valued",
+        "limit",
+        "expand",
+        "actions",
+        "columns",
+        "subpaths",
+        "props",
+    )
+
+    def __init__(
+        self,
+        table,
+        config,
+        text_prop,
+        max_numbered_cols=MAX_NUMBERED_COLS,
+        multi_valued=None,
+    ):
+        self.table = table
+        self.config = config
+        self.text_prop = text_prop
+        default, modes = multi_valued_modes(table, config)
+        self.ignore = frozenset(config.get("ignore_props", []))
+        junctions = set(config.get("junctions", []))
+        junctions.update(p for p, mode in modes.items() if mode == "junction")
+        # a property with its own mode isn't made a junction by the planner
+        junctions.difference_update(
+            p for p, mode in modes.items() if mode != "junction"
+        )
+        self.junctions = frozenset(junctions)
+        self.json = frozenset(p for p, mode in modes.items() if mode == "json")
+        self.json_default = default == "json"
+        self.multi_valued = multi_valued
+        self.limit = config.get("max_numbered_cols", max_numbered_cols)
+        self.expand = tuple(config.get("expand_props", []))
+        self.actions = {}
+        self.columns = {}
+        self.subpaths = {}
+        self.props = set()
+
+    def action(self, prop):
+        """Returns (action with a target, action without one, subpaths) for
+        a property of the table's entities"""
+        action = self.actions.get(prop)
+        if action is None:
+            subpaths = self.expand_paths(self.expand, prop)
+            plain = self.column(prop)
+            if prop == self.text_prop:
+                targeted = TEXT
+            elif subpaths is not None:
+                targeted = EXPAND
+            else:
+                targeted = plain
+            action = (targeted, plain, subpaths)
+            self.actions[prop] = action
+        return action
+
+    def column(self, prop):
+        """Returns IGNORE, JUNCTION, JSON or COLUMN for a property which
+        isn't being expanded"""
+        action = self.columns.get(prop)
+        if action is None:
+            if prop in self.ignore:
+                action = IGNORE
+            elif prop in self.junctions:
+                action = JUNCTION
+            elif prop in self.json:
+                action = JSON
+            elif (
+                self.json_default
+                and prop not in self.config.get("multi_valued_props", {})
+                and (self.multi_valued is None or prop in self.multi_valued)
+            ):
+                action = JSON
+            else:
+                action = COLUMN
+            self.columns[prop] = action
+        return action
+
+    def expand_paths(self, paths, prop):
+        """A memoized expand_paths, which returns tuples"""
+        key = (paths, prop)
+        if key not in self.subpaths:
+            subpaths = expand_paths(paths, prop)
+            self.subpaths[key] = None if subpaths is None else tuple(subpaths)
+        return self.subpaths[key]
+
+
+@dataclass(slots=True)
 class EntityRecord:
     """Class which represents an entity as mapped to a database row,
     plus any records which are used in junction tables"""
 
-    table: str
+    plan: TablePlan
     tabulator: object
     entity_id: str
-    expand_props: list = field(default_factory=list)
-    ignore_props: list = field(default_factory=list)
-    props: set = field(default_factory=set)
     data: dict = field(default_factory=dict)
     junctions: dict = field(default_factory=dict)
+    text_target: str = None
+    # the next number for each numbered column, once it has a value
+    counts: dict = None
 
     def build(self, properties):
         """Takes the properties of this entity and builds a dictionary to
-        be inserted into the database, plus any junction records required"""
+        be inserted into the database, plus any junction records required.
+        The text_prop column is left empty, and the file to load into it is
+        put in text_target."""
         self.data["entity_id"] = self.entity_id
-        self.config = self.tabulator.config["tables"][self.table]
-        self.text_prop = self.tabulator.text_prop
-        self.expand_props = self.config.get("expand_props", [])
-        self.ignore_props = self.config.get("ignore_props", [])
+        plan = self.plan
+        add_prop = plan.props.add
         for prop_row in properties:
             prop = prop_row["property_label"]
-            value = prop_row["value"]
             target = prop_row["target_id"]
-            self.props.add(prop)
-            if prop == self.text_prop:
-                try:
-                    self.data[prop] = self.tabulator.crate.get(target).fetch()
-                except TinyCrateException as e:
-                    self.data[prop] = f"load failed: {e}"
+            add_prop(prop)
+            targeted, plain, subpaths = plan.actions.get(prop) or plan.action(prop)
+            action = targeted if target else plain
+            if action == COLUMN:
+                self.set_property_numbered(prop, prop_row["value"])
+                if target:
+                    self.set_property_numbered(f"{prop}_id", target)
+            elif action == TEXT:
+                # keeps the column in place until the text is loaded
+                self.data[prop] = None
+                self.text_target = target
+            elif action == EXPAND:
+                self.add_expanded_property(prop, target, subpaths, (self.entity_id,))
+            elif action == JSON:
+                self.set_property_json(prop, prop_row["value"], target)
+            elif action == JUNCTION:
+                self.set_property_relational(prop, prop_row["value"], target)
+
+    def add_expanded_property(self, prop, target, paths, chain):
+        """Look up the properties of a target ID to make expanded properties
+        like author_name author_id. paths are the properties of the target
+        to expand in turn, like affiliation for author.affiliation. chain is
+        the IDs which have been expanded on the way here: these aren't
+        expanded again, so that cycles stop."""
+        chain = chain + (target,)
+        plan = self.plan
+        for label, value, target_id in self.tabulator.target_properties(target):
+            expanded_prop = f"{prop}_{label}"
+            plan.props.add(expanded_prop)
+            if plan.column(expanded_prop) == IGNORE:
+                continue
+            subpaths = plan.expand_paths(paths, label) if paths else None
+            if subpaths is not None and target_id and target_id not in chain:
+                self.add_expanded_property(expanded_prop, target_id, subpaths, chain)
             else:
-                if prop in self.expand_props and target:
-                    self.add_expanded_property(prop, target)
-                else:
-                    if prop not in self.ignore_props:
-                        self.set_property(prop, value, target)
-        return self.props
-
-    def add_expanded_property(self, prop, target):
-        """Do a subquery on a target ID to make expanded properties like
-        author_name author_id"""
-        for ep_row in self.tabulator.fetch_properties(target):
-            expanded_prop = f"{prop}_{ep_row['property_label']}"
-            # Special case - if this is indexable text then we want to read t
-            self.props.add(expanded_prop)
-            if expanded_prop not in self.ignore_props:
-                self.set_property(
-                    expanded_prop,
-                    ep_row["value"],
-                    ep_row["target_id"],
-                )
+                self.set_property(expanded_prop, value, target_id)
 
     def set_property(self, prop, value, target_id):
         """Add a property to entity_data, and add the target_id if defined"""
-        if prop in self.config["junctions"]:
+        action = self.plan.column(prop)
+        if action == JUNCTION:
             self.set_property_relational(prop, value, target_id)
+        elif action == JSON:
+            self.set_property_json(prop, value, target_id)
         else:
             self.set_property_numbered(prop, value)
             if target_id:
                 self.set_property_numbered(f"{prop}_id", target_id)
 
-    # TODO: we should only call this if there are more than one
     def set_property_numbered(self, prop, value):
+        """Set prop, or the next of prop_1, prop_2 ... if it's already set"""
         if prop in self.data:
-            # Find the first available integer to append to property_name
-            i = 1
-            while f"{prop}_{i}" in self.data:
-                i += 1
+            if self.counts is None:
+                self.counts = {}
+            i = self.counts.get(prop, 1)
+            if i > self.plan.limit:
+                raise ROCrateTabulatorException(
+                    f"Too many columns for {prop}_{i}: set max_numbered_cols, "
+                    f"or a multi_valued mode for {prop}, in the "
+                    f"{self.plan.table} config"
+                )
+            self.counts[prop] = i + 1
             prop = f"{prop}_{i}"
-            if i > MAX_NUMBERED_COLS:
-                raise ROCrateTabulatorException(f"Too many columns for {prop}")
         self.data[prop] = value
 
+    def set_property_json(self, prop, value, target_id):
+        """Append a value to a list which is stored as a JSON array, and its
+        target to another list in prop_id"""
+        values = self.data.get(prop)
+        if values is None:
+            self.data[prop] = [value]
+        else:
+            values.append(value)
+        if target_id:
+            ids = self.data.get(f"{prop}_id")
+            if ids is None:
+                self.data[f"{prop}_id"] = [target_id]
+            else:
+                ids.append(target_id)
+
     def set_property_relational(self, prop, value, target_id):
         """Add junctions between an entity and related entities"""
         # FIXME what happens to value here?
@@ -174,6 +846,24 @@ class EntityRecord:
             self.junctions[prop].append(target_id)
 
 
+class CrateIndex:
+    """The properties of the entities which an entity table's rows expand,
+    and the names of the entities they refer to, read straight from a
+    crate by iter_table. It stands in for the tabulator in EntityRecord, so
+    expanded properties are looked up here instead of in the property
+    table."""
+
+    __slots__ = ("properties", "names")
+
+    def __init__(self):
+        # (property_label, value, target_id) for each expanded entity
+        self.properties = {}
+        self.names = {}
+
+    def target_properties(self, target):
+        return self.properties.get(target, [])
+
+
 class Config(collections.UserDict):
     """
     Helper class to provide a default empty config and for pretty display in notebooks.
@@ -230,12 +920,35 @@ class ROCrateTabulator:
     def __init__(self):
         self.crate_dir = None
         self.db_file = None
+        self.in_memory = False
         self.db = None
         self.crate = None
         self.config = Config()
         self.text_prop = None
         self.schemaCrate = minimal_crate()
         self.encodedProps = {}
+        self.batch_size = BATCH_SIZE
+        self.chunk_size = CHUNK_SIZE
+        self.max_numbered_cols = MAX_NUMBERED_COLS
+        self.names = {}
+        self.junction_tables = {}
+        self.table_columns = {}
+        self.fanout = None
+        self.infer_types = False
+        self.text_workers = TEXT_WORKERS
+        self.text_stats = {"files": 0, "bytes": 0, "seconds": 0.0}
+        self.text_cache = None
+        self.remote = Remote()
+        self.changes = {}
+        self.expand_cache_size = EXPAND_CACHE_SIZE
+        self.expand_cache = collections.OrderedDict()
+        self.expand_stats = {"hits": 0, "misses": 0}
+        self.export_chunk_size = EXPORT_CHUNK_SIZE
+        self.export_workers = EXPORT_WORKERS
+        self.table_workers = TABLE_WORKERS
+        self.export_stats = {}
+        self.batch_results = []
+        self.profiler = Profiler()
 
     def use_tables(self, table_names):
         if isinstance(table_names, str):
@@ -258,10 +971,10 @@ class ROCrateTabulator:
             del self.config["potential_tables"][table_name]
 
         message = "### Properties\n"
-        for table in self.config["tables"]:
-            props = self.entity_table(table)
-            self.config["tables"][table]["all_props"] = list(props)
-
+        # tables which are already up to date aren't built again
+        self.build_tables(self.stale_tables())
+        for table, table_config in self.config["tables"].items():
+            props = table_config["all_props"]
             message += f"<details><summary>{table}</summary>"
             message += "<ul>"
             for prop in props:
@@ -385,80 +1098,596 @@ tb.use_tables(["CreativeWork", "Person"])
         else:
             config_file.seek(0)
 
-    def crate_to_db(self, crate_uri, db_file, rebuild=True):
-        """Load the crate and build the properties and relations tables"""
+    def crate_to_db(
+        self,
+        crate_uri,
+        db_file,
+        rebuild=True,
+        stream=False,
+        defer_names=False,
+        incremental=False,
+        in_memory=False,
+    ):
+        """Load the crate and build the properties and relations tables.
+
+        If stream is True, the crate's entities are read one at a time from
+        the metadata file and written to the database in batches, so that
+        memory use doesn't grow with the size of the crate. In this mode,
+        self.crate only has the crate's @context and directory.
+
+        If defer_names is True, relation rows are written without the name
+        of their target, and the names are filled in with a single UPDATE
+        once all the rows are loaded. This is always done when streaming.
+
+        If incremental is True and db_file was built by an earlier run, only
+        the entities which have been added, changed or removed since then
+        are updated, along with their rows in any entity tables in the
+        config. A summary is left in self.changes.
+
+        If in_memory is True, the database is built in memory (starting from
+        a copy of db_file when it isn't rebuilt) and is only written to
+        db_file by snapshot(). This avoids lots of small writes to slow
+        storage."""
         self.crate_dir = crate_uri
-        try:
-            self.crate = TinyCrate(crate_uri)
-        except TinyCrateException as e:
-            raise ROCrateTabulatorException(f"Crate load failed: {e}")
+        self.fanout = None
         self.db_file = db_file
-        if not rebuild:
+        self.in_memory = in_memory
+        if stream:
+            reader = self.stream_crate(crate_uri)
+        else:
+            with self.profiler.stage("crate_parse") as parse:
+                self.open_crate(crate_uri)
+                parse["rows_out"] += len(self.crate.graph)
+        if incremental and Path(db_file).is_file():
+            self.db = self.open_db()
+            if self.db["entity_hash"].exists():
+                if stream:
+                    self.update_db(
+                        self.read_stream(reader),
+                        lambda: self.read_stream(
+                            graph_reader(crate_uri, remote=self.remote)
+                        ),
+                    )
+                else:
+                    self.update_db(self.crate.graph, lambda: self.crate.graph)
+                return self.db
+        if not rebuild and not incremental:
             if not Path(db_file).is_file():
                 raise ROCrateTabulatorException(f"db file {db_file} not found")
-            self.db = Database(self.db_file)
+            if stream:
+                # only read as far as the @context
+                for _ in self.read_stream(reader):
+                    if "@context" in reader.header:
+                        break
+            self.db = self.open_db()
+            self.build_indexes()
             return
-        self.db = Database(self.db_file, recreate=True)
+        self.db = self.open_db(recreate=True)
         properties = self.db["property"].create(PROPERTIES)
-        seq = 0
-        propList = []
-        for e in tqdm(self.crate.all()):
+        self.db["entity_hash"].create(HASH_COLUMNS, pk="entity_id")
+        if stream:
+            entities = self.read_stream(reader)
+        else:
+            entities = self.crate.graph
+        if stream or defer_names:
+            self.names = {}
+        else:
+            self.names = self.entity_names(self.crate.graph)
+        generate = self.profiler.record("property_rows")
+        generated = generate["seconds"]
+        with self.profiler.stage("property_insert") as insert:
+            rows = self.property_rows(
+                self.profiler.count(tqdm(entities), generate), hash_table="entity_hash"
+            )
+            properties.insert_all(
+                self.profiler.count(
+                    self.profiler.iterate(rows, "property_rows"), insert
+                ),
+                batch_size=self.batch_size,
+            )
+        # the rows were generated as they were inserted
+        insert["seconds"] -= generate["seconds"] - generated
+        insert["rows_out"] = insert["rows_in"]
+        with self.profiler.stage("build_indexes"):
+            self.build_indexes()
+        if stream or defer_names:
+            self.resolve_relation_names()
+        self.set_property_version()
+        return self.db
+
+    def open_db(self, recreate=False):
+        """Open db_file, or an in-memory copy of it if in_memory is set"""
+        if not self.in_memory:
+            db = Database(self.db_file, recreate=recreate)
+            self.profiler.watch(db.conn)
+            return db
+        db = Database(memory=True)
+        self.profiler.watch(db.conn)
+        if not recreate and Path(self.db_file).is_file():
+            source = sqlite3.connect(self.db_file)
+            try:
+                source.backup(db.conn)
+            finally:
+                source.close()
+        return db
+
+    def snapshot(self, db_file=None):
+        """Write the database to db_file, or to the file given to
+        crate_to_db, in one pass with the SQLite backup API. The copy is
+        written next to the target and then renamed over it, so the target
+        is never left half written."""
+        db_file = Path(db_file or self.db_file)
+        partial = db_file.with_name(db_file.name + ".partial")
+        if partial.exists():
+            partial.unlink()
+        self.db.conn.commit()
+        target = sqlite3.connect(partial)
+        try:
+            self.db.conn.backup(target)
+        finally:
+            target.close()
+        os.replace(partial, db_file)
+
+    def crates_to_db(self, crate_uris, db_file, workers=None, stream=False):
+        """Tabulate a list of crates into one database, with the same config.
+
+        Each crate is loaded into its own staging database by a worker
+        process, which also plans the junctions of its entity tables. A
+        property which needs a junction table in any crate gets one in all
+        of them, so the entity tables are only built, again by workers, once
+        every crate has been planned. The staging databases are merged into
+        db_file with merge_db in the order the crates were given, with the
+        crate's URI in a crate_id column on every table. A crate which fails
+        is left out, and the outcome for every crate is recorded in
+        self.batch_results."""
+        self.crate_dir = None
+        self.db_file = db_file
+        self.in_memory = False
+        self.db = Database(db_file, recreate=True)
+        self.profiler.watch(self.db.conn)
+        # only used to resolve terms for the CSVW schema
+        self.crate = minimal_crate()
+        self.batch_results = []
+        with (
+            tempfile.TemporaryDirectory() as staging_dir,
+            ProcessPoolExecutor(max_workers=workers) as executor,
+        ):
+            futures = [
+                executor.submit(
+                    load_crate,
+                    crate_uri,
+                    Path(staging_dir) / f"crate{i}.db",
+                    dict(self.config),
+                    stream,
+                    self.remote.cache_dir,
+                )
+                for i, crate_uri in enumerate(crate_uris)
+            ]
+            results = [
+                worker_result(crate_uri, future)
+                for crate_uri, future in zip(crate_uris, futures)
+            ]
+            for result in results:
+                if result["error"] is None:
+                    for table, junctions in result["junctions"].items():
+                        table_config = self.config["tables"][table]
+                        table_config["junctions"] = list(
+                            dict.fromkeys(table_config.get("junctions", []) + junctions)
+                        )
+            futures = [
+                executor.submit(
+                    tabulate_crate,
+                    result["crate"],
+                    result["db_file"],
+                    dict(self.config),
+                    self.text_prop,
+                    self.remote.cache_dir,
+                )
+                if result["error"] is None
+                else None
+                for result in results
+            ]
+            for result, future in zip(results, futures):
+                if future is not None:
+                    loaded = result["seconds"]
+                    result.update(worker_result(result["crate"], future))
+                    result["seconds"] += loaded
+                if result["error"] is None:
+                    self.merge_db(result["db_file"], crate_id=result["crate"])
+                    Path(result["db_file"]).unlink()
+                    # each crate's tables may have found other properties
+                    for table, crate_config in result["tables"].items():
+                        table_config = self.config["tables"][table]
+                        values = dict.fromkeys(table_config.get("all_props", []))
+                        values.update(dict.fromkeys(crate_config.get("all_props", [])))
+                        table_config["all_props"] = list(values)
+                self.batch_results.append(result)
+        if self.db["property"].exists():
+            self.build_indexes()
+            self.db["property"].create_index(
+                ["crate_id"], "idx_property_crate_id", if_not_exists=True
+            )
+        self.set_property_version()
+        for table in self.config["tables"]:
+            if self.db[table].exists():
+                self.build_fts(table)
+                self.record_build_state(table)
+        return self.db
+
+    def merge_db(self, db_file, crate_id=None, replace=False):
+        """Copy the tables from another database into this one with ATTACH
+        and INSERT ... SELECT, creating them with the same columns, primary
+        keys and indexes if they don't exist yet and adding any missing
+        columns. Full-text indexes and MERGE_SKIP_TABLES aren't copied.
+
+        If crate_id is given, it's written to a crate_id column, which is
+        added to the front of the primary key of each new table. If replace
+        is True, tables which are already in this database are dropped
+        first."""
+        self.db.attach("staging", db_file)
+        try:
+            fts = [
+                row[0]
+                for row in self.db.execute(
+                    "SELECT name FROM staging.sqlite_master "
+                    "WHERE type = 'table' AND sql LIKE 'CREATE VIRTUAL TABLE%'"
+                )
+            ]
+            tables = [
+                row[0]
+                for row in self.db.execute(
+                    "SELECT name FROM staging.sqlite_master "
+                    "WHERE type = 'table' AND name NOT LIKE 'sqlite_%' "
+                    "ORDER BY rowid"
+                )
+                if row[0] not in MERGE_SKIP_TABLES
+                and not any(
+                    row[0] == name or row[0].startswith(f"{name}_") for name in fts
+                )
+            ]
+            with self.db.conn:
+                for table in tables:
+                    if replace:
+                        self.db.execute(f"DROP TABLE IF EXISTS main.[{table}]")
+                    self.merge_table(table, crate_id)
+                    if table == "property":
+                        self.fanout = None
+        finally:
+            self.db.execute("DETACH DATABASE staging")
+
+    def merge_table(self, table, crate_id):
+        """Copy one table from the attached staging database"""
+        info = self.db.execute(f"PRAGMA staging.table_info([{table}])").fetchall()
+        columns = {name: col_type for _, name, col_type, _, _, _ in info}
+        if crate_id is not None:
+            columns = {"crate_id": "TEXT", **columns}
+        if not self.db[table].exists():
+            pks = [
+                name for _, name, _, _, _, pk in sorted(info, key=lambda c: c[5]) if pk
+            ]
+            if crate_id is not None and pks:
+                pks = ["crate_id"] + pks
+            defs = [
+                f"[{name}] {col_type}".strip() for name, col_type in columns.items()
+            ]
+            if pks:
+                defs.append("PRIMARY KEY ({})".format(", ".join(f"[{c}]" for c in pks)))
+            self.db.execute(f"CREATE TABLE [{table}] ({', '.join(defs)})")
+            for (sql,) in self.db.execute(
+                "SELECT sql FROM staging.sqlite_master "
+                "WHERE type = 'index' AND tbl_name = ? AND sql IS NOT NULL",
+                [table],
+            ).fetchall():
+                self.db.execute(sql)
+        else:
+            existing = self.db[table].columns_dict
+            for name, col_type in columns.items():
+                if name not in existing:
+                    self.db.execute(
+                        f"ALTER TABLE [{table}] ADD COLUMN [{name}] {col_type}"
+                    )
+        names = ", ".join(f"[{name}]" for name in columns)
+        staged = ", ".join(f"[{name}]" for _, name, _, _, _, _ in info)
+        if crate_id is None:
+            self.db.execute(
+                f"INSERT INTO main.[{table}] ({names}) "
+                f"SELECT {staged} FROM staging.[{table}]"
+            )
+        else:
+            self.db.execute(
+                f"INSERT INTO main.[{table}] ({names}) "
+                f"SELECT ?, {staged} FROM staging.[{table}]",
+                [str(crate_id)],
+            )
+
+    def update_db(self, entities, reread):
+        """Compare the entities with the hashes stored by the last build,
+        and replace the property rows of any which have changed. reread is
+        a function which returns the entities again, for the changed entities'
+        rows."""
+        self.db["new_entity_hash"].drop(ignore=True)
+        self.db["new_entity_hash"].create(HASH_COLUMNS, pk="entity_id")
+        hashes = []
+        for e in tqdm(entities):
+            hashes.append({"entity_id": e.get("@id"), "hash": entity_hash(e)})
+            if len(hashes) >= self.batch_size:
+                self.write_hashes("new_entity_hash", hashes)
+                hashes = []
+        self.write_hashes("new_entity_hash", hashes)
+        self.db["entity_change"].drop(ignore=True)
+        self.db["entity_change"].create({"entity_id": str, "change": str})
+        with self.db.conn:
+            self.db.execute(f"INSERT INTO entity_change {CHANGED_ENTITIES_SQL}")
+        self.changes = {"added": 0, "changed": 0, "removed": 0}
+        for row in self.db.query(
+            "SELECT change, count(*) AS n FROM entity_change GROUP BY change"
+        ):
+            self.changes[row["change"]] = row["n"]
+        if any(self.changes.values()):
+            # tables whose config has changed since they were built can't
+            # just have their changed rows refreshed
+            stale = self.stale_tables()
+            changed = {
+                row["entity_id"]
+                for row in self.db.query("SELECT entity_id FROM entity_change")
+            }
+            seq = self.db.execute(
+                "SELECT COALESCE(MAX(CAST(row_id AS INTEGER)), -1) + 1 FROM property"
+            ).fetchone()[0]
+            with self.db.conn:
+                self.db.execute(
+                    "DELETE FROM property WHERE source_id IN "
+                    "(SELECT entity_id FROM entity_change)"
+                )
+            self.names = {}
+            self.db["property"].insert_all(
+                self.property_rows(
+                    (e for e in reread() if e.get("@id") in changed), seq
+                ),
+                batch_size=self.batch_size,
+            )
+            with self.db.conn:
+                self.db.execute(RESOLVE_CHANGED_NAMES_SQL)
+            self.fanout = None
+            self.set_property_version()
+            self.refresh_tables(stale)
+        # the new hashes are only kept once the tables have been refreshed,
+        # so that if anything fails, the next update finds the same changes
+        with self.db.conn:
+            self.db.execute("DROP TABLE entity_hash")
+            self.db.execute("ALTER TABLE new_entity_hash RENAME TO entity_hash")
+        self.db["entity_change"].drop()
+        self.build_indexes()
+
+    def refresh_tables(self, stale=()):
+        """Rebuild the rows of the entity tables in the config, for entities
+        in entity_change and any entities which refer to them. Tables in
+        stale, which weren't up to date before the property table changed,
+        are built again from scratch."""
+        self.db["entity_refresh"].drop(ignore=True)
+        self.db["entity_refresh"].create({"entity_id": str}, pk="entity_id")
+        with self.db.conn:
+            self.db.execute(f"INSERT INTO entity_refresh {REFRESH_ENTITIES_SQL}")
+            # expansions like author.affiliation reach further than one hop
+            for _ in range(self.expand_depth() - 1):
+                self.db.execute(
+                    "INSERT OR IGNORE INTO entity_refresh "
+                    "SELECT source_id FROM property "
+                    "WHERE target_id IN (SELECT entity_id FROM entity_refresh)"
+                )
+        for table, table_config in self.config["tables"].items():
+            if not self.db[table].exists():
+                continue
+            junctions = list(table_config.get("junctions", []))
+            if table in stale:
+                self.rebuild_table(table, junctions)
+                continue
+            self.entity_table_plan(table)
+            types, json_columns = self.entity_table_types(table)
+            declared = self.declared_columns(table)
+            if table_config["junctions"] != junctions or declared != list(
+                types.items()
+            ):
+                # new relations or properties can need more numbered columns
+                # or a new junction table, and new values can change the
+                # inferred column types, so the table is built again
+                self.rebuild_table(table, junctions)
+                continue
+            jtables = [f"{table}_{prop}" for prop in junctions]
+            with self.db.conn:
+                for t in [table] + jtables:
+                    if self.db[t].exists():
+                        self.db.execute(
+                            f"DELETE FROM [{t}] WHERE entity_id IN "
+                            "(SELECT entity_id FROM entity_refresh)"
+                        )
+            self.table_columns[table] = (list(types), json_columns)
+            rows = self.db.query(FETCH_REFRESH_PROPERTIES_SQL, [table])
+            allprops = self.build_entities(table, group_entities(rows))
+            allprops.update(table_config.get("all_props", []))
+            table_config["all_props"] = list(allprops)
+            # an existing full-text index is kept up to date by its triggers
+            if not self.db[f"{table}_fts"].exists():
+                self.build_fts(table)
+            self.record_build_state(table)
+        self.db["entity_refresh"].drop()
+
+    def rebuild_table(self, table, junctions):
+        """Drop an entity table, with its full-text index and the junction
+        tables for junctions, and build it again"""
+        if self.db[table].detect_fts():
+            self.db[table].disable_fts()
+        for t in [table] + [f"{table}_{prop}" for prop in junctions]:
+            self.db[t].drop(ignore=True)
+        self.entity_table(table)
+
+    def expand_depth(self):
+        """The longest chain of relations followed by any expand_props"""
+        depth = 1
+        for table_config in self.config["tables"].values():
+            for path in table_config.get("expand_props", []):
+                depth = max(depth, path.count(".") + 1)
+        return depth
+
+    def write_hashes(self, hash_table, hashes):
+        self.db[hash_table].insert_all(hashes, pk="entity_id", replace=True)
+
+    def open_crate(self, crate_uri):
+        """Load a crate from a URL, directory or metadata file into
+        self.crate"""
+        try:
+            if is_url(crate_uri):
+                self.crate = TinyCrate(self._load_crate(crate_uri))
+            else:
+                self.crate = TinyCrate(crate_uri)
+        except (TinyCrateException, RemoteException, ValueError) as e:
+            raise ROCrateTabulatorException(f"Crate load failed: {e}")
+
+    def stream_crate(self, crate_uri):
+        """Set self.crate to an empty crate with the right directory, and
+        return a GraphReader for the crate's entities"""
+        location, directory = metadata_location(crate_uri)
+        if directory is not None and not Path(location).is_file():
+            raise ROCrateTabulatorException(f"Crate load failed: {location} not found")
+        self.crate = TinyCrate()
+        self.crate.set_directory(directory)
+        return graph_reader(crate_uri, remote=self.remote)
+
+    def read_stream(self, reader):
+        """Yields entities from a GraphReader, updating self.crate's
+        @context when it's been read"""
+        try:
+            for ejsonld in reader:
+                if "@context" in reader.header:
+                    self.crate.context = reader.header["@context"]
+                yield ejsonld
+        except JSONStreamException as e:
+            raise ROCrateTabulatorException(f"Crate load failed: {e}")
+        if "@context" in reader.header:
+            self.crate.context = reader.header["@context"]
+
+    def property_rows(self, entities, seq=0, hash_table=None):
+        """Returns a generator which yields the property rows for each
+        entity, numbered in order from seq. If hash_table is given, the
+        hash of each entity is written to it as it goes."""
+        hashes = []
+        for e in entities:
+            if hash_table is not None:
+                hashes.append({"entity_id": e.get("@id"), "hash": entity_hash(e)})
+                if len(hashes) >= self.batch_size:
+                    self.write_hashes(hash_table, hashes)
+                    hashes = []
             for row in self.entity_properties(e):
                 row["row_id"] = seq
                 seq += 1
-                propList.append(row)
-        properties.insert_all(propList)
-        return self.db
+                yield row
+        if hashes:
+            self.write_hashes(hash_table, hashes)
+
+    def entity_names(self, graph):
+        """Returns a dict of the name of every entity by id. Entities with
+        no name map to None."""
+        names = {}
+        for e in graph:
+            names.setdefault(e.get("@id"), e.get("name"))
+        return names
+
+    def resolve_relation_names(self):
+        """Set the value of every relation row to the name of its target"""
+        with self.db.conn:
+            self.db.execute(RESOLVE_RELATION_NAMES_SQL)
+
+    def build_indexes(self):
+        """Create the indexes used by the helper queries on the property
+        table, if they don't exist already"""
+        properties = self.db["property"]
+        for index_name, columns in PROPERTY_INDEXES.items():
+            properties.create_index(columns, index_name, if_not_exists=True)
+
+    def index_report(self):
+        """Run EXPLAIN QUERY PLAN on each of the helper queries. Returns a
+        dict by method name with the query plan, the steps which scan a
+        table, and whether the query uses an index: that is, it searches
+        an index and never scans a table. A scan through an index still
+        reads every row, so it counts as a full scan. Scans of subquery
+        results which SQLite has materialized don't count."""
+        report = {}
+        for name, (query, params) in HELPER_QUERIES.items():
+            plan = [
+                row[3] for row in self.db.execute(f"EXPLAIN QUERY PLAN {query}", params)
+            ]
+            subqueries = [
+                step.split()[-1]
+                for step in plan
+                if step.startswith(("MATERIALIZE", "CO-ROUTINE"))
+            ]
+            full_scans = [
+                step
+                for step in plan
+                if step.startswith("SCAN") and step.split()[1] not in subqueries
+            ]
+            searches = [
+                step
+                for step in plan
+                if step.startswith("SEARCH")
+                and ("USING INDEX" in step or "USING COVERING INDEX" in step)
+            ]
+            report[name] = {
+                "plan": plan,
+                "full_scans": full_scans,
+                "uses_index": bool(searches) and not full_scans,
+            }
+        return report
 
     def close(self):
-        """Close the connection to the SQLite database - for Windows users"""
+        """Close the connection to the SQLite database - for Windows users -
+        and any kept-alive HTTP connections"""
         self.db.close()
+        self.remote.close()
 
     def dump_structure(self):
-        """Testing getting metadata about relations from the database"""
-        # get all types
-
+        """Print the relations of each type, with the most targets any one
+        entity of the type has for each of them"""
+        fanout = self.relation_fanout()
         for t in self.fetch_types():
             print(f"@type: {t}")
-            query = """
-    SELECT p.source_id, p.property_label, count(p.target_id) as n_links
-    FROM property as p
-    WHERE p.source_id IN (
-        SELECT p.source_id
-        FROM property p
-        WHERE p.property_label = '@type' AND p.value = ?
-        )
-    GROUP BY p.source_id, p.property_label
-    ORDER BY n_links desc
-    LIMIT 1
-    """
-            summary = self.db.query(query, [t])
-            for row in summary:
-                if row["n_links"] > 0:
-                    print(
-                        row["source_id"]
-                        + "."
-                        + row["property_label"]
-                        + ": "
-                        + str(row["n_links"])
-                    )
+            for label, n_links in fanout.get(t, {}).items():
+                print(f"{t}.{label}: {n_links}")
+
+    def relation_fanout(self):
+        """Returns a dict by type of the most targets any one entity of that
+        type has for each of its properties with targets, largest first.
+        This is worked out for all the types in one pass over the property
+        table the first time it's needed, and kept until the property table
+        is changed by crate_to_db or merge_db."""
+        if self.fanout is None:
+            fanout = {}
+            for row in self.db.query(RELATION_FANOUT_SQL):
+                fanout.setdefault(row["entity_type"], {})[row["property_label"]] = row[
+                    "n_links"
+                ]
+            self.fanout = fanout
+        return self.fanout
 
     def _load_crate(self, crate_uri):
-        if crate_uri[:4] == "http":
-            response = requests.get(crate_uri)
-            return response.json()
+        """Returns a crate's JSON-LD. URLs are fetched through self.remote,
+        so they can be read from its cache if they haven't changed."""
+        if is_url(crate_uri):
+            return json.loads(self.remote.content(crate_uri))
         with open(
             Path(crate_uri) / "ro-crate-metadata.json", "r", encoding="utf-8"
         ) as jfh:
             return json.load(jfh)
 
     def entity_properties(self, e):
-        """Returns a generator which yields all of this entity's rows"""
-        eid = e["@id"]
+        """Returns a generator which yields all of this entity's rows. e can
+        be a TinyEntity or a JSON-LD dict."""
+        props = e.props if isinstance(e, TinyEntity) else e
+        eid = props.get("@id")
         if eid is None:
             return
-        ename = e["name"]
-        for key, value in e.props.items():
+        ename = props.get("name")
+        for key, value in props.items():
             if key != "@id":
                 for v in get_as_list(value):
                     maybe_id = get_as_id(v)
@@ -468,11 +1697,9 @@ tb.use_tables(["CreativeWork", "Person"])
                         yield self.property_row(eid, ename, key, v)
 
     def relation_row(self, eid, ename, prop, tid):
-        """Return a row representing a relation between two entities"""
-        target_name = ""
-        target = self.crate.get(tid)
-        if target:
-            target_name = target["name"]
+        """Return a row representing a relation between two entities. The
+        value is the target's name, or "" if the target isn't in the crate."""
+        target_name = self.names.get(tid, "")
         return {
             "source_id": eid,
             "source_name": ename,
@@ -487,108 +1714,872 @@ tb.use_tables(["CreativeWork", "Person"])
             "source_id": eid,
             "source_name": ename,
             "property_label": prop,
+            "target_id": None,
             "value": value,
         }
 
+    def load_text(self, target):
+        """Return the contents of the file entity target, or an error message
+        if it couldn't be loaded. Uses self.text_cache if it's set."""
+        try:
+            if self.text_cache is None:
+                return self.fetch_text(target)
+            return self.load_cached_text(target)
+        except (TinyCrateException, RemoteException) as e:
+            return f"load failed: {e}"
+
+    def fetch_text(self, target):
+        """Fetch the contents of the file entity target. URLs, and ids in a
+        crate which was loaded from a URL, are fetched through self.remote."""
+        url = self.text_url(target)
+        if url is not None:
+            return self.remote.fetch_text(url)
+        # fetching only needs the id and the crate directory, so this avoids
+        # searching the crate's graph, and works for streamed crates
+        crate = TinyCrate()
+        crate.set_directory(self.crate.directory)
+        return TinyEntity(crate, {"@id": target, "@type": "File"}).fetch()
+
+    def text_url(self, target):
+        """The URL of the file entity target, or None if it's a local file"""
+        if is_url(target):
+            return target
+        if is_url(self.crate_dir):
+            return urljoin(self.crate_dir, target)
+        return None
+
+    def load_cached_text(self, target):
+        """Fetch the contents of the file entity target through the text
+        cache, revalidating against the file's mtime and size or with a
+        conditional HTTP request"""
+        location = self.crate_location()
+        cached = self.text_cache.lookup(location, target)
+        url = self.text_url(target)
+        if url is not None:
+            headers = http_conditional_headers(cached[0] if cached else None)
+            response = self.remote.get(url, headers=headers)
+            if response.status_code == 304 and cached:
+                self.text_cache.record_hit(location, target)
+                return cached[1]
+            if not response.ok:
+                raise RemoteException(
+                    f"http request to {url} failed with status "
+                    f"{response.status_code}"
+                )
+            validator = http_validator(response)
+            text = response.text
+        else:
+            if self.crate.directory is None:
+                return self.fetch_text(target)
+            validator = file_validator(Path(self.crate.directory) / target)
+            if cached and validator is not None and cached[0] == validator:
+                self.text_cache.record_hit(location, target)
+                return cached[1]
+            text = self.fetch_text(target)
+        self.text_cache.record_miss()
+        if validator is not None:
+            self.text_cache.put(location, target, validator, text)
+        return text
+
+    def crate_location(self):
+        """The crate's URL, or the absolute path of its directory"""
+        if is_url(self.crate_dir):
+            return self.crate_dir
+        return str(Path(self.crate_dir).resolve())
+
+    def load_texts(self, pending, executor):
+        """Load the text for a list of (row, target) pairs into the text_prop
+        column of each row, using a thread pool executor if given"""
+        if not pending:
+            return
+        start = time.perf_counter()
+        targets = [target for _, target in pending]
+        with self.profiler.stage("text_fetch", self.text_prop) as fetch:
+            if executor is None:
+                texts = map(self.load_text, targets)
+            else:
+                texts = executor.map(self.load_text, targets)
+            for (row, _), text in zip(pending, texts):
+                row[self.text_prop] = text
+                size = len(text.encode("utf-8"))
+                self.text_stats["files"] += 1
+                self.text_stats["bytes"] += size
+                fetch["rows_out"] += 1
+                fetch["text_bytes"] += size
+            fetch["rows_in"] += len(targets)
+        self.text_stats["seconds"] += time.perf_counter() - start
+
     def entity_table(self, table, text_prop=None):
         """Build a db table for one type of entity. Returns a set() of all
         the properties found during the build. text_prop is a property to
         be loaded and indexed as text. If it's none, the tabulator object's
-        text_prop will be used."""
-        self.entity_table_plan(table)
-        entities = []
-        allprops = set()
+        text_prop will be used.
+
+        The properties of all the entities are read in one query, and the
+        entities are written to the table self.chunk_size at a time."""
+        with self.profiler.stage("plan", table):
+            self.entity_table_plan(table)
         if text_prop is not None:
             self.text_prop = text_prop
-        for entity_id in tqdm(list(self.fetch_ids(table))):
-            entity = EntityRecord(tabulator=self, table=table, entity_id=entity_id)
-            props = entity.build(self.fetch_properties(entity_id))
-            allprops.update(props)
-            entities.append(entity.data)
-            for prop, target_ids in entity.junctions.items():
-                jtable = f"{table}_{prop}"
-                seq = 0
-                for target_id in target_ids:
-                    self.db[jtable].insert(
-                        {
-                            "seq": seq,
-                            "entity_id": entity_id,
-                            "target_id": target_id,
-                        },
-                        pk=("entity_id", "target_id"),
-                        replace=True,
-                        alter=True,
-                    )
-                    seq += 1
-        self.db[table].insert_all(entities, pk="entity_id", replace=True, alter=True)
-        self.config["tables"][table]["all_props"] = list(allprops)
+        with self.profiler.stage("entity_table", table) as build:
+            # the full-text index is rebuilt at the end rather than updated by
+            # triggers on every insert
+            if self.db[table].exists() and self.db[table].detect_fts():
+                self.db[table].disable_fts()
+            with self.profiler.stage("schema", table):
+                self.create_entity_table(table, rebuild=True)
+            rows = self.profiler.count(self.fetch_table_rows(table), build)
+            entities = self.profiler.count(group_entities(rows), build, "rows_out")
+            allprops = self.build_entities(table, entities)
+            self.config["tables"][table]["all_props"] = list(allprops)
+            self.build_fts(table)
+        self.record_build_state(table)
         return list(allprops)
 
-    def entity_table_plan(self, table):
+    def build_tables(self, tables):
+        """Build several entity tables. Returns a dict of the properties
+        found for each table.
+
+        If table_workers is more than one, the tables are built at the same
+        time in worker processes, each of which reads the property table and
+        writes its entity table and junction tables to a staging database.
+        These are merged into the database with merge_db, replacing any
+        earlier builds of the tables, and then their full-text indexes are
+        built. An in-memory database is always built serially."""
+        tables = list(tables)
+        parallel = self.db_file and not self.in_memory
+        if self.table_workers <= 1 or len(tables) < 2 or not parallel:
+            return {table: self.entity_table(table) for table in tables}
+        self.db.conn.commit()
+        options = {
+            "crate_dir": self.crate_dir,
+            "text_prop": self.text_prop,
+            "text_workers": self.text_workers,
+            "chunk_size": self.chunk_size,
+            "max_numbered_cols": self.max_numbered_cols,
+            "infer_types": self.infer_types,
+            "relation_fanout": self.relation_fanout(),
+            "expand_cache_size": self.expand_cache_size,
+            "text_cache": None,
+            "remote": (self.remote.cache_dir, self.remote.pool_size),
+        }
+        if self.text_cache is not None:
+            options["text_cache"] = (
+                self.text_cache.cache_dir,
+                self.text_cache.max_bytes,
+            )
+        self.text_stats = {"files": 0, "bytes": 0, "seconds": 0.0}
+        allprops = {}
+        with (
+            tempfile.TemporaryDirectory() as staging_dir,
+            ProcessPoolExecutor(max_workers=self.table_workers) as executor,
+        ):
+            futures = [
+                executor.submit(
+                    build_table,
+                    self.db_file,
+                    Path(staging_dir) / f"table{i}.db",
+                    table,
+                    dict(self.config),
+                    options,
+                )
+                for i, table in enumerate(tables)
+            ]
+            for table, future in zip(tables, futures):
+                result = future.result()
+                if self.db[table].exists() and self.db[table].detect_fts():
+                    self.db[table].disable_fts()
+                self.merge_db(result["db_file"], replace=True)
+                Path(result["db_file"]).unlink()
+                self.config["tables"][table] = result["table_config"]
+                allprops[table] = result["table_config"]["all_props"]
+                for key in self.text_stats:
+                    self.text_stats[key] += result["text_stats"][key]
+                if self.text_cache is not None:
+                    self.text_cache.hits += result["text_cache"]["hits"]
+                    self.text_cache.misses += result["text_cache"]["misses"]
+                self.build_fts(table)
+                self.record_build_state(table)
+        return allprops
+
+    def table_fingerprint(self, table):
+        """A hash of everything in a table's config, and of the tabulator's
+        settings, which changes what's built. Lists of properties are
+        compared as sets, and outputs of the build like all_props are left
+        out."""
+        table_config = self.config["tables"][table]
+        outputs = {"all_props"}
+        if table_config.get("infer_types", self.infer_types):
+            outputs.add("column_types")
+        config = {}
+        for key, value in table_config.items():
+            if key in FINGERPRINT_SET_KEYS:
+                config[key] = sorted(set(value))
+            elif key not in outputs:
+                config[key] = value
+        settings = {
+            "config": config,
+            "text_prop": self.text_prop,
+            "max_numbered_cols": self.max_numbered_cols,
+            "infer_types": self.infer_types,
+        }
+        data = json.dumps(settings, sort_keys=True, default=str)
+        return hashlib.sha1(data.encode("utf-8")).hexdigest()
+
+    def build_state(self):
+        """Returns a dict of (fingerprint, property_version) by table name
+        from the build_state table"""
+        if not self.db["build_state"].exists():
+            return {}
+        return {
+            row["name"]: (row["fingerprint"], row["property_version"])
+            for row in self.db["build_state"].rows
+        }
+
+    def property_version(self):
+        """The version of the property table, or None if it hasn't got one"""
+        return self.build_state().get("property", (None, None))[1]
+
+    def set_property_version(self):
+        """Give the property table a new version after it has been changed,
+        which makes every entity table built from the old one stale.
+        Versions are counted up from 1 when the database is created."""
+        version = int(self.property_version() or 0) + 1
+        self.db["build_state"].upsert(
+            {
+                "name": "property",
+                "fingerprint": None,
+                "property_version": str(version),
+            },
+            pk="name",
+            columns=BUILD_STATE_COLUMNS,
+        )
+
+    def record_build_state(self, table):
+        """Record that a table has been built with its current config from
+        the current property table"""
+        self.db["build_state"].upsert(
+            {
+                "name": table,
+                "fingerprint": self.table_fingerprint(table),
+                "property_version": self.property_version(),
+            },
+            pk="name",
+            columns=BUILD_STATE_COLUMNS,
+        )
+
+    def stale_tables(self):
+        """Returns the tables in the config which need to be built: those
+        which haven't been built, whose config has changed since they were,
+        or which were built from an older version of the property table"""
+        state = self.build_state()
+        version = state.get("property", (None, None))[1]
+        return [
+            table
+            for table in self.config["tables"]
+            if not self.db[table].exists()
+            or state.get(table) != (self.table_fingerprint(table), version)
+        ]
+
+    def build_fts(self, table):
+        """If the table's config has a list of "fts" columns, build an FTS5
+        index over those which the table has, called TABLE_fts. Triggers keep
+        the index in step with later changes to the table."""
+        fts_columns = self.config["tables"][table].get("fts", [])
+        if not fts_columns or not self.db[table].exists():
+            return
+        columns = [c for c in fts_columns if c in self.db[table].columns_dict]
+        if columns:
+            self.db[table].enable_fts(columns, create_triggers=True, replace=True)
+
+    def search(self, table, query, limit=10):
+        """Full-text search of a table built with "fts" columns. Returns a list
+        of dicts with the entity_id, a snippet of the best-matching column
+        with the matches in [brackets], and the rank, best matches first.
+        The query uses SQLite FTS5 syntax."""
+        fts = f"{table}_fts"
+        if not self.db[fts].exists():
+            raise ROCrateTabulatorException(
+                f'no full-text index for `{table}`: add "fts" columns to its config'
+            )
+        rows = self.db.query(
+            f"""
+            SELECT t.entity_id,
+                snippet([{fts}], -1, '[', ']', '...', 16) AS snippet,
+                [{fts}].rank AS rank
+            FROM [{fts}]
+            JOIN [{table}] t ON t.rowid = [{fts}].rowid
+            WHERE [{fts}] MATCH ?
+            ORDER BY [{fts}].rank
+            LIMIT ?
+            """,
+            [query, limit],
+        )
+        return list(rows)
+
+    def build_entities(self, table, table_entities):
+        """Build and write the rows for an entity table from an iterator of
+        (entity_id, properties). Returns the set of properties found."""
+        self.junction_tables = {}
+        self.expand_cache = collections.OrderedDict()
+        self.expand_stats = {"hits": 0, "misses": 0}
+        self.text_stats = {"files": 0, "bytes": 0, "seconds": 0.0}
+        entities = []
+        pending_text = []
+        junction_rows = {}
+        plan = TablePlan(
+            table,
+            self.config["tables"][table],
+            self.text_prop,
+            self.max_numbered_cols,
+            self.table_columns[table][1],
+        )
+        executor = None
+        if self.text_prop and self.text_workers > 1:
+            executor = ThreadPoolExecutor(max_workers=self.text_workers)
+        try:
+            for entity_id, properties in tqdm(table_entities):
+                entity = EntityRecord(plan, self, entity_id)
+                entity.build(properties)
+                entities.append(entity.data)
+                if entity.text_target:
+                    pending_text.append((entity.data, entity.text_target))
+                for prop, target_ids in entity.junctions.items():
+                    jtable = f"{table}_{prop}"
+                    if jtable not in junction_rows:
+                        junction_rows[jtable] = []
+                    # a repeated target keeps its last position, as it would if
+                    # each row replaced the previous one
+                    seqs = {target_id: seq for seq, target_id in enumerate(target_ids)}
+                    junction_rows[jtable].extend(
+                        (seq, entity_id, target_id) for target_id, seq in seqs.items()
+                    )
+                if len(entities) >= self.chunk_size:
+                    self.load_texts(pending_text, executor)
+                    self.flush_entities(table, entities, junction_rows)
+                    entities = []
+                    pending_text = []
+                    junction_rows = {}
+            self.load_texts(pending_text, executor)
+            self.flush_entities(table, entities, junction_rows)
+        finally:
+            if executor is not None:
+                executor.shutdown()
+        return plan.props
+
+    def iter_table(self, table, crate_uri=None, text_prop=None, stream=False):
+        """Returns an iterator over the rows of an entity table as dicts,
+        built from a crate by the same rules as entity_table, but without
+        building the property table or writing anything to a database. The
+        crate is loaded from crate_uri, or streamed if stream is True. If
+        crate_uri isn't given, the crate loaded by crate_to_db is used.
+
+        The crate's entities are read several times: once to find the
+        table's entities and the most targets each of their properties
+        has, to plan junctions, once for each level of expand_props, and
+        once for the names of the entities they refer to. Only those
+        properties and names are kept. The last pass builds the rows,
+        self.chunk_size at a time, loading text_prop files for each chunk.
+
+        Rows only have the columns the entity has values for, values are
+        as they are in the JSON-LD, and a junction property is a list of
+        its target ids rather than rows in a junction table.
+
+        The rows are built by a separate tabulator with a copy of the
+        table's config, so this tabulator's crate and config are left as
+        they are."""
+        if table not in self.config["tables"]:
+            raise ROCrateTabulatorException(f"Table {table} is not in the config")
+        reader = ROCrateTabulator()
+        reader.config = Config(
+            {"tables": {table: copy.deepcopy(self.config["tables"][table])}}
+        )
+        reader.text_prop = self.text_prop if text_prop is None else text_prop
+        reader.text_workers = self.text_workers
+        reader.chunk_size = self.chunk_size
+        reader.max_numbered_cols = self.max_numbered_cols
+        reader.text_cache = self.text_cache
+        reader.remote = self.remote
+        reader.profiler = self.profiler
+        entities = reader.crate_entities(crate_uri, stream, self.crate, self.crate_dir)
+        return reader.read_table(table, entities)
+
+    def read_table(self, table, entities):
+        """Yields the rows for iter_table"""
+        with self.profiler.stage("index", table) as scan:
+            fanout, index = self.crate_index(table, entities)
+            scan["rows_out"] += len(index.properties) + len(index.names)
+        with self.profiler.stage("plan", table):
+            self.entity_table_plan(table, fanout)
+        self.names = index.names
+        rows = self.table_rows(table, entities, index)
+        yield from self.profiler.iterate(rows, "iter_table", table)
+
+    def crate_entities(self, crate_uri, stream, crate=None, crate_dir=None):
+        """Returns a function which returns an iterator over a crate's
+        entities, so that iter_table can read them more than once. If
+        crate_uri is None, they're read from crate, or else crate_dir."""
+        if crate_uri is None:
+            if crate is not None and crate.graph:
+                self.crate = crate
+                self.crate_dir = crate_dir
+                graph = crate.graph
+                return lambda: iter(graph)
+            crate_uri = crate_dir
+            if crate_uri is None:
+                raise ROCrateTabulatorException(
+                    "iter_table needs a crate_uri if no crate has been loaded"
+                )
+        self.crate_dir = crate_uri
+        if not stream:
+            self.open_crate(crate_uri)
+            graph = self.crate.graph
+            return lambda: iter(graph)
+        self.stream_crate(crate_uri)
+        return lambda: self.read_stream(graph_reader(crate_uri, remote=self.remote))
+
+    def crate_index(self, table, entities):
+        """Read a crate's entities for iter_table. Returns a dict of the
+        most targets any one of the table's entities has for each property,
+        largest first, and a CrateIndex of the entities to be expanded and
+        the names of the entities which are referred to."""
+        expand = tuple(self.config["tables"][table].get("expand_props", []))
+        index = CrateIndex()
+        fanout = {}
+        # the ids whose names are needed, and the ids to be expanded next
+        # with the paths to follow from each of them
+        wanted = set()
+        frontier = {}
+        for e in entities():
+            if e.get("@id") is None or table not in get_as_list(e.get("@type")):
+                continue
+            links = collections.Counter(
+                label
+                for label, _, target_id in self.scan_entity(e, expand, wanted, frontier)
+                if target_id
+            )
+            for label, n_links in links.items():
+                if n_links > fanout.get(label, 0):
+                    fanout[label] = n_links
+        while frontier:
+            expanding, frontier = frontier, {}
+            for e in entities():
+                eid = e.get("@id")
+                paths = expanding.get(eid)
+                if paths is None:
+                    continue
+                values = self.scan_entity(e, tuple(paths), wanted, frontier)
+                index.properties.setdefault(eid, values)
+        for e in entities():
+            eid = e.get("@id")
+            if eid in wanted:
+                index.names.setdefault(eid, e.get("name"))
+        for eid, values in index.properties.items():
+            index.properties[eid] = [
+                (
+                    label,
+                    index.names.get(target_id, "") if target_id else value,
+                    target_id,
+                )
+                for label, value, target_id in values
+            ]
+        fanout = dict(sorted(fanout.items(), key=lambda item: (-item[1], item[0])))
+        return fanout, index
+
+    def scan_entity(self, e, expand, wanted, frontier):
+        """Returns the entity_values of an entity for crate_index, adding
+        the targets of its relations to wanted, and those which expand
+        follows to frontier, with the paths to follow from them"""
+        values = list(entity_values(e))
+        for label, _, target_id in values:
+            if target_id is None:
+                continue
+            wanted.add(target_id)
+            subpaths = expand_paths(expand, label) if expand else None
+            if subpaths is not None:
+                frontier.setdefault(target_id, set()).update(subpaths)
+        return values
+
+    def table_rows(self, table, entities, index):
+        """Yields the rows for iter_table, building them self.chunk_size at
+        a time"""
+        self.text_stats = {"files": 0, "bytes": 0, "seconds": 0.0}
+        plan = TablePlan(
+            table, self.config["tables"][table], self.text_prop, self.max_numbered_cols
+        )
+        if plan.json_default:
+            plan = TablePlan(
+                table,
+                self.config["tables"][table],
+                self.text_prop,
+                self.max_numbered_cols,
+                self.multi_valued_props(table, plan, entities, index),
+            )
+        rows = []
+        pending_text = []
+        executor = None
+        if self.text_prop and self.text_workers > 1:
+            executor = ThreadPoolExecutor(max_workers=self.text_workers)
+        try:
+            for e in entities():
+                eid = e.get("@id")
+                if eid is None or table not in get_as_list(e.get("@type")):
+                    continue
+                entity = EntityRecord(plan, index, eid)
+                entity.build(self.entity_properties(e))
+                for prop, target_ids in entity.junctions.items():
+                    # a repeated target keeps its last position, as it does
+                    # in a junction table
+                    seqs = {target_id: seq for seq, target_id in enumerate(target_ids)}
+                    entity.data[prop] = sorted(seqs, key=seqs.get)
+                rows.append(entity.data)
+                if entity.text_target:
+                    pending_text.append((entity.data, entity.text_target))
+                if len(rows) >= self.chunk_size:
+                    self.load_texts(pending_text, executor)
+                    yield from rows
+                    rows = []
+                    pending_text = []
+            self.load_texts(pending_text, executor)
+            yield from rows
+        finally:
+            if executor is not None:
+                executor.shutdown()
+        self.config["tables"][table]["all_props"] = list(plan.props)
+
+    def multi_valued_props(self, table, plan, entities, index):
+        """For iter_table, which has no schema pass: build the rows of a
+        table which is stored as JSON by default, without keeping them, to
+        find the properties which have more than one value"""
+        multi_valued = set()
+        for e in entities():
+            eid = e.get("@id")
+            if eid is None or table not in get_as_list(e.get("@type")):
+                continue
+            entity = EntityRecord(plan, index, eid)
+            entity.build(self.entity_properties(e))
+            multi_valued.update(
+                prop
+                for prop, value in entity.data.items()
+                if type(value) is list and len(value) > 1
+            )
+        return multi_valued
+
+    def create_entity_table(self, table, rebuild=False):
+        """Create an entity table with the columns found by the schema pass,
+        or add any which are missing if it already exists, so that its rows
+        can be inserted without changing the table.
+
+        If the table's config has infer_types (or self.infer_types is set),
+        the types of the columns are inferred from their values and stored
+        in its column_types, otherwise any column_types in the config are
+        used. If rebuild is True, an existing table whose columns or column
+        types are different is dropped and created again, so that columns
+        which are now ignored go, and the columns are in the same order as
+        they would be in a new table."""
+        types, json_columns = self.entity_table_types(table)
+        if rebuild and self.db[table].exists():
+            if self.declared_columns(table) != list(types.items()):
+                self.db[table].drop()
+        if not self.db[table].exists():
+            self.db[table].create(types, pk="entity_id")
+        else:
+            existing = self.db[table].columns_dict
+            for column in types:
+                if column not in existing:
+                    self.db[table].add_column(column, types[column])
+        self.table_columns[table] = (list(types), json_columns)
+
+    def entity_table_types(self, table):
+        """Run the schema pass for an entity table. Returns a dict of the
+        SQLite type of each of its columns, in order, and the set of columns
+        which hold JSON arrays. Inferred column types are stored in the
+        table's config."""
+        table_config = self.config["tables"][table]
+        infer = table_config.get("infer_types", self.infer_types)
+        columns, json_columns, column_types = self.entity_table_schema(table, infer)
+        if infer:
+            table_config["column_types"] = column_types
+        else:
+            column_types = table_config.get("column_types", {})
+        types = {
+            column: COLUMN_TYPES[column_types.get(column, "text")] for column in columns
+        }
+        return types, json_columns
+
+    def declared_columns(self, table):
+        """The (name, type) of each column of an existing entity table, in
+        order"""
+        return [(c.name, c.type) for c in self.db[table].columns]
+
+    def entity_table_schema(self, table, infer_types=False):
+        """Work out the columns of an entity table from aggregate queries on
+        the property table. Returns the columns in order, with the numbered
+        columns for each property together, the set of columns which hold
+        JSON arrays, and if infer_types is True, a dict of the type of each
+        column which isn't text."""
+        plan = TablePlan(
+            table, self.config["tables"][table], self.text_prop, self.max_numbered_cols
+        )
+        value_types = "NULL"
+        if infer_types:
+            self.db.conn.create_function(
+                "value_type", 1, value_type, deterministic=True
+            )
+            value_types = VALUE_TYPES_SQL
+        # column name: [position, action, values, ids, value types]
+        specs = {}
+
+        def add(name, position, action, n_values, n_ids, types):
+            if action not in (COLUMN, JSON) or not n_values:
+                return
+            spec = specs.get(name)
+            if spec is None:
+                specs[name] = [position, action, n_values, n_ids, types]
+            else:
+                spec[0] = min(spec[0], position)
+                spec[2] = max(spec[2], n_values)
+                spec[3] = max(spec[3], n_ids)
+                spec[4] = ",".join(filter(None, [spec[4], types]))
+
+        expansions = {}
+        sql = TABLE_SCHEMA_SQL.format(value_types=value_types.format("p.value"))
+        for row in self.db.query(sql, [table]):
+            prop = row["property_label"]
+            position = row["position"]
+            types = row["value_types"]
+            targeted, plain, subpaths = plan.action(prop)
+            if targeted == plain:
+                add(prop, position, plain, row["n_values"], row["n_targets"], types)
+                continue
+            # values without a target are stored as usual
+            add(prop, position, plain, row["n_plain"], 0, types)
+            if targeted == TEXT:
+                add(prop, position, COLUMN, 1, 0, None)
+            elif targeted == EXPAND and row["n_targets"]:
+                expansions[prop] = subpaths
+        if expansions:
+            sql = SCHEMA_EXPANDED_SQL.format(value_types=value_types.format("t.value"))
+            for name, position, n_values, n_ids, types in self.expanded_schema(
+                table, plan, expansions, sql
+            ):
+                add(name, position, plan.column(name), n_values, n_ids, types)
+
+        columns = ["entity_id"]
+        json_columns = set()
+        column_types = {}
+        for name, (position, action, n_values, n_ids, types) in sorted(
+            specs.items(), key=lambda item: item[1][0]
+        ):
+            # a table stored as JSON by default only has arrays for the
+            # properties which have more than one value
+            if action == JSON and (name in plan.json or max(n_values, n_ids) > 1):
+                names = [name, f"{name}_id"] if n_ids else [name]
+                json_columns.update(names)
+                columns.extend(names)
+                continue
+            numbered = numbered_columns(name, n_values, n_ids, plan.limit)
+            columns.extend(numbered)
+            if infer_types and name != plan.text_prop:
+                inferred = column_type(types)
+                if inferred != "text":
+                    for i in range(min(n_values, plan.limit + 1)):
+                        column_types[f"{name}_{i}" if i else name] = inferred
+        return list(dict.fromkeys(columns)), json_columns, column_types
+
+    def expanded_schema(self, table, plan, expansions, sql):
+        """Yields (column, position, values, ids, value types) for the
+        expanded properties of a table, given a dict of the expanded
+        properties and their subpaths, and SCHEMA_EXPANDED_SQL. The targets
+        are followed a level at a time in SQL, and the action for each
+        property label at each level is decided here."""
+        self.db.conn.executescript(SCHEMA_TABLES_SQL)
+        paths = dict(expansions)
+        with self.db.conn:
+            for prop in expansions:
+                self.db.execute(SCHEMA_WALK_SQL, [table, prop])
+            while True:
+                labels = self.db.execute(SCHEMA_LABELS_SQL).fetchall()
+                if not labels:
+                    break
+                actions = []
+                for prefix, label in labels:
+                    expanded = f"{prefix}_{label}"
+                    subpaths = None
+                    if paths[prefix]:
+                        subpaths = plan.expand_paths(paths[prefix], label)
+                    if plan.column(expanded) == IGNORE:
+                        action = "ignore"
+                    elif subpaths is None:
+                        action = "column"
+                    else:
+                        action = "expand"
+                        paths[expanded] = subpaths
+                    actions.append((prefix, label, action, expanded))
+                self.db.execute("DELETE FROM schema_expand")
+                self.db.conn.executemany(
+                    "INSERT INTO schema_expand VALUES (?, ?, ?, ?)", actions
+                )
+                for prefix, label, n_values, n_ids, position, types in self.db.execute(
+                    sql
+                ).fetchall():
+                    yield f"{prefix}_{label}", position, n_values, n_ids, types
+                self.db.execute(SCHEMA_NEXT_SQL)
+                self.db.execute("DELETE FROM schema_walk")
+                self.db.execute("INSERT INTO schema_walk SELECT * FROM schema_next")
+                self.db.execute("DELETE FROM schema_next")
+
+    def flush_entities(self, table, entities, junction_rows):
+        """Write a chunk of entity rows to an entity table, and their
+        (seq, entity_id, target_id) rows to each junction table. The table
+        has been created by create_entity_table, so the rows are written
+        with one prepared statement."""
+        if entities:
+            self.insert_entities(table, entities)
+        if not junction_rows:
+            return
+        with self.profiler.stage("junction_write", table) as write:
+            # create any new junction tables before starting the transaction
+            verbs = {
+                jtable: "INSERT OR REPLACE" if self.junction_table(jtable) else "INSERT"
+                for jtable in junction_rows
+            }
+            with self.db.conn:
+                for jtable, rows in junction_rows.items():
+                    self.db.conn.executemany(
+                        f"{verbs[jtable]} INTO [{jtable}] (seq, entity_id, target_id) "
+                        "VALUES (?, ?, ?)",
+                        rows,
+                    )
+                    write["rows_out"] += len(rows)
+
+    def insert_entities(self, table, entities):
+        """Insert or replace a chunk of entity rows"""
+        columns, json_columns = self.table_columns[table]
+        extra = set().union(*entities).difference(columns)
+        if extra:
+            # only a column whose name clashes with another property's
+            # numbered columns can be missed by the schema pass
+            extra = [c for c in dict.fromkeys(itertools.chain(*entities)) if c in extra]
+            for column in extra:
+                self.db[table].add_column(column, str)
+            columns = columns + extra
+            self.table_columns[table] = (columns, json_columns)
+        json_indexes = [i for i, c in enumerate(columns) if c in json_columns]
+        rows = []
+        for entity in entities:
+            row = list(map(entity.get, columns))
+            for i in json_indexes:
+                if row[i] is not None:
+                    row[i] = json.dumps(row[i], ensure_ascii=False)
+            rows.append(row)
+        names = ", ".join(f"[{c}]" for c in columns)
+        params = ", ".join("?" * len(columns))
+        with self.db.conn:
+            self.db.conn.executemany(
+                f"INSERT OR REPLACE INTO [{table}] ({names}) VALUES ({params})", rows
+            )
+
+    def junction_table(self, jtable):
+        """Create a junction table if it doesn't exist. Returns True if rows
+        will need to replace existing ones, ie if the table was there before
+        this build of the entity table."""
+        if jtable in self.junction_tables:
+            return self.junction_tables[jtable]
+        replace = self.db[jtable].exists()
+        if not replace:
+            self.db[jtable].create(JUNCTION_COLUMNS, pk=("entity_id", "target_id"))
+        # the primary key index already covers lookups by entity_id
+        self.db[jtable].create_index(
+            ["target_id"], f"idx_{jtable}_target_id", if_not_exists=True
+        )
+        self.junction_tables[jtable] = replace
+        return replace
+
+    def entity_table_plan(self, table, fanout=None):
         """Check entity relations to see if any need to be done as a junction
-        table to avoid huge numbers of expanded columns"""
-        if "junctions" not in self.config["tables"][table]:
-            self.config["tables"][table]["junctions"] = []
-        for prop_counts in self.fetch_relation_counts(table):
-            if prop_counts["n_links"] > MAX_NUMBERED_COLS:
-                label = prop_counts["property_label"]
-                print(f"{table}.{label} > {MAX_NUMBERED_COLS} relations")
-                self.config["tables"][table]["junctions"].append(label)
+        table to avoid huge numbers of expanded columns. Properties with
+        their own multi_valued mode, and tables whose values are all stored
+        as JSON, are left as they are. fanout is a dict of the most targets
+        any one entity has for each property, largest first: by default it's
+        the table's relation_fanout."""
+        table_config = self.config["tables"][table]
+        if "junctions" not in table_config:
+            table_config["junctions"] = []
+        default, modes = multi_valued_modes(table, table_config)
+        if default == "json":
+            return
+        limit = table_config.get("max_numbered_cols", self.max_numbered_cols)
+        junctions = table_config["junctions"]
+        if fanout is None:
+            fanout = self.relation_fanout().get(table, {})
+        for label, n_links in fanout.items():
+            if n_links <= limit:
+                break
+            if label not in modes and label not in junctions:
+                print(f"{table}.{label} > {limit} relations")
+                junctions.append(label)
 
     # Some helper methods for wrapping SQLite statements
 
     def fetch_types(self):
         """return all types in the database"""
-        rows = self.db.query("""
-            SELECT DISTINCT(p.value)
-            FROM property p
-            WHERE p.property_label = '@type'
-        """)
+        rows = self.db.query(FETCH_TYPES_SQL)
         for t in [row["value"] for row in rows]:
             yield t
 
     def fetch_ids(self, entity_type):
         """return a generator which yields all ids of this type"""
-        rows = self.db.query(
-            """
-            SELECT p.source_id
-            FROM property p
-            WHERE p.property_label = '@type' AND p.value = ?
-        """,
-            [entity_type],
-        )
+        rows = self.db.query(FETCH_IDS_SQL, [entity_type])
         for entity_id in [row["source_id"] for row in rows]:
             yield entity_id
 
     def fetch_properties(self, entity_id):
         """return a generator which yields all properties for an entity"""
-        properties = self.db.query(
-            """
-            SELECT property_label, value, target_id
-            FROM property
-            WHERE source_id = ?
-            """,
-            [entity_id],
-        )
+        properties = self.db.query(FETCH_PROPERTIES_SQL, [entity_id])
         for prop in properties:
             yield prop
 
+    def fetch_table_entities(self, entity_type):
+        """return a generator which yields (entity_id, properties) for all
+        entities of this type, where properties is a list of property rows"""
+        return group_entities(self.fetch_table_rows(entity_type))
+
+    def fetch_table_rows(self, entity_type):
+        """return a generator which yields the property rows of all entities
+        of this type, grouped by entity"""
+        return self.db.query(FETCH_TABLE_PROPERTIES_SQL, [entity_type])
+
+    def target_properties(self, target):
+        """return a list of (property_label, value, target_id) for an entity
+        being expanded. These are cached for the current table build, up to
+        self.expand_cache_size entities."""
+        cache = self.expand_cache
+        if target in cache:
+            self.expand_stats["hits"] += 1
+            cache.move_to_end(target)
+            return cache[target]
+        self.expand_stats["misses"] += 1
+        rows = [
+            (row["property_label"], row["value"], row["target_id"])
+            for row in self.fetch_properties(target)
+        ]
+        cache[target] = rows
+        if len(cache) > self.expand_cache_size:
+            cache.popitem(last=False)
+        return rows
+
     def fetch_relation_counts(self, t):
-        query = """
-    SELECT p.source_id, p.property_label, count(p.target_id) as n_links
-    FROM property as p
-    WHERE p.source_id IN (
-        SELECT p.source_id
-        FROM property p
-        WHERE p.property_label = '@type' AND p.value = ?
-        )
-    GROUP BY p.source_id, p.property_label
-    ORDER BY n_links desc
-    """
-        return self.db.query(query, [t])
+        return self.db.query(FETCH_RELATION_COUNTS_SQL, [t])
 
     def export_csv(self, rocrate_dir):
-        """Export csvs as configured"""
+        """Export csvs as configured.
+
+        If export_workers is more than one, the queries are run concurrently
+        by a pool of threads, each with its own read-only connection to the
+        database. The CSVW schemas are added afterwards in the order of the
+        export_queries, so the ro-crate-metadata.json is the same either
+        way. An in-memory database is always exported serially."""
 
         queries = self.config["export_queries"]
         # print("Global props", self.global_props)
@@ -598,78 +2589,158 @@ tb.use_tables(["CreativeWork", "Person"])
         if rocrate_dir is not None:
             Path(rocrate_dir).mkdir(parents=True, exist_ok=True)
         files = []
+        self.export_stats = {}
 
-        for csv_filename, query in queries.items():
-            files.append({"@id": csv_filename})
-            result = list(self.db.query(query))
-            # Convert result into a CSV file using csv writer
+        csv_paths = {}
+        for csv_filename in queries:
             csv_path = csv_filename
             if rocrate_dir is not None:
                 csv_path = Path(rocrate_dir) / csv_filename
-            with open(csv_path, "w", newline="", encoding="utf-8") as csvfile:
-                writer = csv.DictWriter(
-                    csvfile, fieldnames=result[0].keys(), quoting=csv.QUOTE_MINIMAL
+            csv_paths[csv_filename] = csv_path
+
+        parallel = self.db_file and not self.in_memory
+        if self.export_workers > 1 and len(queries) > 1 and parallel:
+            # the workers' connections can only see committed rows
+            self.db.conn.commit()
+            with ThreadPoolExecutor(max_workers=self.export_workers) as executor:
+                futures = {
+                    csv_filename: executor.submit(
+                        self.export_query, None, query, csv_paths[csv_filename]
+                    )
+                    for csv_filename, query in queries.items()
+                }
+                results = {name: future.result() for name, future in futures.items()}
+        else:
+            results = {
+                csv_filename: self.export_query(
+                    self.db.conn, query, csv_paths[csv_filename]
                 )
-                writer.writeheader()
-                # Check if the key is a string and replace newlines
-
-                keys = set()
-
-                for row in result:
-                    for key, value in row.items():
-                        if isinstance(value, str):
-                            row[key] = value.replace("\n", "\\n").replace("\r", "\\r")
-                        keys.add(key)
-                    writer.writerow(row)
-
-            # add the schema to the CSV
-            schema_id = "#SCHEMA_" + csv_filename
-            schema_props = {
-                "name": "CSVW Table schema for: " + csv_filename,
-                "columns": [],
+                for csv_filename, query in queries.items()
             }
-            for key in keys:
-                base_prop = re.sub(r".*_", "", key)
-                column_props = {
-                    "name": key,
-                    "label": base_prop,
-                }
-                uri = self.crate.resolve_term(base_prop)
-
-                if uri:
-                    column_props["propertyUrl"] = uri
-                    definition = self.crate.get(uri)
-                    if definition:
-                        print("definition", definition["rdfs:comment"])
-                        column_props["description"] = definition["rdfs:comment"]
-                # TODO -- look up local definitions and add a description
-                col_id = "#COLUMN_" + csv_filename + "_" + key
-                self.schemaCrate.add("csvw:Column", col_id, column_props)
-                schema_props["columns"].append({"@id": col_id})
-
-            self.schemaCrate.add(
-                ["File", "csvw:Table"],
-                csv_filename,
-                {
-                    "tableSchema": {"@id": schema_id},
-                    "name": "Generated export from RO-Crate: " + csv_filename,
-                },
-            )
-            self.schemaCrate.add("csvw:Schema", schema_id, schema_props)
 
-            print(f"Exported {csv_filename} to {csv_path}")
+        datatypes = self.export_datatypes()
+        for csv_filename, (columns, stats) in results.items():
+            files.append({"@id": csv_filename})
+            self.export_stats[csv_filename] = stats
+            self.add_csv_schema(csv_filename, columns, datatypes)
+            print(f"Exported {csv_filename} to {csv_paths[csv_filename]}")
 
         root_entity = self.schemaCrate.root()
         root_entity["hasPart"] = files
         root_entity["name"] = "CSV exported from RO-Crate"
         self.schemaCrate.write_json(rocrate_dir)
 
+    def export_query(self, conn, query, csv_path):
+        """Export one query to a CSV file and return its column names and
+        stats. If conn is None, a read-only connection to db_file is opened
+        for the export."""
+        start = time.perf_counter()
+        with self.profiler.stage("export", Path(csv_path).name) as export:
+            if conn is None:
+                uri = Path(self.db_file).resolve().as_uri() + "?mode=ro"
+                ro_conn = sqlite3.connect(uri, uri=True)
+                self.profiler.watch(ro_conn)
+                try:
+                    columns, rows = self.write_csv(ro_conn, query, csv_path)
+                finally:
+                    ro_conn.close()
+            else:
+                columns, rows = self.write_csv(conn, query, csv_path)
+            export["rows_out"] += rows
+        stats = {
+            "rows": rows,
+            "bytes": Path(csv_path).stat().st_size,
+            "seconds": time.perf_counter() - start,
+        }
+        return columns, stats
+
+    def write_csv(self, conn, query, csv_path):
+        """Write the results of a query to a CSV file, fetching
+        export_chunk_size rows at a time. Returns the column names and the
+        number of rows written."""
+        cursor = conn.execute(query)
+        columns = [d[0] for d in cursor.description]
+        rows = 0
+        with open(csv_path, "w", newline="", encoding="utf-8") as csvfile:
+            writer = csv.writer(csvfile, quoting=csv.QUOTE_MINIMAL)
+            writer.writerow(columns)
+            while True:
+                chunk = cursor.fetchmany(self.export_chunk_size)
+                if not chunk:
+                    break
+                writer.writerows(
+                    [
+                        [
+                            v.replace("\n", "\\n").replace("\r", "\\r")
+                            if isinstance(v, str)
+                            else v
+                            for v in row
+                        ]
+                        for row in chunk
+                    ]
+                )
+                rows += len(chunk)
+        cursor.close()
+        return columns, rows
+
+    def export_datatypes(self):
+        """Returns the CSVW datatype of each column name which has the same
+        type in every entity table with a column of that name, and which
+        isn't text"""
+        found = {}
+        for table, table_config in self.config["tables"].items():
+            if not self.db[table].exists():
+                continue
+            column_types = table_config.get("column_types", {})
+            for column in self.db[table].columns_dict:
+                found.setdefault(column, set()).add(column_types.get(column, "text"))
+        datatypes = {}
+        for column, types in found.items():
+            if len(types) == 1 and (column_type := types.pop()) in CSVW_DATATYPES:
+                datatypes[column] = CSVW_DATATYPES[column_type]
+        return datatypes
+
+    def add_csv_schema(self, csv_filename, columns, datatypes=None):
+        """Add a CSVW table and schema for an exported CSV to schemaCrate.
+        datatypes is a dict of the CSVW datatypes of any typed columns."""
+        schema_id = "#SCHEMA_" + csv_filename
+        schema_props = {
+            "name": "CSVW Table schema for: " + csv_filename,
+            "columns": [],
+        }
+        for key in columns:
+            base_prop = re.sub(r".*_", "", key)
+            column_props = {
+                "name": key,
+                "label": base_prop,
+            }
+            if datatypes and key in datatypes:
+                column_props["datatype"] = datatypes[key]
+            uri = self.crate.resolve_term(base_prop)
+
+            if uri:
+                column_props["propertyUrl"] = uri
+                definition = self.crate.get(uri)
+                if definition:
+                    print("definition", definition["rdfs:comment"])
+                    column_props["description"] = definition["rdfs:comment"]
+            # TODO -- look up local definitions and add a description
+            col_id = "#COLUMN_" + csv_filename + "_" + key
+            self.schemaCrate.add("csvw:Column", col_id, column_props)
+            schema_props["columns"].append({"@id": col_id})
+
+        self.schemaCrate.add(
+            ["File", "csvw:Table"],
+            csv_filename,
+            {
+                "tableSchema": {"@id": schema_id},
+                "name": "Generated export from RO-Crate: " + csv_filename,
+            },
+        )
+        self.schemaCrate.add("csvw:Schema", schema_id, schema_props)
+
     def find_csv(self):
-        files = self.db.query("""
-        SELECT source_id
-        FROM property
-        WHERE property_label = '@type' AND value = 'File' AND LOWER(source_id) LIKE '%.csv'
-    """)
+        files = self.db.query(FIND_CSV_SQL)
         for entity_id in [row["source_id"] for row in files]:
             entity_id = entity_id.replace("#", "")
             self.add_csv(self.crate_dir / entity_id, "csv_files")
@@ -684,6 +2755,132 @@ tb.use_tables(["CreativeWork", "Person"])
             # `pk="id"` assumes there's an 'id' column; if no primary key, you can remove it.
 
 
+def crate_list(spec):
+    """Expand a batch of crates given as a glob pattern, or as a manifest
+    file with one crate URL or directory on each line (blank lines and
+    lines starting with # are ignored). Anything else is a single crate."""
+    path = Path(spec)
+    if path.is_file() and path.name != "ro-crate-metadata.json":
+        with open(path, "r", encoding="utf-8") as fh:
+            lines = [line.strip() for line in fh]
+        return [line for line in lines if line and not line.startswith("#")]
+    if glob.has_magic(spec):
+        return sorted(glob.glob(spec))
+    return [spec]
+
+
+def worker_result(crate_uri, future):
+    """The result of a crates_to_db worker, or an error if its process died"""
+    try:
+        return future.result()
+    except Exception as e:
+        return {
+            "crate": crate_uri,
+            "error": f"{type(e).__name__}: {e}",
+            "seconds": 0.0,
+        }
+
+
+def load_crate(crate_uri, db_file, config, stream=False, http_cache=None):
+    """Worker for crates_to_db: load one crate into db_file and plan the
+    junctions of the configured entity tables. Remote crates are fetched
+    with the HTTP cache in http_cache, if given. Returns a dict with the
+    outcome, where error is None if the crate was loaded."""
+    start = time.perf_counter()
+    result = {"crate": crate_uri, "db_file": str(db_file), "error": None}
+    try:
+        tb = ROCrateTabulator()
+        tb.config = Config(config)
+        tb.remote = Remote(http_cache)
+        tb.crate_to_db(crate_uri, db_file, stream=stream)
+        try:
+            for table in tb.config["tables"]:
+                tb.entity_table_plan(table)
+        finally:
+            tb.close()
+        result["junctions"] = {
+            table: table_config["junctions"]
+            for table, table_config in tb.config["tables"].items()
+        }
+    except Exception as e:
+        result["error"] = f"{type(e).__name__}: {e}"
+    result["seconds"] = time.perf_counter() - start
+    return result
+
+
+def tabulate_crate(crate_uri, db_file, config, text_prop=None, http_cache=None):
+    """Worker for crates_to_db: build the configured entity tables for one
+    crate from the property table which load_crate wrote to db_file.
+    Returns a dict with the outcome, where error is None if the tables were
+    built."""
+    start = time.perf_counter()
+    result = {"crate": crate_uri, "db_file": str(db_file), "error": None}
+    try:
+        tb = ROCrateTabulator()
+        tb.config = Config(config)
+        tb.text_prop = text_prop
+        tb.remote = Remote(http_cache)
+        # the crate is already loaded, and text files only need its
+        # directory, so only the start of the metadata is read
+        tb.crate_to_db(crate_uri, db_file, rebuild=False, stream=True)
+        try:
+            for table in tb.config["tables"]:
+                tb.entity_table(table)
+        finally:
+            tb.close()
+        result["tables"] = dict(tb.config["tables"])
+    except Exception as e:
+        result["error"] = f"{type(e).__name__}: {e}"
+    result["seconds"] = time.perf_counter() - start
+    return result
+
+
+def build_table(db_file, staging_file, table, config, options):
+    """Worker for build_tables: build one entity table from the property
+    table in db_file, writing it and its junction tables to staging_file"""
+    tb = ROCrateTabulator()
+    tb.config = Config(config)
+    tb.db_file = db_file
+    tb.crate_dir = options["crate_dir"]
+    tb.text_prop = options["text_prop"]
+    tb.text_workers = options["text_workers"]
+    tb.chunk_size = options["chunk_size"]
+    tb.max_numbered_cols = options["max_numbered_cols"]
+    tb.infer_types = options["infer_types"]
+    tb.fanout = options["relation_fanout"]
+    tb.expand_cache_size = options["expand_cache_size"]
+    if options["text_cache"] is not None:
+        tb.text_cache = TextCache(*options["text_cache"])
+    tb.remote = Remote(*options["remote"])
+    # text files are fetched relative to the crate's directory
+    tb.crate = TinyCrate()
+    if tb.crate_dir is not None:
+        tb.crate.set_directory(metadata_location(tb.crate_dir)[1])
+    tb.db = Database(staging_file, recreate=True)
+    # unqualified table names which aren't in the staging database, like
+    # property, are looked up in the attached one
+    tb.db.attach("source", db_file)
+    table_config = tb.config["tables"][table]
+    # full-text indexes aren't merged, so they're built afterwards
+    fts = table_config.pop("fts", None)
+    try:
+        tb.entity_table(table)
+        if fts is not None:
+            table_config["fts"] = fts
+        result = {
+            "db_file": str(staging_file),
+            "table_config": tb.config["tables"][table],
+            "text_stats": tb.text_stats,
+            "text_cache": {"hits": 0, "misses": 0},
+        }
+        if tb.text_cache is not None:
+            result["text_cache"] = tb.text_cache.stats()
+            tb.text_cache.close()
+    finally:
+        tb.close()
+    return result
+
+
 # Style guide: all print() output should be in the section below this -
 # the library code above needs to be able to work in contexts where it has to
 # write an sqlite database to stdout
@@ -715,6 +2912,51 @@ def parse_args(arg_list=None):
         type=str,
         help="Entities of this type will be loaded as text into the database",
     )
+    ap.add_argument(
+        "--text-workers",
+        default=TEXT_WORKERS,
+        type=int,
+        help="Number of text files to load at once",
+    )
+    ap.add_argument(
+        "--export-workers",
+        default=EXPORT_WORKERS,
+        type=int,
+        help="Number of CSV export queries to run at once",
+    )
+    ap.add_argument(
+        "--text-cache",
+        default=DEFAULT_CACHE_DIR,
+        type=Path,
+        help="Directory for the cache of loaded text files",
+    )
+    ap.add_argument(
+        "--text-cache-size",
+        default=DEFAULT_MAX_BYTES // 1000000,
+        type=int,
+        help="Maximum size of the text cache in MB",
+    )
+    ap.add_argument(
+        "--no-text-cache",
+        action="store_true",
+        help="Always load text files from the crate",
+    )
+    ap.add_argument(
+        "--clear-text-cache",
+        action="store_true",
+        help="Empty the text cache before loading text files",
+    )
+    ap.add_argument(
+        "--http-cache",
+        default=DEFAULT_HTTP_CACHE_DIR,
+        type=Path,
+        help="Directory for the cache of remote metadata documents",
+    )
+    ap.add_argument(
+        "--no-http-cache",
+        action="store_true",
+        help="Always download remote metadata documents",
+    )
     ap.add_argument(
         "--concat",
         action="store_true",
@@ -725,40 +2967,228 @@ def parse_args(arg_list=None):
         action="store_true",
         help="Force rebuild of the database",
     )
+    ap.add_argument(
+        "--incremental",
+        action="store_true",
+        help="Only update the entities which have changed since the last build",
+    )
+    ap.add_argument(
+        "--stream",
+        action="store_true",
+        help="Read the crate's entities one at a time, for very large crates",
+    )
+    ap.add_argument(
+        "--in-memory",
+        action="store_true",
+        help="Build the database in memory and write it to the output file at the end",
+    )
+    ap.add_argument(
+        "--infer-types",
+        action="store_true",
+        help="Store numbers and dates in entity tables as typed columns",
+    )
     ap.add_argument(
         "--structure",
         action="store_true",
         help="Report on the database structure",
     )
+    ap.add_argument(
+        "--table-workers",
+        default=TABLE_WORKERS,
+        type=int,
+        help="Number of entity tables to build at once",
+    )
+    ap.add_argument(
+        "--profile",
+        action="store_true",
+        help="Report the time, rows, SQL statements and peak memory of each stage",
+    )
+    ap.add_argument(
+        "--profile-json",
+        default=None,
+        type=Path,
+        metavar="JSON_FILE",
+        help="Write the --profile report to a JSON file (implies --profile)",
+    )
+    ap.add_argument(
+        "--batch",
+        action="store_true",
+        help="crate is a glob pattern or a file listing crates, which are all "
+        "tabulated into one database",
+    )
+    ap.add_argument(
+        "--workers",
+        default=None,
+        type=int,
+        help="Number of crates to tabulate at once in batch mode (default: one per CPU)",
+    )
     return ap.parse_args(arg_list)
 
 
+def print_profile(report):
+    print(
+        f"{'stage':<16} {'label':<24} {'seconds':>8} {'rows in':>9} "
+        f"{'rows out':>9} {'SQL':>7} {'text MB':>8} {'peak MB':>8}"
+    )
+    for r in report:
+        peak = "" if r["peak_memory"] is None else f"{r['peak_memory'] / 1e6:.1f}"
+        print(
+            f"{r['stage']:<16} {str(r['label'] or ''):<24.24} {r['seconds']:>8.2f} "
+            f"{r['rows_in']:>9} {r['rows_out']:>9} {r['sql_statements']:>7} "
+            f"{r['text_bytes'] / 1e6:>8.1f} {peak:>8}"
+        )
+
+
+def print_text_stats(tb):
+    if tb.text_stats["files"]:
+        files = tb.text_stats["files"]
+        mb = tb.text_stats["bytes"] / 1e6
+        seconds = tb.text_stats["seconds"]
+        print(
+            f"Loaded {files} text files ({mb:.1f} MB) in {seconds:.1f}s: "
+            f"{files / seconds:.1f} files/s"
+        )
+    if tb.text_cache is not None:
+        stats = tb.text_cache.stats()
+        print(f"Text cache: {stats['hits']} hits, {stats['misses']} misses")
+    stats = tb.remote.stats()
+    if stats["requests"]:
+        print(
+            f"HTTP: {stats['requests']} requests, "
+            f"{stats['not_modified']} not modified"
+        )
+
+
+def batch_main(tb, args):
+    crates = crate_list(args.crate)
+    if not crates:
+        print(f"No crates found for {args.crate}")
+        sys.exit(1)
+    if args.config.is_file():
+        print(f"Loading config from {args.config}")
+        tb.load_config(args.config)
+    else:
+        print(f"Config {args.config} not found - generating default from {crates[0]}")
+        tb.crate_to_db(crates[0], args.output, stream=args.stream)
+        tb.infer_config()
+        tb.close()
+
+    print(f"Tabulating {len(crates)} crates")
+    start = time.perf_counter()
+    tb.crates_to_db(crates, args.output, workers=args.workers, stream=args.stream)
+    seconds = time.perf_counter() - start
+    failed = [result for result in tb.batch_results if result["error"]]
+    for result in failed:
+        print(f"Failed: {result['crate']}: {result['error']}")
+    done = len(crates) - len(failed)
+    print(f"Tabulated {done} crates in {seconds:.1f}s: {done / seconds:.1f} crates/s")
+
+    tb.write_config(args.config)
+    tb.export_csv(args.csv)
+
+
 def main(args):
     tb = ROCrateTabulator()
 
-    if Path(args.output).is_file() and not args.rebuild:
+    tb.text_prop = args.text
+    tb.text_workers = args.text_workers
+    tb.export_workers = args.export_workers
+    tb.table_workers = args.table_workers
+    tb.infer_types = args.infer_types
+    profile = args.profile or args.profile_json is not None
+    if profile:
+        tb.profiler.trace_sql = True
+        tb.profiler.trace_memory = True
+    tb.remote = Remote(
+        None if args.no_http_cache else args.http_cache,
+        max(POOL_SIZE, args.text_workers),
+    )
+    if tb.text_prop and not args.no_text_cache:
+        tb.text_cache = TextCache(args.text_cache, args.text_cache_size * 1000000)
+        if args.clear_text_cache:
+            tb.text_cache.clear()
+
+    if args.batch:
+        batch_main(tb, args)
+    else:
+        tabulate(tb, args)
+    if profile:
+        print_profile(tb.profiler.report())
+        if args.profile_json is not None:
+            tb.profiler.write_json(args.profile_json)
+            print(f"Wrote profile to {args.profile_json}")
+
+
+def tabulate(tb, args):
+    config_loaded = False
+    if args.incremental and args.config.is_file():
+        # load the config first so that its tables are updated too
+        print(f"Loading config from {args.config}")
+        tb.load_config(args.config)
+        config_loaded = True
+
+    if Path(args.output).is_file() and args.incremental:
+        print("Updating properties table")
+        tb.crate_to_db(
+            args.crate,
+            args.output,
+            stream=args.stream,
+            incremental=True,
+            in_memory=args.in_memory,
+        )
+        if tb.changes:
+            print(
+                "Entities added: {added}, changed: {changed}, removed: {removed}".format(
+                    **tb.changes
+                )
+            )
+    elif Path(args.output).is_file() and not args.rebuild:
         print("Loading properties table")
-        tb.crate_to_db(args.crate, args.output, rebuild=False)
+        tb.crate_to_db(
+            args.crate,
+            args.output,
+            rebuild=False,
+            stream=args.stream,
+            in_memory=args.in_memory,
+        )
     else:
         print("Building properties table")
-        tb.crate_to_db(args.crate, args.output)
+        tb.crate_to_db(
+            args.crate, args.output, stream=args.stream, in_memory=args.in_memory
+        )
 
     if args.structure:
+        if args.in_memory:
+            tb.snapshot()
         tb.dump_structure()
-        sys.exit()
+        return
 
-    if args.config.is_file():
-        print(f"Loading config from {args.config}")
-        tb.load_config(args.config)
+    if not config_loaded:
+        if args.config.is_file():
+            print(f"Loading config from {args.config}")
+            tb.load_config(args.config)
+        else:
+            print(f"Config {args.config} not found - generating default")
+            tb.infer_config()
+
+    tables = list(tb.config["tables"])
+    if args.incremental:
+        # tables which were up to date have already been updated by
+        # crate_to_db
+        tables = tb.stale_tables()
+    if tb.table_workers > 1 and len(tables) > 1:
+        print(f"Building entity tables for {', '.join(tables)}")
+        tb.build_tables(tables)
+        print_text_stats(tb)
     else:
-        print(f"Config {args.config} not found - generating default")
-        tb.infer_config()
+        for table in tables:
+            print(f"Building entity table for {table}")
+            tb.entity_table(table)
+            print_text_stats(tb)
 
-    tb.text_prop = args.text
-    for table in tb.config["tables"]:
-        print(f"Building entity table for {table}")
-        allprops = tb.entity_table(table)
-        tb.config["tables"][table]["all_props"] = list(allprops)
+    if args.in_memory:
+        print(f"Writing database to {args.output}")
+        tb.snapshot()
 
     tb.write_config(args.config)
     print(f"""
@@ -769,6 +3199,13 @@ Updated config file: {args.config}, edit this file to change the flattening conf
         tb.find_csv_contents()
 
     tb.export_csv(args.csv)
+    for csv_filename, stats in tb.export_stats.items():
+        mb = stats["bytes"] / 1e6
+        seconds = max(stats["seconds"], 1e-6)
+        print(
+            f"{csv_filename}: {stats['rows']} rows ({mb:.1f} MB) in "
+            f"{stats['seconds']:.1f}s: {stats['rows'] / seconds:.0f} rows/s"
+        )
 
 
 def cli():
@@ -0,0 +1,173 @@
+"""On-disk cache for text files loaded by the tabulator
+
+Entries are keyed by the crate's location and the file entity's id, and
+store a validator so that stale entries can be detected: the mtime and size
+for local files, or the ETag and Last-Modified headers for HTTP. When the
+cache is bigger than its size cap, the least recently used entries are
+evicted. The cache's total size is kept in the database and updated in the
+same transaction as the entries, so that worker processes sharing a cache
+agree on it.
+"""
+
+from pathlib import Path
+import os
+import sqlite3
+import threading
+import time
+
+DEFAULT_CACHE_DIR = (
+    Path(os.environ.get("XDG_CACHE_HOME", Path.home() / ".cache")) / "rocrate-tabular"
+)
+DEFAULT_MAX_BYTES = 1 << 30
+
+CACHE_SCHEMA = """
+    CREATE TABLE IF NOT EXISTS text (
+        location TEXT,
+        entity_id TEXT,
+        validator TEXT,
+        content TEXT,
+        size INTEGER,
+        last_used REAL,
+        PRIMARY KEY (location, entity_id)
+    );
+    CREATE INDEX IF NOT EXISTS idx_text_last_used ON text (last_used);
+    CREATE TABLE IF NOT EXISTS cache_size (total INTEGER);
+    INSERT INTO cache_size
+        SELECT COALESCE(SUM(size), 0) FROM text
+        WHERE NOT EXISTS (SELECT 1 FROM cache_size);
+"""
+
+
+def file_validator(path):
+    """Validator for a local file, or None if it can't be read"""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return f"{st.st_mtime_ns}:{st.st_size}"
+
+
+def http_validator(response):
+    """Validator for an HTTP response, or None if it has no ETag or
+    Last-Modified header"""
+    etag = response.headers.get("ETag", "")
+    last_modified = response.headers.get("Last-Modified", "")
+    if not (etag or last_modified):
+        return None
+    return f"{etag}\n{last_modified}"
+
+
+def http_conditional_headers(validator):
+    """Request headers to revalidate an entry with an http_validator"""
+    if validator is None:
+        return {}
+    etag, last_modified = validator.split("\n", 1)
+    headers = {}
+    if etag:
+        headers["If-None-Match"] = etag
+    if last_modified:
+        headers["If-Modified-Since"] = last_modified
+    return headers
+
+
+class TextCache:
+    """LRU cache of text content stored in an SQLite file. It can be shared
+    by the threads which load text files."""
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_MAX_BYTES):
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(self.cache_dir / "text.db", check_same_thread=False)
+        with self.conn:
+            self.conn.executescript(CACHE_SCHEMA)
+        self.total = self._total()
+
+    def lookup(self, location, entity_id):
+        """Returns (validator, content) for an entry, or None"""
+        with self.lock:
+            return self.conn.execute(
+                "SELECT validator, content FROM text "
+                "WHERE location = ? AND entity_id = ?",
+                [location, entity_id],
+            ).fetchone()
+
+    def record_hit(self, location, entity_id):
+        """Count a hit and mark the entry as used"""
+        with self.lock, self.conn:
+            self.hits += 1
+            self.conn.execute(
+                "UPDATE text SET last_used = ? WHERE location = ? AND entity_id = ?",
+                [time.time(), location, entity_id],
+            )
+
+    def record_miss(self):
+        with self.lock:
+            self.misses += 1
+
+    def put(self, location, entity_id, validator, content):
+        """Add or replace an entry, then evict entries until the cache is
+        under its size cap. Other processes can't write to the cache until
+        this has finished."""
+        size = len(content.encode("utf-8"))
+        if size > self.max_bytes:
+            return
+        with self.lock, self.conn:
+            self.conn.execute("BEGIN IMMEDIATE")
+            old = self.conn.execute(
+                "SELECT size FROM text WHERE location = ? AND entity_id = ?",
+                [location, entity_id],
+            ).fetchone()
+            self.conn.execute(
+                "INSERT OR REPLACE INTO text VALUES (?, ?, ?, ?, ?, ?)",
+                [location, entity_id, validator, content, size, time.time()],
+            )
+            self.total = self._total() + size - (old[0] if old else 0)
+            self._evict()
+            self.conn.execute("UPDATE cache_size SET total = ?", [self.total])
+
+    def _total(self):
+        (total,) = self.conn.execute("SELECT total FROM cache_size").fetchone()
+        return total
+
+    def _evict(self):
+        while self.total > self.max_bytes:
+            rows = self.conn.execute(
+                "SELECT location, entity_id, size FROM text "
+                "ORDER BY last_used, rowid LIMIT 100"
+            ).fetchall()
+            if not rows:
+                # the stored total was wrong, which can only happen if the
+                # cache file was changed by something else
+                self.total = 0
+                break
+            for location, entity_id, size in rows:
+                self.conn.execute(
+                    "DELETE FROM text WHERE location = ? AND entity_id = ?",
+                    [location, entity_id],
+                )
+                self.total -= size
+                if self.total <= self.max_bytes:
+                    break
+
+    def clear(self):
+        """Remove every entry"""
+        with self.lock, self.conn:
+            self.conn.execute("DELETE FROM text")
+            self.conn.execute("UPDATE cache_size SET total = 0")
+            self.total = 0
+
+    def stats(self):
+        with self.lock:
+            self.total = self._total()
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "bytes": self.total,
+        }
+
+    def close(self):
+        self.conn.close()
@@ -1,6 +1,6 @@
 # crate builder
 
-from rocrate_tabular.tinycrate import minimal_crate
+from tinycrate.tinycrate import minimal_crate
 
 
 def make_wide_dataset(dir):
@@ -0,0 +1,99 @@
+from pathlib import Path
+from rocrate_tabular.tabulator import MAX_NUMBERED_COLS, ROCrateTabulator, crate_list
+from util import table_config, write_crate
+
+TABLES = ["CreativeWork", "Person"]
+
+
+def make_crate(crate_dir, n, n_authors=1):
+    """A crate with n works. The first has n_authors authors, and the
+    others have the first of them."""
+    authors = [{"@id": "#author"}] + [
+        {"@id": f"#author{j}"} for j in range(1, n_authors)
+    ]
+    entities = [("Person", "#author", {"name": f"Author of crate {n}"})]
+    for j in range(1, n_authors):
+        entities.append(("Person", f"#author{j}", {"name": f"Author {j} of crate {n}"}))
+    for i in range(n):
+        props = {"name": f"Work {i}", "author": authors if i == 0 else authors[0]}
+        if i == 1:
+            props["description"] = "Has a description"
+        entities.append(("CreativeWork", f"#work{i}", props))
+    return write_crate(crate_dir, entities, name=f"Crate {n}")
+
+
+def batch_tabulator():
+    tb = ROCrateTabulator()
+    for table in TABLES:
+        tb.config["tables"][table] = table_config()
+    return tb
+
+
+def test_batch(tmp_path):
+    cwd = Path(tmp_path)
+    crates = [make_crate(cwd / "crates" / f"c{n}", n) for n in [1, 2, 3]]
+    broken = cwd / "crates" / "broken"
+    broken.mkdir()
+    (broken / "ro-crate-metadata.json").write_text("{ not json")
+    crates.insert(1, str(broken))
+
+    tb = batch_tabulator()
+    db = tb.crates_to_db(crates, cwd / "batch.db", workers=2)
+
+    assert [r["crate"] for r in tb.batch_results] == crates
+    assert [r["error"] is None for r in tb.batch_results] == [
+        True,
+        False,
+        True,
+        True,
+    ]
+    counts = {
+        row["crate_id"]: row["n"]
+        for row in db.query(
+            "SELECT crate_id, COUNT(*) AS n FROM CreativeWork "
+            "WHERE entity_id LIKE '#work%' GROUP BY crate_id"
+        )
+    }
+    assert counts == {crates[0]: 1, crates[2]: 2, crates[3]: 3}
+    # the same ids in different crates don't collide
+    assert db["Person"].pks == ["crate_id", "entity_id"]
+    assert db["Person"].count == 3
+    assert "crate_id" in db["property"].columns_dict
+    (n,) = db.execute(
+        "SELECT COUNT(DISTINCT crate_id) FROM property WHERE source_id = '#author'"
+    ).fetchone()
+    assert n == 3
+    assert "description" in tb.config["tables"]["CreativeWork"]["all_props"]
+
+
+def test_batch_junctions(tmp_path):
+    cwd = Path(tmp_path)
+    crates = [
+        make_crate(cwd / "crates" / "c1", 2),
+        make_crate(cwd / "crates" / "c2", 2, n_authors=MAX_NUMBERED_COLS + 2),
+    ]
+    tb = batch_tabulator()
+    db = tb.crates_to_db(crates, cwd / "batch.db", workers=2)
+    assert [r["error"] for r in tb.batch_results] == [None, None]
+    # the second crate's fan-out makes author a junction table, and the
+    # first crate's authors go in it too instead of in numbered columns
+    assert tb.config["tables"]["CreativeWork"]["junctions"] == ["author"]
+    counts = {
+        row["crate_id"]: row["n"]
+        for row in db.query(
+            "SELECT crate_id, COUNT(*) AS n FROM CreativeWork_author GROUP BY crate_id"
+        )
+    }
+    assert counts == {crates[0]: 2, crates[1]: MAX_NUMBERED_COLS + 3}
+    assert not [c for c in db["CreativeWork"].columns_dict if c.startswith("author")]
+    assert tb.stale_tables() == []
+
+
+def test_crate_list(tmp_path):
+    cwd = Path(tmp_path)
+    crates = [make_crate(cwd / "crates" / f"c{n}", n) for n in [1, 2]]
+    assert crate_list(str(cwd / "crates" / "c*")) == crates
+    manifest = cwd / "crates.txt"
+    manifest.write_text(f"# crates\n{crates[1]}\n\nhttps://example.org/crate\n")
+    assert crate_list(str(manifest)) == [crates[1], "https://example.org/crate"]
+    assert crate_list(crates[0]) == [crates[0]]
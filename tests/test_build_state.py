@@ -0,0 +1,49 @@
+from pathlib import Path
+from rocrate_tabular.tabulator import ROCrateTabulator
+
+
+def builds(tb):
+    return {
+        record["label"]: record["calls"]
+        for record in tb.profiler.report()
+        if record["stage"] == "entity_table"
+    }
+
+
+def test_use_tables(crates, tmp_path):
+    tb = ROCrateTabulator()
+    tb.crate_to_db(crates["languageFamily"], Path(tmp_path) / "lf.db")
+    tb.infer_config()
+    tb.use_tables(["Person"])
+    assert tb.stale_tables() == []
+    tb.use_tables(["Organization"])
+    assert builds(tb) == {"Person": 1, "Organization": 1}
+
+    tb.ignore_properties("Person", ["name"])
+    assert tb.stale_tables() == ["Person"]
+    tb.use_tables(["Language"])
+    assert builds(tb) == {"Person": 2, "Organization": 1, "Language": 1}
+    assert "name" not in tb.db["Person"].columns_dict
+
+    # changing the property table makes every table stale
+    tb.set_property_version()
+    assert tb.stale_tables() == ["Person", "Organization", "Language"]
+    tb.close()
+
+
+def test_build_state_kept(crates, tmp_path):
+    db_file = Path(tmp_path) / "lf.db"
+    tb = ROCrateTabulator()
+    tb.crate_to_db(crates["languageFamily"], db_file)
+    tb.infer_config()
+    tb.use_tables(["Person"])
+    config = tb.config
+    tb.close()
+
+    tb = ROCrateTabulator()
+    tb.config = config
+    tb.crate_to_db(crates["languageFamily"], db_file, rebuild=False)
+    assert tb.stale_tables() == []
+    tb.text_prop = "ldac:mainText"
+    assert tb.stale_tables() == ["Person"]
+    tb.close()
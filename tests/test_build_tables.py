@@ -0,0 +1,31 @@
+from pathlib import Path
+from util import dump, tabulator
+
+
+def test_build_tables(crates, tmp_path):
+    for subdir in ["serial", "parallel"]:
+        (Path(tmp_path) / subdir).mkdir()
+    serial = tabulator(Path(tmp_path) / "serial", crates["languageFamily"])
+    tables = list(serial.config["tables"])
+    assert len(tables) > 1
+    serial.build_tables(tables)
+    serial.close()
+
+    parallel = tabulator(Path(tmp_path) / "parallel", crates["languageFamily"])
+    parallel.table_workers = 3
+    parallel.config["tables"]["RepositoryObject"]["fts"] = ["name"]
+    # an earlier build is replaced
+    parallel.entity_table("RepositoryObject")
+    allprops = parallel.build_tables(tables)
+    assert set(allprops) == set(tables)
+    for table in tables:
+        assert parallel.config["tables"][table]["all_props"] == allprops[table]
+        assert "junctions" in parallel.config["tables"][table]
+    assert parallel.search("RepositoryObject", "Danish")
+    parallel.db["RepositoryObject"].disable_fts()
+    parallel.close()
+
+    # the parallel build's RepositoryObject config has fts columns, so its
+    # fingerprint is different
+    skip = ["build_state"]
+    assert dump(serial.db_file, skip) == dump(parallel.db_file, skip)
@@ -0,0 +1,121 @@
+from pathlib import Path
+from rocrate_tabular.tabulator import (
+    VALUE_TYPE_FLAGS,
+    column_type,
+    value_type,
+)
+from tinycrate.tinycrate import TinyCrate
+from util import build, load, table_config, write_crate
+
+
+def test_value_type():
+    for value, expected in [
+        ("12", "integer"),
+        ("-3", "integer"),
+        ("007", "text"),
+        ("99999999999999999999", "text"),
+        ("3.5", "real"),
+        ("1e5", "real"),
+        ("1e999", "text"),
+        ("2025-01-02", "date"),
+        ("2025-01-02T10:30:00Z", "datetime"),
+        ("2025", "integer"),
+        ("twelve", "text"),
+    ]:
+        assert value_type(value) == VALUE_TYPE_FLAGS[expected], value
+    assert value_type(None) is None
+    assert column_type("1,3") == "real"
+    assert column_type("1,4") == "text"
+    assert column_type(None) == "text"
+
+
+def make_crate(crate_dir, pages=None):
+    """A crate of books. If pages is given, it's the first book's
+    numberOfPages"""
+    entities = []
+    for i in range(5):
+        props = {
+            "name": f"Book {i}",
+            "numberOfPages": pages if pages and not i else str(100 + i),
+            "price": f"{i}.5" if i else "3",
+            "datePublished": f"202{i}-01-01",
+            "identifier": f"00{i}",
+            "rating": [str(i), str(i + 1)],
+        }
+        entities.append(("Book", f"#book{i}", props))
+    return write_crate(crate_dir, entities)
+
+
+def build_books(tmp_path, infer_types):
+    crate = make_crate(Path(tmp_path) / "crate")
+    tables = {"Book": table_config(infer_types=infer_types)}
+    return build(crate, Path(tmp_path) / "types.db", tables)
+
+
+def test_infer_types(tmp_path, monkeypatch):
+    tb = build_books(tmp_path, True)
+    assert tb.config["tables"]["Book"]["column_types"] == {
+        "numberOfPages": "integer",
+        "price": "real",
+        "datePublished": "date",
+        "rating": "integer",
+        "rating_1": "integer",
+    }
+    declared = {c.name: c.type for c in tb.db["Book"].columns}
+    assert declared["numberOfPages"] == "INTEGER"
+    assert declared["price"] == "FLOAT"
+    assert declared["identifier"] == "TEXT"
+    row = tb.db.execute(
+        "SELECT typeof(numberOfPages), typeof(price), identifier FROM Book "
+        "WHERE entity_id = '#book1'"
+    ).fetchone()
+    assert row == ("integer", "real", "001")
+    rows = tb.db.query("SELECT entity_id FROM Book WHERE numberOfPages > 102")
+    assert [row["entity_id"] for row in rows] == ["#book3", "#book4"]
+
+    monkeypatch.setattr(tb.crate, "resolve_term", lambda term: None)
+    tb.config["export_queries"] = {"books.csv": "SELECT * FROM Book"}
+    tb.export_csv(Path(tmp_path) / "csv")
+    csv_crate = TinyCrate(Path(tmp_path) / "csv")
+    datatypes = {
+        e["name"]: e.props.get("datatype")
+        for e in csv_crate.all()
+        if e.type == "csvw:Column"
+    }
+    assert datatypes["numberOfPages"] == "integer"
+    assert datatypes["price"] == "double"
+    assert datatypes["datePublished"] == "date"
+    assert datatypes["name"] is None
+
+
+def test_retype(tmp_path):
+    tb = build_books(tmp_path, False)
+    declared = {c.name: c.type for c in tb.db["Book"].columns}
+    assert declared["numberOfPages"] == "TEXT"
+    tb.config["tables"]["Book"]["infer_types"] = True
+    tb.entity_table("Book")
+    declared = {c.name: c.type for c in tb.db["Book"].columns}
+    assert declared["numberOfPages"] == "INTEGER"
+    assert tb.db["Book"].count == 5
+
+
+def test_incremental_retype(tmp_path):
+    tb = build_books(tmp_path, True)
+    config = tb.config
+    tb.close()
+    make_crate(Path(tmp_path) / "crate", pages="unnumbered")
+    tb = load(
+        Path(tmp_path) / "crate",
+        Path(tmp_path) / "types.db",
+        config["tables"],
+        incremental=True,
+    )
+    assert tb.changes["changed"] == 1
+    assert config["tables"]["Book"]["column_types"]["price"] == "real"
+    assert "numberOfPages" not in config["tables"]["Book"]["column_types"]
+    declared = {c.name: c.type for c in tb.db["Book"].columns}
+    assert declared["numberOfPages"] == "TEXT"
+    rows = tb.db.execute("SELECT typeof(numberOfPages) FROM Book").fetchall()
+    assert rows == [("text",)] * 5
+    assert tb.stale_tables() == []
+    tb.close()
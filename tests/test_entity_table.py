@@ -0,0 +1,56 @@
+from pathlib import Path
+from rocrate_tabular.tabulator import (
+    COLUMN,
+    EXPAND,
+    IGNORE,
+    JUNCTION,
+    TEXT,
+    TablePlan,
+)
+from util import tabulator
+
+
+def build_tables(tmp_path, crate, chunk_size):
+    tmp_path.mkdir()
+    tb = tabulator(tmp_path, crate)
+    tb.chunk_size = chunk_size
+    tables = {}
+    for table in tb.config["tables"]:
+        tb.entity_table(table)
+        tables[table] = list(tb.db.query(f"SELECT * FROM [{table}]"))
+    tb.close()
+    return tables
+
+
+def test_chunk_size(crates, tmp_path):
+    for crate in ["languageFamily", "wide"]:
+        one = build_tables(Path(tmp_path) / f"{crate}_1", crates[crate], 3)
+        many = build_tables(Path(tmp_path) / f"{crate}_n", crates[crate], 1000)
+        assert one == many
+
+
+def test_entities_in_crate_order(crates, tmp_path):
+    tb = tabulator(tmp_path, crates["languageFamily"])
+    tb.entity_table("RepositoryObject")
+    rows = list(tb.db.query("SELECT entity_id FROM RepositoryObject ORDER BY rowid"))
+    assert [row["entity_id"] for row in rows] == list(tb.fetch_ids("RepositoryObject"))
+
+
+def test_table_plan():
+    plan = TablePlan(
+        "CreativeWork",
+        {
+            "ignore_props": ["description"],
+            "expand_props": ["author", "author.affiliation"],
+            "junctions": ["hasPart"],
+        },
+        "ldac:mainText",
+    )
+    assert plan.action("name") == (COLUMN, COLUMN, None)
+    assert plan.action("description") == (IGNORE, IGNORE, None)
+    assert plan.action("hasPart") == (JUNCTION, JUNCTION, None)
+    # only values with a target are expanded, or loaded as text
+    assert plan.action("author") == (EXPAND, COLUMN, ("affiliation",))
+    assert plan.action("ldac:mainText") == (TEXT, COLUMN, None)
+    assert plan.column("author_description") == COLUMN
+    assert plan.actions["author"] is plan.action("author")
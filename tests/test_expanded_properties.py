@@ -1,4 +1,4 @@
-from util import tabulator, read_config, write_config
+from util import people_crate, tabulator, read_config, write_config
 from pathlib import Path
 from tinycrate.tinycrate import TinyCrate
 
@@ -29,3 +29,39 @@ def test_expanded_properties(crates, tmp_path):
                 eprop = f"{prop}_{relprop}"
                 assert eprop in row
                 assert row[eprop] == rele[relprop]
+
+
+def test_multi_level_expansion(tmp_path):
+    tb = tabulator(tmp_path, people_crate(tmp_path))
+    tb.config["tables"]["CreativeWork"]["expand_props"] = [
+        "author.affiliation",
+        "author.knows.knows",
+    ]
+    tb.entity_table("CreativeWork")
+    rows = list(
+        tb.db.query(
+            "SELECT * FROM CreativeWork WHERE entity_id LIKE '#work%' "
+            "ORDER BY entity_id"
+        )
+    )
+    assert len(rows) == 5
+    row = rows[0]
+    assert row["author_name"] == "Person 0"
+    assert row["author_affiliation_name"] == "Org"
+    assert row["author_knows_name"] == "Person 1"
+    # author.knows.knows leads back to the author, so it isn't expanded
+    assert row["author_knows_knows"] == "Person 0"
+    assert row["author_knows_knows_id"] == "#person0"
+    assert "author_knows_knows_name" not in row
+    # two authors and an organization are looked up once each
+    assert tb.expand_stats["misses"] == 3
+    assert tb.expand_stats["hits"] == 12
+
+
+def test_expand_cache_size(tmp_path):
+    tb = tabulator(tmp_path, people_crate(tmp_path))
+    tb.config["tables"]["CreativeWork"]["expand_props"] = ["author"]
+    tb.expand_cache_size = 1
+    tb.entity_table("CreativeWork")
+    assert len(tb.expand_cache) == 1
+    assert tb.expand_stats == {"hits": 0, "misses": 5}
@@ -1,6 +1,7 @@
 from pathlib import Path
-from rocrate_tabular.tabulator import ROCrateTabulator
-from tinycrate.tinycrate import TinyCrate
+from rocrate_tabular.tabulator import PROPERTIES, ROCrateTabulator
+from tinycrate.tinycrate import TinyCrate, minimal_crate
+from util import tabulator
 import json
 import sys
 import csv
@@ -73,3 +74,74 @@ def test_export(crates, csv_headers, tmp_path):
 
     for ro in objects:
         assert ro["@id"] in csv_data
+
+
+def test_export_streaming(crates, tmp_path, monkeypatch):
+    cwd = Path(tmp_path)
+    tb = ROCrateTabulator()
+    tb.crate_to_db(crates["languageFamily"], cwd / "lf.db")
+    tb.infer_config()
+    # don't resolve the crate's remote context
+    monkeypatch.setattr(tb.crate, "resolve_term", lambda term: None)
+    tb.db["escapes"].insert({"id": 1, "text": "line one\nline two\r\n"})
+    tb.config["export_queries"] = {
+        "props.csv": "SELECT source_id, property_label, value FROM property",
+        "empty.csv": "SELECT * FROM property WHERE source_id = 'nonexistent'",
+        "escapes.csv": "SELECT * FROM escapes",
+    }
+    tb.export_chunk_size = 7
+    csvout = cwd / "csv"
+    tb.export_csv(csvout)
+
+    (n,) = tb.db.execute("SELECT COUNT(*) FROM property").fetchone()
+    with open(csvout / "props.csv", newline="") as cfh:
+        rows = list(csv.reader(cfh))
+    assert rows[0] == ["source_id", "property_label", "value"]
+    assert len(rows) == n + 1
+    assert tb.export_stats["props.csv"]["rows"] == n
+    assert (
+        tb.export_stats["props.csv"]["bytes"] == (csvout / "props.csv").stat().st_size
+    )
+
+    with open(csvout / "empty.csv", newline="") as cfh:
+        rows = list(csv.reader(cfh))
+    assert rows == [list(PROPERTIES)]
+    assert tb.export_stats["empty.csv"]["rows"] == 0
+
+    with open(csvout / "escapes.csv", newline="") as cfh:
+        rows = list(csv.reader(cfh))
+    assert rows[1] == ["1", "line one\\nline two\\r\\n"]
+
+    schema = TinyCrate(csvout).get("#SCHEMA_empty.csv")
+    assert len(schema["columns"]) == len(PROPERTIES)
+
+
+def test_export_parallel(crates, tmp_path, monkeypatch):
+    cwd = Path(tmp_path)
+    tb = tabulator(cwd, crates["languageFamily"])
+    tb.entity_table("RepositoryObject")
+    tb.entity_table("Language")
+    monkeypatch.setattr(tb.crate, "resolve_term", lambda term: None)
+    tb.config["export_queries"] = {
+        "lf.csv": "SELECT * FROM RepositoryObject",
+        "languages.csv": "SELECT * FROM Language",
+        "props.csv": "SELECT * FROM property",
+        "empty.csv": "SELECT * FROM property WHERE source_id = 'nonexistent'",
+    }
+    tb.export_csv(cwd / "serial")
+    serial_stats = tb.export_stats
+
+    tb.schemaCrate = minimal_crate()
+    tb.export_workers = 4
+    tb.export_csv(cwd / "parallel")
+    for csv_filename in tb.config["export_queries"]:
+        serial = (cwd / "serial" / csv_filename).read_bytes()
+        assert (cwd / "parallel" / csv_filename).read_bytes() == serial
+        assert (
+            tb.export_stats[csv_filename]["rows"]
+            == (serial_stats[csv_filename]["rows"])
+        )
+    metadata = "ro-crate-metadata.json"
+    assert (cwd / "parallel" / metadata).read_bytes() == (
+        cwd / "serial" / metadata
+    ).read_bytes()
@@ -0,0 +1,37 @@
+from pathlib import Path
+from rocrate_tabular.tabulator import ROCrateTabulator
+from sqlite_utils import Database
+from util import build, dump
+
+TABLES = {"RepositoryObject": None}
+
+
+def test_in_memory(crates, tmp_path):
+    cwd = Path(tmp_path)
+    tb = build(crates["languageFamily"], cwd / "disk.db", TABLES)
+    tb.close()
+
+    tb = build(crates["languageFamily"], cwd / "memory.db", TABLES, in_memory=True)
+    assert not (cwd / "memory.db").exists()
+    tb.snapshot()
+    tb.close()
+    assert (cwd / "memory.db").is_file()
+    assert not (cwd / "memory.db.partial").exists()
+    assert dump(cwd / "memory.db") == dump(cwd / "disk.db")
+
+
+def test_in_memory_reload(crates, tmp_path):
+    cwd = Path(tmp_path)
+    dbfile = cwd / "lf.db"
+    build(crates["languageFamily"], dbfile, TABLES).close()
+
+    # starts from a copy of the existing file, which isn't touched until
+    # the snapshot
+    tb = ROCrateTabulator()
+    tb.crate_to_db(crates["languageFamily"], dbfile, rebuild=False, in_memory=True)
+    assert tb.db["RepositoryObject"].exists()
+    tb.db["RepositoryObject"].drop()
+    assert "RepositoryObject" in Database(dbfile).table_names()
+    tb.snapshot()
+    tb.close()
+    assert "RepositoryObject" not in Database(dbfile).table_names()
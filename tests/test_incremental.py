@@ -0,0 +1,184 @@
+from pathlib import Path
+from rocrate_tabular.tabulator import (
+    MAX_NUMBERED_COLS,
+    ROCrateTabulator,
+    main,
+    parse_args,
+)
+from util import build, load, read_config, table_config, write_config, write_crate
+
+TABLES = ["CreativeWork", "Person"]
+
+
+def make_crate(crate_dir, edited=False, n_authors=1):
+    """A crate of works and their authors. The edited crate renames, adds
+    and removes entities, and its first work has n_authors authors."""
+    entities = []
+    for i in range(max(3, n_authors)):
+        name = f"Person {i}"
+        if edited and i == 1:
+            name = "Person 1, renamed"
+        entities.append(("Person", f"#person{i}", {"name": name}))
+    for i in range(5):
+        if edited and i == 2:
+            continue
+        props = {"name": f"Work {i}", "author": {"@id": f"#person{i % 3}"}}
+        if edited and i == 0 and n_authors > 1:
+            props["author"] = [{"@id": f"#person{j}"} for j in range(n_authors)]
+        if edited and i == 3:
+            props["description"] = "Added a description"
+        entities.append(("CreativeWork", f"#work{i}", props))
+    if edited:
+        entities.append(("CreativeWork", "#work5", {"name": "Work 5"}))
+    return write_crate(crate_dir, entities)
+
+
+def tables(**settings):
+    """Configs for TABLES which expand author, with settings"""
+    return {
+        table: table_config(**{"expand_props": ["author"], **settings})
+        for table in TABLES
+    }
+
+
+def contents(tb):
+    properties = sorted(
+        tuple(row.values())
+        for row in tb.db.query(
+            "SELECT source_id, source_name, property_label, target_id, value "
+            "FROM property"
+        )
+    )
+    tables = {
+        table: list(tb.db.query(f"SELECT * FROM [{table}] ORDER BY entity_id"))
+        for table in TABLES
+    }
+    return properties, tables
+
+
+def junction_rows(tb):
+    return list(
+        tb.db.query("SELECT * FROM CreativeWork_author ORDER BY entity_id, seq")
+    )
+
+
+def test_incremental(tmp_path):
+    for stream in [False, True]:
+        cwd = Path(tmp_path) / f"stream_{stream}"
+        crate_dir = make_crate(cwd / "crate")
+        db_file = cwd / "sqlite.db"
+        build(crate_dir, db_file, tables(), stream=stream).close()
+
+        make_crate(cwd / "crate", edited=True)
+        tb = load(crate_dir, db_file, tables(), stream=stream, incremental=True)
+        assert tb.changes == {"added": 1, "changed": 2, "removed": 1}
+        updated = contents(tb)
+        tb.close()
+
+        tb = build(crate_dir, cwd / "rebuilt.db", tables(), stream=stream)
+        assert updated == contents(tb)
+        tb.close()
+
+
+def test_incremental_new_junction(tmp_path):
+    cwd = Path(tmp_path)
+    crate_dir = make_crate(cwd / "crate")
+    # expanded relations can't be junctions
+    tb = build(crate_dir, cwd / "sqlite.db", tables(expand_props=[]))
+    config = tb.config["tables"]
+    assert config["CreativeWork"]["junctions"] == []
+    tb.close()
+
+    # an update which gives a work more authors than there can be columns
+    make_crate(cwd / "crate", edited=True, n_authors=MAX_NUMBERED_COLS + 2)
+    tb = load(crate_dir, cwd / "sqlite.db", config, incremental=True)
+    assert config["CreativeWork"]["junctions"] == ["author"]
+    assert tb.stale_tables() == []
+    updated = contents(tb), junction_rows(tb)
+    tb.close()
+
+    tb = build(crate_dir, cwd / "rebuilt.db", tables(expand_props=[]))
+    assert updated == (contents(tb), junction_rows(tb))
+    tb.close()
+
+
+def test_incremental_config_changed(tmp_path):
+    cwd = Path(tmp_path)
+    crate_dir = make_crate(cwd / "crate")
+    tb = build(crate_dir, cwd / "sqlite.db", tables())
+    config = tb.config["tables"]
+    tb.close()
+
+    # config changes which don't change the columns
+    config["Person"]["ignore_props"].append("email")
+    config["Person"]["column_types"] = {"name": "integer"}
+    make_crate(cwd / "crate", edited=True)
+    tb = load(crate_dir, cwd / "sqlite.db", config, incremental=True)
+    assert tb.stale_tables() == []
+    assert tb.db["Person"].columns_dict["name"] is int
+    updated = contents(tb)
+    tb.close()
+
+    rebuilt = tables()
+    rebuilt["Person"]["column_types"] = {"name": "integer"}
+    tb = build(crate_dir, cwd / "rebuilt.db", rebuilt)
+    assert updated == contents(tb)
+    tb.close()
+
+
+def test_incremental_unchanged(tmp_path):
+    crate_dir = make_crate(Path(tmp_path) / "crate")
+    db_file = Path(tmp_path) / "sqlite.db"
+    load(crate_dir, db_file, tables()).close()
+    tb = load(crate_dir, db_file, tables(), incremental=True)
+    assert tb.changes == {"added": 0, "changed": 0, "removed": 0}
+    assert "entity_change" not in tb.db.table_names()
+
+
+def test_incremental_cli(tmp_path):
+    cwd = Path(tmp_path)
+    crate_dir = make_crate(cwd / "crate")
+    arg_list = [
+        "--incremental",
+        "-c",
+        str(cwd / "config.json"),
+        "--csv",
+        str(cwd / "csv"),
+        crate_dir,
+        str(cwd / "sqlite.db"),
+    ]
+    main(parse_args(arg_list))
+    # the first run only writes a config with potential tables
+    cf = read_config(cwd / "config.json")
+    cf["tables"] = cf["potential_tables"]
+    cf["potential_tables"] = {}
+    write_config(cf, cwd / "config.json")
+    main(parse_args(arg_list))
+    make_crate(cwd / "crate", edited=True)
+    main(parse_args(arg_list))
+    tb = ROCrateTabulator()
+    tb.crate_to_db(crate_dir, cwd / "sqlite.db", rebuild=False)
+    tb.load_config(cwd / "config.json")
+    assert tb.stale_tables() == []
+    works = {row["entity_id"]: row for row in tb.db["CreativeWork"].rows}
+    assert sorted(w for w in works if w.startswith("#work")) == [
+        "#work0",
+        "#work1",
+        "#work3",
+        "#work4",
+        "#work5",
+    ]
+    assert works["#work3"]["description"] == "Added a description"
+    assert works["#work1"]["author"] == "Person 1, renamed"
+    tb.close()
+    # a table whose config has changed is rebuilt even if the crate hasn't
+    cf = read_config(cwd / "config.json")
+    cf["tables"]["CreativeWork"]["ignore_props"].append("description")
+    write_config(cf, cwd / "config.json")
+    main(parse_args(arg_list))
+    tb = ROCrateTabulator()
+    tb.crate_to_db(crate_dir, cwd / "sqlite.db", rebuild=False)
+    tb.load_config(cwd / "config.json")
+    assert tb.stale_tables() == []
+    assert "description" not in tb.db["CreativeWork"].columns_dict
+    tb.close()
@@ -0,0 +1,39 @@
+from util import tabulator
+from rocrate_tabular.tabulator import HELPER_QUERIES, PROPERTY_INDEXES
+
+
+def test_indexes_built(crates, tmp_path):
+    tb = tabulator(tmp_path, crates["languageFamily"])
+    indexes = {index.name for index in tb.db["property"].indexes}
+    assert set(PROPERTY_INDEXES) <= indexes
+
+
+def test_index_report(crates, tmp_path):
+    tb = tabulator(tmp_path, crates["languageFamily"])
+    report = tb.index_report()
+    for name, result in report.items():
+        assert result["uses_index"], f"{name} does a full scan: {result['plan']}"
+
+
+def test_properties_in_crate_order(crates, tmp_path):
+    tb = tabulator(tmp_path, crates["languageFamily"])
+    entity = tb.crate.root()
+    labels = [row["property_label"] for row in tb.fetch_properties(entity.id)]
+    expected = []
+    for prop, value in entity.props.items():
+        if prop != "@id":
+            expected.extend([prop] * (len(value) if type(value) is list else 1))
+    assert labels == expected
+
+
+def test_index_scan_flagged(crates, tmp_path, monkeypatch):
+    tb = tabulator(tmp_path, crates["languageFamily"])
+    # every row is read, even though it's through an index
+    monkeypatch.setitem(
+        HELPER_QUERIES,
+        "scan",
+        ("SELECT source_id FROM property ORDER BY source_id", []),
+    )
+    result = tb.index_report()["scan"]
+    assert result["full_scans"]
+    assert not result["uses_index"]
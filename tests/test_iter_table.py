@@ -0,0 +1,106 @@
+from pathlib import Path
+import copy
+import pytest
+from rocrate_tabular.tabulator import ROCrateTabulator, ROCrateTabulatorException
+from util import people_crate, tabulator
+
+
+def db_rows(tb, table):
+    """An entity table's rows, without NULLs, with the targets of each
+    junction property as a list"""
+    rows = {}
+    for row in tb.db.query(f"SELECT * FROM [{table}]"):
+        rows[row["entity_id"]] = {k: v for k, v in row.items() if v is not None}
+    for prop in tb.config["tables"][table]["junctions"]:
+        jtable = f"{table}_{prop}"
+        if not tb.db[jtable].exists():
+            continue
+        for row in tb.db.query(f"SELECT * FROM [{jtable}] ORDER BY seq"):
+            rows[row["entity_id"]].setdefault(prop, []).append(row["target_id"])
+    return rows
+
+
+def streamed_rows(config, table, crate, **kwargs):
+    tb = ROCrateTabulator()
+    tb.config = config
+    rows = {}
+    for row in tb.iter_table(table, crate, **kwargs):
+        rows[row["entity_id"]] = {
+            k: v if type(v) is list else str(v) for k, v in row.items() if v is not None
+        }
+    assert tb.db is None
+    return rows
+
+
+def test_iter_table(crates, tmp_path):
+    tb = tabulator(tmp_path, crates["languageFamily"])
+    for table_config in tb.config["tables"].values():
+        table_config["max_numbered_cols"] = 3
+    tb.config["tables"]["RepositoryObject"]["expand_props"] = ["license"]
+    for table in tb.config["tables"]:
+        tb.entity_table(table)
+    for table in tb.config["tables"]:
+        expected = db_rows(tb, table)
+        for stream in [False, True]:
+            rows = streamed_rows(
+                tb.config, table, crates["languageFamily"], stream=stream
+            )
+            assert rows == expected, table
+    tb.close()
+
+
+def test_iter_table_expanded(tmp_path):
+    crate = people_crate(tmp_path)
+    tb = tabulator(tmp_path, crate)
+    tb.config["tables"]["CreativeWork"]["expand_props"] = [
+        "author.affiliation",
+        "author.knows.knows",
+    ]
+    tb.entity_table("CreativeWork")
+    expected = db_rows(tb, "CreativeWork")
+    tb.close()
+    rows = streamed_rows(tb.config, "CreativeWork", crate)
+    assert rows == expected
+    assert rows["#work0"]["author_knows_knows_id"] == "#person0"
+
+
+def test_iter_table_text(crates, tmp_path):
+    tb = tabulator(tmp_path, crates["textfiles"])
+    tb.entity_table("Dataset", "indexableText")
+    expected = db_rows(tb, "Dataset")
+    tb.close()
+    rows = streamed_rows(
+        tb.config, "Dataset", crates["textfiles"], text_prop="indexableText"
+    )
+    assert rows == expected
+    assert rows["doc001"]["indexableText"].startswith("Lorem ipsum")
+
+
+def test_iter_table_loaded_crate(crates, tmp_path):
+    tb = tabulator(tmp_path, crates["languageFamily"])
+    rows = list(tb.iter_table("Person"))
+    assert len(rows) == tb.db["property"].count_where(
+        "property_label = '@type' AND value = 'Person'"
+    )
+    tb.close()
+    assert Path(tmp_path, "sqlite.db").is_file()
+
+
+def test_iter_table_leaves_tabulator(crates, tmp_path):
+    tb = tabulator(tmp_path, crates["textfiles"])
+    tb.entity_table("Dataset", "indexableText")
+    expected = db_rows(tb, "Dataset")
+    config = copy.deepcopy(tb.config)
+    crate, crate_dir = tb.crate, tb.crate_dir
+    # another crate, with a limit which makes junctions of its relations
+    tb.config["tables"]["Dataset"]["max_numbered_cols"] = 2
+    assert list(tb.iter_table("Dataset", crates["languageFamily"], stream=True))
+    tb.config["tables"]["Dataset"].pop("max_numbered_cols")
+    assert tb.config == config
+    assert (tb.crate, tb.crate_dir) == (crate, crate_dir)
+    assert "Dataset" not in tb.stale_tables()
+    tb.entity_table("Dataset", "indexableText")
+    assert db_rows(tb, "Dataset") == expected
+    with pytest.raises(ROCrateTabulatorException):
+        tb.iter_table("Nonexistent")
+    tb.close()
@@ -0,0 +1,87 @@
+import pytest
+from pathlib import Path
+from rocrate_tabular.tabulator import ROCrateTabulatorException
+from util import build, table_config, write_crate
+
+
+def make_crate(crate_dir):
+    entities = [("Person", f"#person{i}", {"name": f"Person {i}"}) for i in range(15)]
+    work0 = {
+        "name": "Work 0",
+        "author": [{"@id": f"#person{i}"} for i in range(15)],
+        "keywords": [f"keyword {i}" for i in range(12)],
+    }
+    work1 = {"name": "Work 1", "author": {"@id": "#person0"}, "keywords": "single"}
+    entities += [("CreativeWork", "#work0", work0), ("CreativeWork", "#work1", work1)]
+    return write_crate(crate_dir, entities)
+
+
+def build_works(tmp_path, **settings):
+    crate = make_crate(Path(tmp_path) / "crate")
+    tables = {"CreativeWork": table_config(**settings)}
+    return build(crate, Path(tmp_path) / "mv.db", tables)
+
+
+def test_numbered_limit(tmp_path):
+    # author has more than 10 values, so it's planned as a junction, but
+    # keywords are literals
+    with pytest.raises(ROCrateTabulatorException, match="keywords"):
+        build_works(tmp_path)
+
+
+def test_max_numbered_cols(tmp_path):
+    tb = build_works(tmp_path, max_numbered_cols=20)
+    assert tb.config["tables"]["CreativeWork"]["junctions"] == []
+    columns = tb.db["CreativeWork"].columns_dict
+    assert "author_id_14" in columns and "author_id_15" not in columns
+    assert "keywords_11" in columns
+
+
+def test_json(tmp_path):
+    tb = build_works(
+        tmp_path, multi_valued_props={"keywords": "json", "author": "json"}
+    )
+    assert tb.config["tables"]["CreativeWork"]["junctions"] == []
+    columns = tb.db["CreativeWork"].columns_dict
+    assert "keywords_1" not in columns and "author_id_1" not in columns
+    rows = tb.db.query(
+        "SELECT j.value FROM CreativeWork, json_each(CreativeWork.author_id) AS j "
+        "WHERE entity_id = '#work0'"
+    )
+    assert [row["value"] for row in rows] == [f"#person{i}" for i in range(15)]
+    rows = tb.db.query(
+        "SELECT entity_id FROM CreativeWork, json_each(CreativeWork.keywords) AS j "
+        "WHERE j.value = 'single'"
+    )
+    assert [row["entity_id"] for row in rows] == ["#work1"]
+
+
+def test_json_table(tmp_path):
+    tb = build_works(tmp_path, multi_valued="json")
+    row = tb.db["CreativeWork"].get("#work1")
+    # only properties with more than one value are stored as JSON
+    assert row["name"] == "Work 1"
+    assert row["@type"] == "CreativeWork"
+    assert row["keywords"] == '["single"]'
+    assert row["author_id"] == '["#person0"]'
+    rows = {
+        row["entity_id"]: row for row in tb.iter_table("CreativeWork", tb.crate_dir)
+    }
+    assert rows["#work1"]["name"] == "Work 1"
+    assert rows["#work1"]["keywords"] == ["single"]
+    assert rows["#work1"]["author_id"] == ["#person0"]
+
+
+def test_junction(tmp_path):
+    tb = build_works(
+        tmp_path,
+        max_numbered_cols=20,
+        multi_valued_props={"author": "junction", "keywords": "json"},
+    )
+    assert tb.db["CreativeWork_author"].count == 16
+    assert "author_id" not in tb.db["CreativeWork"].columns_dict
+
+
+def test_bad_mode(tmp_path):
+    with pytest.raises(ROCrateTabulatorException, match="multi_valued"):
+        build_works(tmp_path, multi_valued_props={"author": "columns"})
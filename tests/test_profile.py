@@ -0,0 +1,74 @@
+import json
+from pathlib import Path
+from rocrate_tabular.tabulator import ROCrateTabulator, main, parse_args
+
+
+def test_profile(crates, tmp_path, monkeypatch):
+    cwd = Path(tmp_path)
+    tb = ROCrateTabulator()
+    tb.profiler.trace_sql = True
+    tb.profiler.trace_memory = True
+    finished = []
+    tb.profiler.add_callback(lambda record: finished.append(record["stage"]))
+    tb.crate_to_db(crates["textfiles"], cwd / "text.db")
+    tb.infer_config()
+    tb.config["tables"]["Dataset"] = tb.config["potential_tables"].pop("Dataset")
+    tb.entity_table("Dataset", "indexableText")
+    monkeypatch.setattr(tb.crate, "resolve_term", lambda term: None)
+    tb.config["export_queries"] = {"datasets.csv": "SELECT * FROM Dataset"}
+    tb.export_csv(cwd / "csv")
+
+    stages = {(r["stage"], r["label"]): r for r in tb.profiler.report()}
+    assert list(stages)[:4] == [
+        ("crate_parse", None),
+        ("property_rows", None),
+        ("property_insert", None),
+        ("build_indexes", None),
+    ]
+    n_properties = tb.db["property"].count
+    n_datasets = tb.db["Dataset"].count
+    assert stages[("crate_parse", None)]["rows_out"] == len(tb.crate.graph)
+    assert stages[("property_rows", None)]["rows_in"] == len(tb.crate.graph)
+    assert stages[("property_rows", None)]["rows_out"] == n_properties
+    assert stages[("property_insert", None)]["rows_out"] == n_properties
+    assert stages[("property_insert", None)]["sql_statements"] > 0
+    build = stages[("entity_table", "Dataset")]
+    assert build["rows_out"] == n_datasets
+    assert build["sql_statements"] > 0
+    assert build["peak_memory"] > 0
+    text = stages[("text_fetch", "indexableText")]
+    # the root dataset doesn't have any text
+    assert text["rows_out"] == n_datasets - 1
+    assert text["text_bytes"] > 0
+    # text is fetched while the table is built
+    assert build["peak_memory"] >= text["peak_memory"]
+    assert stages[("export", "datasets.csv")]["rows_out"] == n_datasets
+    assert "plan" in finished and "export" in finished
+
+    tb.profiler.write_json(cwd / "profile.json")
+    with open(cwd / "profile.json") as fh:
+        assert json.load(fh) == tb.profiler.report()
+
+
+def test_profile_cli(crates, tmp_path, capsys):
+    cwd = Path(tmp_path)
+    args = parse_args(["--profile", crates["minimal"], str(cwd / "sqlite.db")])
+    assert args.profile and args.crate == crates["minimal"]
+    assert args.profile_json is None
+    args = parse_args(
+        [
+            "--profile-json",
+            str(cwd / "profile.json"),
+            "-c",
+            str(cwd / "config.json"),
+            "--csv",
+            str(cwd / "csv"),
+            crates["minimal"],
+            str(cwd / "sqlite.db"),
+        ]
+    )
+    main(args)
+    assert "crate_parse" in capsys.readouterr().out
+    with open(cwd / "profile.json") as fh:
+        stages = [record["stage"] for record in json.load(fh)]
+    assert "crate_parse" in stages
@@ -0,0 +1,41 @@
+from pathlib import Path
+from rocrate_tabular.tabulator import ROCrateTabulator
+from util import write_crate
+
+RELATIONS_SQL = """
+    SELECT source_id, property_label, target_id, value
+    FROM property WHERE target_id IS NOT NULL ORDER BY rowid
+"""
+
+
+def relations(crate, db_file, **kwargs):
+    tb = ROCrateTabulator()
+    tb.crate_to_db(crate, db_file, **kwargs)
+    rows = [tuple(row.values()) for row in tb.db.query(RELATIONS_SQL)]
+    tb.close()
+    return rows
+
+
+def test_relation_names(tmp_path):
+    authors = [{"@id": "#named"}, {"@id": "#unnamed"}, {"@id": "#missing"}]
+    crate_dir = write_crate(
+        Path(tmp_path) / "crate",
+        [
+            ("CreativeWork", "#work", {"name": "Work", "author": authors}),
+            ("Person", "#named", {"name": "Named"}),
+            ("Person", "#unnamed", {"description": "Unnamed"}),
+        ],
+    )
+    for kwargs in [{}, {"defer_names": True}]:
+        rows = relations(crate_dir, Path(tmp_path) / "sqlite.db", **kwargs)
+        authors = {row[2]: row[3] for row in rows if row[1] == "author"}
+        assert authors == {"#named": "Named", "#unnamed": None, "#missing": ""}
+
+
+def test_defer_names(crates, tmp_path):
+    for crate in ["languageFamily", "wide"]:
+        rows = relations(crates[crate], Path(tmp_path) / f"{crate}.db")
+        deferred = relations(
+            crates[crate], Path(tmp_path) / f"{crate}_d.db", defer_names=True
+        )
+        assert deferred == rows
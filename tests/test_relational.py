@@ -1,7 +1,7 @@
 from pathlib import Path
 from rocrate_tabular.tabulator import ROCrateTabulator
 from tinycrate.tinycrate import TinyCrate
-from util import read_config, write_config
+from util import read_config, write_config, tabulator
 
 
 def test_wide(crates, tmp_path):
@@ -45,3 +45,44 @@ def test_wide(crates, tmp_path):
     orig_crate = TinyCrate(crates["wide"])
     dataset = orig_crate.get("./")
     assert dataset
+
+
+def test_junction_rebuild(crates, tmp_path):
+    tb = tabulator(tmp_path, crates["wide"])
+    tb.entity_table("Dataset")
+    assert "hasPart" in tb.config["tables"]["Dataset"]["junctions"]
+    jtable = tb.db["Dataset_hasPart"]
+    assert jtable.pks == ["entity_id", "target_id"]
+    assert ["target_id"] in [index.columns for index in jtable.indexes]
+    rows = list(tb.db.query("SELECT * FROM Dataset_hasPart ORDER BY seq"))
+    assert len(rows) == 2000
+    assert [row["seq"] for row in rows] == list(range(2000))
+    # building again replaces the existing rows
+    tb.entity_table("Dataset")
+    assert list(tb.db.query("SELECT * FROM Dataset_hasPart ORDER BY seq")) == rows
+
+
+def test_relation_fanout(crates, tmp_path):
+    tb = tabulator(tmp_path, crates["languageFamily"])
+    fanout = tb.relation_fanout()
+    for table in tb.config["tables"]:
+        counts = {}
+        for row in tb.fetch_relation_counts(table):
+            label = row["property_label"]
+            if row["n_links"]:
+                counts[label] = max(counts.get(label, 0), row["n_links"])
+        assert fanout.get(table, {}) == counts
+    # the planner only reads the property table once
+    statements = []
+    tb.db.conn.set_trace_callback(statements.append)
+    for table in tb.config["tables"]:
+        tb.entity_table_plan(table)
+    assert not statements
+
+
+def test_junctions_listed_once(crates, tmp_path):
+    tb = tabulator(tmp_path, crates["languageFamily"])
+    tb.entity_table("RepositoryCollection")
+    tb.entity_table("RepositoryCollection")
+    junctions = tb.config["tables"]["RepositoryCollection"]["junctions"]
+    assert junctions == ["hasPart"]
@@ -0,0 +1,97 @@
+import gzip
+from pathlib import Path
+from rocrate_tabular.remote import Remote
+from rocrate_tabular.tabulator import ROCrateTabulator
+from util import text_crate
+from werkzeug import Response
+
+N_DOCS = 3
+
+PROPERTY_SQL = "SELECT source_id, property_label, target_id, value FROM property"
+
+
+def serve_crate(tmp_path, httpserver, compress=False):
+    """Serve a crate whose documents have text files with relative ids from
+    httpserver, with an ETag on the metadata document. Returns the
+    metadata URL and a list of the metadata requests' status codes."""
+    crate_dir = text_crate(Path(tmp_path) / "crate", n_docs=N_DOCS)
+    for i in range(N_DOCS):
+        httpserver.expect_request(f"/crate/doc{i}.txt").respond_with_data(
+            f"Document {i}"
+        )
+    metadata = (Path(crate_dir) / "ro-crate-metadata.json").read_bytes()
+    statuses = []
+
+    def handler(request):
+        if request.headers.get("If-None-Match") == '"v1"':
+            response = Response(status=304)
+        elif compress:
+            response = Response(
+                gzip.compress(metadata),
+                headers={"ETag": '"v1"', "Content-Encoding": "gzip"},
+            )
+        else:
+            response = Response(metadata, headers={"ETag": '"v1"'})
+        statuses.append(response.status_code)
+        return response
+
+    httpserver.expect_request("/crate/ro-crate-metadata.json").respond_with_handler(
+        handler
+    )
+    return httpserver.url_for("/crate/ro-crate-metadata.json"), statuses
+
+
+def property_rows(url, db_file, remote, stream=False):
+    tb = ROCrateTabulator()
+    tb.remote = remote
+    tb.crate_to_db(url, db_file, stream=stream)
+    rows = sorted(tb.db.execute(PROPERTY_SQL).fetchall(), key=str)
+    tb.close()
+    return rows
+
+
+def test_conditional_cache(tmp_path, httpserver):
+    url, statuses = serve_crate(tmp_path, httpserver)
+    remote = Remote(Path(tmp_path) / "cache")
+    rows = property_rows(url, Path(tmp_path) / "1.db", remote)
+    assert rows
+    assert property_rows(url, Path(tmp_path) / "2.db", remote) == rows
+    assert property_rows(url, Path(tmp_path) / "3.db", remote, stream=True) == rows
+    assert statuses == [200, 304, 304]
+    assert remote.stats() == {"requests": 3, "not_modified": 2}
+    # without a cache, the document is always downloaded
+    assert property_rows(url, Path(tmp_path) / "4.db", Remote()) == rows
+    assert statuses[-1] == 200
+
+
+def test_gzip(tmp_path, httpserver):
+    url, statuses = serve_crate(tmp_path, httpserver, compress=True)
+    rows = property_rows(url, Path(tmp_path) / "1.db", Remote())
+    assert ("#doc0", "name", None, "doc0.txt") in rows
+    assert statuses == [200]
+
+
+def test_unfinished_download(tmp_path, httpserver):
+    url, _ = serve_crate(tmp_path, httpserver)
+    remote = Remote(Path(tmp_path) / "cache")
+    chunks = remote.chunks(url, chunk_size=10)
+    next(chunks)
+    chunks.close()
+    assert list((Path(tmp_path) / "cache").iterdir()) == []
+    assert remote.cached_validator(url) is None
+
+
+def test_remote_text(tmp_path, httpserver):
+    url, _ = serve_crate(tmp_path, httpserver)
+    tb = ROCrateTabulator()
+    tb.crate_to_db(url, Path(tmp_path) / "text.db")
+    tb.infer_config()
+    tb.use_tables("RepositoryObject")
+    tb.entity_table("RepositoryObject", "ldac:mainText")
+    rows = tb.db.query("SELECT * FROM RepositoryObject ORDER BY entity_id")
+    assert [row["ldac:mainText"] for row in rows] == [
+        f"Document {i}" for i in range(N_DOCS)
+    ]
+    # the text files are fetched with the tabulator's session
+    assert tb.remote.stats()["requests"] == N_DOCS + 1
+    tb.close()
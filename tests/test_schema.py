@@ -0,0 +1,40 @@
+from rocrate_tabular.tabulator import numbered_columns
+from util import people_crate, tabulator
+
+
+def test_numbered_columns():
+    assert numbered_columns("author", 2, 1, 10) == ["author", "author_id", "author_1"]
+    assert numbered_columns("name", 20, 0, 3) == ["name", "name_1", "name_2", "name_3"]
+
+
+def test_no_alter_table(crates, tmp_path):
+    tb = tabulator(tmp_path, crates["languageFamily"])
+    statements = []
+    tb.db.conn.set_trace_callback(statements.append)
+    tb.chunk_size = 2
+    tb.entity_table("RepositoryCollection")
+    assert not [s for s in statements if s.startswith("ALTER TABLE")]
+    columns = list(tb.db["RepositoryCollection"].columns_dict)
+    # a property's numbered columns are kept together
+    members = [c for c in columns if c.startswith("pcdm:hasMember")]
+    start = columns.index("pcdm:hasMember")
+    assert columns[start : start + len(members)] == members
+    assert tb.table_columns["RepositoryCollection"][0] == columns
+
+
+def test_expanded_schema(tmp_path):
+    tb = tabulator(tmp_path, people_crate(tmp_path))
+    tb.config["tables"]["CreativeWork"]["expand_props"] = [
+        "author.affiliation",
+        "author.knows.knows",
+    ]
+    tb.entity_table("CreativeWork")
+    columns = tb.db["CreativeWork"].columns_dict
+    assert "author_knows_knows_id" in columns
+    assert "author_knows_knows_name" not in columns
+    # every column the schema pass creates gets a value
+    for column in columns:
+        (count,) = tb.db.execute(
+            f"SELECT count([{column}]) FROM CreativeWork"
+        ).fetchone()
+        assert count > 0, column
@@ -0,0 +1,24 @@
+import pytest
+from util import tabulator
+from rocrate_tabular.tabulator import ROCrateTabulatorException
+
+
+def test_search(crates, tmp_path):
+    tb = tabulator(tmp_path, crates["textfiles"])
+    tb.config["tables"]["Dataset"]["fts"] = ["name", "indexableText"]
+    tb.entity_table("Dataset", "indexableText")
+    results = tb.search("Dataset", "lorem")
+    assert len(results) == 1
+    assert results[0]["entity_id"] == "doc001"
+    assert "[Lorem]" in results[0]["snippet"]
+    assert tb.search("Dataset", "minimal")[0]["entity_id"] == "./"
+    # rebuilding the table rebuilds the index rather than duplicating it
+    tb.entity_table("Dataset", "indexableText")
+    assert len(tb.search("Dataset", "lorem")) == 1
+
+
+def test_search_no_index(crates, tmp_path):
+    tb = tabulator(tmp_path, crates["textfiles"])
+    tb.entity_table("Dataset")
+    with pytest.raises(ROCrateTabulatorException):
+        tb.search("Dataset", "lorem")
@@ -0,0 +1,72 @@
+import json
+from pathlib import Path
+from rocrate_tabular.jsonstream import GraphReader
+from rocrate_tabular.tabulator import ROCrateTabulator, parse_args, main
+
+PROPERTY_SQL = """
+    SELECT row_id, source_id, source_name, property_label, target_id, value
+    FROM property ORDER BY rowid
+"""
+
+
+def chunked(text, size):
+    for i in range(0, len(text), size):
+        yield text[i : i + size]
+
+
+def test_graph_reader(crates):
+    with open(Path(crates["languageFamily"]) / "ro-crate-metadata.json") as fh:
+        text = fh.read()
+    jsonld = json.loads(text)
+    for size in [1, 7, 4096]:
+        reader = GraphReader(chunked(text, size))
+        assert list(reader) == jsonld["@graph"]
+        assert reader.header["@context"] == jsonld["@context"]
+
+
+def test_graph_reader_graph_first():
+    jsonld = {"@graph": [{"@id": "a", "n": 12345}, {"@id": "b"}], "@context": {}}
+    reader = GraphReader(chunked(json.dumps(jsonld), 3))
+    assert list(reader) == jsonld["@graph"]
+    assert reader.header == {"@context": {}}
+
+
+def test_stream_matches_load(crates, tmp_path):
+    for crate in ["languageFamily", "wide", "utf8"]:
+        tb = ROCrateTabulator()
+        tb.crate_to_db(crates[crate], Path(tmp_path) / f"{crate}.db")
+        loaded = list(tb.db.query(PROPERTY_SQL))
+        tb.close()
+        tbs = ROCrateTabulator()
+        tbs.batch_size = 10
+        tbs.crate_to_db(crates[crate], Path(tmp_path) / f"{crate}_s.db", stream=True)
+        streamed = list(tbs.db.query(PROPERTY_SQL))
+        assert streamed == loaded
+        assert tbs.crate.context == tb.crate.context
+        tbs.close()
+
+
+def test_stream_text(crates, tmp_path):
+    tb = ROCrateTabulator()
+    tb.crate_to_db(crates["textfiles"], Path(tmp_path) / "text.db", stream=True)
+    tb.infer_config()
+    tb.use_tables("Dataset")
+    tb.entity_table("Dataset", "indexableText")
+    rows = list(tb.db.query("SELECT * FROM Dataset WHERE entity_id = 'doc001'"))
+    assert rows[0]["indexableText"][:27] == "Lorem ipsum dolor sit amet,"
+
+
+def test_stream_cli(crates, tmp_path):
+    cwd = Path(tmp_path)
+    args = parse_args(
+        [
+            "--stream",
+            "-c",
+            str(cwd / "config.json"),
+            "--csv",
+            str(cwd / "csv"),
+            crates["minimal"],
+            str(cwd / "sqlite.db"),
+        ]
+    )
+    main(args)
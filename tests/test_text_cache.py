@@ -0,0 +1,90 @@
+from pathlib import Path
+from rocrate_tabular.textcache import TextCache
+from util import load, text_crate
+from werkzeug import Response
+
+N_DOCS = 3
+
+
+def cached_texts(crate_dir, db_file, cache):
+    """Build the RepositoryObject table with its texts loaded through cache,
+    and return them"""
+    tb = load(crate_dir, db_file, {"RepositoryObject": None})
+    tb.text_cache = cache
+    tb.entity_table("RepositoryObject", "ldac:mainText")
+    rows = tb.db.query("SELECT * FROM RepositoryObject ORDER BY entity_id")
+    texts = [row["ldac:mainText"] for row in rows]
+    tb.close()
+    return texts
+
+
+def test_file_cache(tmp_path):
+    crate_dir = text_crate(Path(tmp_path) / "crate")
+    cache = TextCache(Path(tmp_path) / "cache")
+    texts = cached_texts(crate_dir, Path(tmp_path) / "1.db", cache)
+    assert texts == [f"Document {i}" for i in range(N_DOCS)]
+    assert cache.stats()["misses"] == N_DOCS
+    assert cached_texts(crate_dir, Path(tmp_path) / "2.db", cache) == texts
+    assert cache.stats()["hits"] == N_DOCS
+    # changing a file invalidates its entry
+    (Path(crate_dir) / "doc0.txt").write_text("Document 0, revised")
+    texts = cached_texts(crate_dir, Path(tmp_path) / "3.db", cache)
+    assert texts[0] == "Document 0, revised"
+    assert cache.stats() == {
+        "hits": 2 * N_DOCS - 1,
+        "misses": N_DOCS + 1,
+        "bytes": sum(len(t) for t in texts),
+    }
+    cache.clear()
+    assert cache.stats()["bytes"] == 0
+
+
+def test_http_cache(tmp_path, httpserver):
+    def handler(request):
+        if request.headers.get("If-None-Match") == '"v1"':
+            return Response(status=304)
+        return Response(f"Text of {request.path}", headers={"ETag": '"v1"'})
+
+    for i in range(N_DOCS):
+        httpserver.expect_request(f"/doc{i}.txt").respond_with_handler(handler)
+    crate_dir = text_crate(Path(tmp_path) / "crate", httpserver.url_for("/"))
+    cache = TextCache(Path(tmp_path) / "cache")
+    texts = cached_texts(crate_dir, Path(tmp_path) / "1.db", cache)
+    assert texts == [f"Text of /doc{i}.txt" for i in range(N_DOCS)]
+    assert cached_texts(crate_dir, Path(tmp_path) / "2.db", cache) == texts
+    assert cache.stats()["hits"] == N_DOCS
+    assert cache.stats()["misses"] == N_DOCS
+
+
+def test_lru_eviction(tmp_path):
+    cache = TextCache(Path(tmp_path) / "cache", max_bytes=25)
+    for i in range(3):
+        cache.put("crate", f"doc{i}", "v", "0123456789")
+    assert cache.lookup("crate", "doc0") is None
+    assert cache.lookup("crate", "doc2") == ("v", "0123456789")
+    assert cache.stats()["bytes"] == 20
+
+
+def test_overwrite_near_cap(tmp_path):
+    cache = TextCache(Path(tmp_path) / "cache", max_bytes=25)
+    cache.put("crate", "doc0", "v", "0123456789")
+    cache.put("crate", "doc1", "v", "0123456789")
+    # replacing an entry only counts its new size
+    for i in range(5):
+        cache.put("crate", "doc1", f"v{i}", "01234567890123")
+    assert cache.stats()["bytes"] == 24
+    assert cache.lookup("crate", "doc0") == ("v", "0123456789")
+    cache.put("crate", "doc1", "v", "0123456789012345678901234")
+    assert cache.stats()["bytes"] == 25
+    assert cache.lookup("crate", "doc0") is None
+
+
+def test_shared_cache(tmp_path):
+    # two caches on the same file, as in table worker processes
+    caches = [TextCache(Path(tmp_path) / "cache", max_bytes=25) for _ in range(2)]
+    for i in range(6):
+        caches[i % 2].put("crate", f"doc{i % 3}", "v", "0123456789")
+    assert caches[0].stats()["bytes"] == 20
+    assert caches[1].stats()["bytes"] == 20
+    (count,) = caches[0].conn.execute("SELECT COUNT(*) FROM text").fetchone()
+    assert count == 2
@@ -0,0 +1,33 @@
+from pathlib import Path
+from rocrate_tabular.tabulator import ROCrateTabulator
+from util import text_crate
+
+N_DOCS = 20
+
+
+def http_crate(tmp_path, httpserver):
+    """Make a crate whose documents have text files served by httpserver.
+    The last document's file is missing."""
+    for i in range(N_DOCS - 1):
+        httpserver.expect_request(f"/doc{i}.txt").respond_with_data(f"Document {i}")
+    return text_crate(Path(tmp_path) / "crate", httpserver.url_for("/"), N_DOCS)
+
+
+def test_concurrent_text(tmp_path, httpserver):
+    crate_dir = http_crate(tmp_path, httpserver)
+    for workers in [1, 4]:
+        tb = ROCrateTabulator()
+        tb.crate_to_db(crate_dir, Path(tmp_path) / f"text{workers}.db")
+        tb.infer_config()
+        tb.use_tables("RepositoryObject")
+        tb.text_workers = workers
+        tb.entity_table("RepositoryObject", "ldac:mainText")
+        rows = sorted(
+            tb.db["RepositoryObject"].rows, key=lambda row: int(row["entity_id"][4:])
+        )
+        assert len(rows) == N_DOCS
+        for i, row in enumerate(rows[:-1]):
+            assert row["ldac:mainText"] == f"Document {i}"
+        assert rows[-1]["ldac:mainText"].startswith("load failed: ")
+        assert tb.text_stats["files"] == N_DOCS
+        tb.close()
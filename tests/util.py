@@ -1,6 +1,8 @@
 import json
 from pathlib import Path
 from rocrate_tabular.tabulator import ROCrateTabulator
+from sqlite_utils import Database
+from tinycrate.tinycrate import minimal_crate
 
 
 def read_config(cffile):
@@ -32,3 +34,93 @@ def tabulator(tmp_path, crate):
     tb.load_config(conffile)
     tb.crate_to_db(crate, dbfile)
     return tb
+
+
+def write_crate(crate_dir, entities, **crate_props):
+    """Writes a minimal crate with entities, a list of (type, id, props), to
+    crate_dir. Returns crate_dir as a str"""
+    crate = minimal_crate(date_published="2025-01-01", **crate_props)
+    for etype, eid, props in entities:
+        crate.add(etype, eid, props)
+    Path(crate_dir).mkdir(parents=True, exist_ok=True)
+    crate.write_json(Path(crate_dir))
+    return str(crate_dir)
+
+
+def people_crate(tmp_path):
+    """Five works by two authors who know each other and share an
+    affiliation"""
+    entities = [("Organization", "#org", {"name": "Org"})]
+    for i in range(2):
+        props = {
+            "name": f"Person {i}",
+            "affiliation": {"@id": "#org"},
+            "knows": {"@id": f"#person{1 - i}"},
+        }
+        entities.append(("Person", f"#person{i}", props))
+    for i in range(5):
+        props = {"name": f"Work {i}", "author": {"@id": f"#person{i % 2}"}}
+        entities.append(("CreativeWork", f"#work{i}", props))
+    return write_crate(Path(tmp_path) / "crate", entities)
+
+
+def text_crate(crate_dir, url=None, n_docs=3):
+    """Writes a crate with n_docs documents with text files, which are in
+    crate_dir, or at url if it's given"""
+    entities = []
+    for i in range(n_docs):
+        fid = f"doc{i}.txt"
+        if url is None:
+            Path(crate_dir).mkdir(parents=True, exist_ok=True)
+            (Path(crate_dir) / fid).write_text(f"Document {i}")
+        else:
+            fid = f"{url}{fid}"
+        entities.append(("File", fid, {"name": fid}))
+        props = {"name": fid, "ldac:mainText": {"@id": fid}}
+        entities.append(("RepositoryObject", f"#doc{i}", props))
+    return write_crate(crate_dir, entities)
+
+
+def table_config(**settings):
+    """A table config with nothing ignored or expanded, and settings"""
+    return {"all_props": [], "ignore_props": [], "expand_props": [], **settings}
+
+
+def load(crate, db_file, tables=None, **kwargs):
+    """Loads a crate into db_file with crate_to_db(**kwargs). tables is a
+    dict of table configs by name: a table whose config is None gets its
+    inferred config. Returns the tabulator"""
+    tb = ROCrateTabulator()
+    tables = tables or {}
+    for table, config in tables.items():
+        if config is not None:
+            tb.config["tables"][table] = config
+    tb.crate_to_db(crate, db_file, **kwargs)
+    if None in tables.values():
+        tb.infer_config()
+        for table, config in tables.items():
+            if config is None:
+                tb.config["tables"][table] = tb.config["potential_tables"].pop(table)
+    return tb
+
+
+def build(crate, db_file, tables, text_prop=None, **kwargs):
+    """Loads a crate like load and builds its tables. Returns the
+    tabulator"""
+    tb = load(crate, db_file, tables, **kwargs)
+    for table in tables:
+        tb.entity_table(table, text_prop)
+    return tb
+
+
+def dump(db_file, skip=()):
+    """The primary keys and rows of every table in a database, except those
+    in skip"""
+    db = Database(db_file)
+    tables = {
+        name: (db[name].pks, list(db.query(f"SELECT * FROM [{name}] ORDER BY rowid")))
+        for name in db.table_names()
+        if name not in skip
+    }
+    db.close()
+    return tables